@@ -0,0 +1,256 @@
+"""
+Compare DeepFace face detector backends on a fixed image set.
+
+Run from the project root:
+
+    python -m api_server.benchmark_detectors --images path/to/images
+
+Every image is assumed to contain one face, which suits uploads stored
+under captured_faces. For other sets, put a faces.csv next to the
+images with "filename,faces" rows giving the expected face count.
+
+Recall is the share of expected faces that were detected, counting at
+most the expected number per image; extra detections are reported
+separately as possible false positives. Latency is the time
+detect_face_crops takes per image, after one warm-up image per backend.
+"""
+
+import argparse
+import csv
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from .config import (
+    CAPTURED_FACES_ROOT,
+    DETECTOR_BACKEND,
+)
+from .face_analysis import detect_face_crops
+
+
+DEFAULT_BACKENDS = (
+    "opencv",
+    "ssd",
+    "yunet",
+    "mediapipe",
+    "mtcnn",
+    "retinaface",
+)
+
+IMAGE_SUFFIXES = {
+    ".jpg",
+    ".jpeg",
+    ".png",
+    ".webp",
+}
+
+
+def load_image_set(
+    image_root,
+    limit,
+):
+    """
+    Return (path, expected_faces) pairs in a stable order.
+    """
+    expected_faces = {}
+
+    labels_path = image_root / "faces.csv"
+
+    if labels_path.is_file():
+        with labels_path.open(
+            newline="",
+            encoding="utf-8",
+        ) as labels_file:
+            for row in csv.reader(
+                labels_file
+            ):
+                if len(row) < 2 or not row[1].strip().isdigit():
+                    continue
+
+                expected_faces[row[0].strip()] = int(
+                    row[1]
+                )
+
+    image_paths = sorted(
+        path
+        for path in image_root.rglob("*")
+        if path.suffix.lower() in IMAGE_SUFFIXES
+    )
+
+    if limit:
+        image_paths = image_paths[:limit]
+
+    return [
+        (
+            path,
+            expected_faces.get(
+                path.relative_to(image_root).as_posix(),
+                expected_faces.get(
+                    path.name,
+                    1,
+                ),
+            ),
+        )
+        for path in image_paths
+    ]
+
+
+def count_faces(
+    frame,
+    backend,
+):
+    try:
+        return len(
+            detect_face_crops(
+                frame,
+                detector_backend=backend,
+            )
+        )
+
+    except ValueError:
+        return 0
+
+
+def run_backend(
+    backend,
+    images,
+):
+    """
+    Return (latencies_ms, detected, expected, extra) for one backend.
+    """
+    count_faces(
+        images[0][1],
+        backend,
+    )
+
+    latencies = []
+    detected = 0
+    expected = 0
+    extra = 0
+
+    for _, frame, expected_faces in images:
+        started = time.perf_counter()
+
+        face_count = count_faces(
+            frame,
+            backend,
+        )
+
+        latencies.append(
+            time.perf_counter() - started
+        )
+
+        detected += min(
+            face_count,
+            expected_faces,
+        )
+
+        expected += expected_faces
+
+        extra += max(
+            0,
+            face_count - expected_faces,
+        )
+
+    return (
+        np.asarray(
+            latencies
+        )
+        * 1000.0,
+        detected,
+        expected,
+        extra,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+
+    parser.add_argument(
+        "--images",
+        type=Path,
+        default=CAPTURED_FACES_ROOT,
+    )
+
+    parser.add_argument(
+        "--backends",
+        nargs="+",
+        default=list(
+            DEFAULT_BACKENDS
+        ),
+    )
+
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=200,
+    )
+
+    arguments = parser.parse_args()
+
+    images = []
+
+    for path, expected_faces in load_image_set(
+        arguments.images.resolve(),
+        arguments.limit,
+    ):
+        frame = cv2.imread(
+            str(path),
+            cv2.IMREAD_COLOR,
+        )
+
+        if frame is not None:
+            images.append(
+                (
+                    path,
+                    frame,
+                    expected_faces,
+                )
+            )
+
+    if not images:
+        raise SystemExit(
+            f"No readable images under {arguments.images}."
+        )
+
+    print(
+        f"Images: {len(images)} | "
+        f"expected faces: {sum(image[2] for image in images)} | "
+        f"configured backend: {DETECTOR_BACKEND}"
+    )
+
+    for backend in arguments.backends:
+        try:
+            (
+                latencies,
+                detected,
+                expected,
+                extra,
+            ) = run_backend(
+                backend,
+                images,
+            )
+
+        except Exception as error:
+            print(
+                f"{backend:<12s} unavailable: {error}"
+            )
+
+            continue
+
+        print(
+            f"{backend:<12s} "
+            f"mean {latencies.mean():8.1f} ms | "
+            f"p95 {np.percentile(latencies, 95):8.1f} ms | "
+            f"recall {detected / expected:6.1%} | "
+            f"extra faces {extra}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,409 @@
+"""
+Compare the approximate IVF matcher with exact matching.
+
+Run from the project root:
+
+    python -m api_server.benchmark_matcher --gallery-size 50000
+
+Use --bank-code to benchmark against a bank's real gallery instead of
+synthetic embeddings. Recall is the share of queries whose exact match
+under MATCH_THRESHOLD is also returned by the IVF matcher; agreement
+counts every query, including those where neither finds a match.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from .config import (
+    IVF_NLIST,
+    IVF_NPROBE,
+    MATCH_THRESHOLD,
+)
+from .face_utils import normalize_embedding
+from .matchers import (
+    ExactMatcher,
+    IVFMatcher,
+)
+
+
+def synthetic_gallery(
+    gallery_size,
+    dimension,
+    generator,
+):
+    """
+    Build clustered unit vectors that resemble face embeddings more
+    than uniform noise does: identities live near a low-rank subspace.
+    """
+    latent_dimension = 48
+
+    projection = generator.normal(
+        size=(
+            latent_dimension,
+            dimension,
+        )
+    )
+
+    gallery = (
+        generator.normal(
+            size=(
+                gallery_size,
+                latent_dimension,
+            )
+        )
+        @ projection
+        + generator.normal(
+            size=(
+                gallery_size,
+                dimension,
+            )
+        )
+        * 2.0
+    )
+
+    return gallery
+
+
+def load_bank_gallery(
+    bank_code,
+):
+    from psycopg2.extras import RealDictCursor
+
+    from .db_utils import (
+        get_db,
+        get_embeddings_db,
+    )
+
+    with get_db() as database:
+        with database.cursor(
+            cursor_factory=RealDictCursor
+        ) as cursor:
+            cursor.execute(
+                "SELECT id FROM tenant_bank WHERE code = %s",
+                (
+                    bank_code.strip().upper(),
+                ),
+            )
+
+            bank = cursor.fetchone()
+
+            if not bank:
+                raise SystemExit(
+                    f"Bank {bank_code!r} does not exist."
+                )
+
+            known_embeddings = get_embeddings_db(
+                cursor,
+                bank["id"],
+            )
+
+    return np.vstack(
+        [
+            embedding
+            for _, embedding in known_embeddings
+        ]
+    )
+
+
+def unit_rows(
+    rows,
+):
+    norms = np.linalg.norm(
+        rows,
+        axis=1,
+        keepdims=True,
+    )
+
+    norms[norms == 0] = 1.0
+
+    return (
+        rows / norms
+    ).astype(
+        np.float32
+    )
+
+
+def make_queries(
+    gallery,
+    query_count,
+    generator,
+):
+    """
+    Half of the queries are noisy views of gallery faces, the other
+    half are strangers who should not match anyone.
+    """
+    known_count = query_count // 2
+
+    sources = generator.choice(
+        len(gallery),
+        known_count,
+        replace=False,
+    )
+
+    noise_scale = (
+        np.linalg.norm(
+            gallery[sources],
+            axis=1,
+            keepdims=True,
+        )
+        / np.sqrt(
+            gallery.shape[1]
+        )
+    )
+
+    known_queries = (
+        gallery[sources]
+        + generator.normal(
+            size=(
+                known_count,
+                gallery.shape[1],
+            )
+        )
+        * noise_scale
+        * 0.6
+    )
+
+    stranger_queries = generator.normal(
+        size=(
+            query_count - known_count,
+            gallery.shape[1],
+        )
+    ) * noise_scale.mean()
+
+    return np.vstack(
+        [
+            known_queries,
+            stranger_queries,
+        ]
+    )
+
+
+def run_matcher(
+    matcher,
+    queries,
+    matrix,
+    face_ids,
+    threshold,
+):
+    results = []
+    latencies = []
+
+    for query in queries:
+        candidate = normalize_embedding(
+            query
+        )
+
+        started = time.perf_counter()
+
+        (
+            face_id,
+            distance,
+        ) = matcher.closest(
+            candidate,
+            matrix,
+            face_ids,
+        )
+
+        latencies.append(
+            time.perf_counter() - started
+        )
+
+        results.append(
+            face_id
+            if distance < threshold
+            else None
+        )
+
+    return (
+        results,
+        np.asarray(
+            latencies
+        )
+        * 1000.0,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+
+    parser.add_argument(
+        "--bank-code",
+    )
+
+    parser.add_argument(
+        "--gallery-size",
+        type=int,
+        default=50000,
+    )
+
+    parser.add_argument(
+        "--dimension",
+        type=int,
+        default=512,
+    )
+
+    parser.add_argument(
+        "--queries",
+        type=int,
+        default=1000,
+    )
+
+    parser.add_argument(
+        "--nlist",
+        type=int,
+        default=IVF_NLIST,
+    )
+
+    parser.add_argument(
+        "--nprobe",
+        type=int,
+        nargs="+",
+        default=[
+            IVF_NPROBE,
+        ],
+    )
+
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=MATCH_THRESHOLD,
+    )
+
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+    )
+
+    arguments = parser.parse_args()
+
+    generator = np.random.default_rng(
+        arguments.seed
+    )
+
+    if arguments.bank_code:
+        gallery = load_bank_gallery(
+            arguments.bank_code
+        )
+
+    else:
+        gallery = synthetic_gallery(
+            arguments.gallery_size,
+            arguments.dimension,
+            generator,
+        )
+
+    matrix = unit_rows(
+        gallery
+    )
+
+    face_ids = np.arange(
+        len(matrix)
+    ).astype(
+        object
+    )
+
+    queries = make_queries(
+        gallery,
+        min(
+            arguments.queries,
+            len(gallery),
+        ),
+        generator,
+    )
+
+    (
+        exact_results,
+        exact_latencies,
+    ) = run_matcher(
+        ExactMatcher(),
+        queries,
+        matrix,
+        face_ids,
+        arguments.threshold,
+    )
+
+    exact_matches = sum(
+        result is not None
+        for result in exact_results
+    )
+
+    print(
+        f"Gallery: {len(matrix)} x {matrix.shape[1]} | "
+        f"queries: {len(queries)} | "
+        f"exact matches: {exact_matches}"
+    )
+
+    print(
+        f"exact       mean {exact_latencies.mean():7.3f} ms | "
+        f"p95 {np.percentile(exact_latencies, 95):7.3f} ms"
+    )
+
+    for probe_count in arguments.nprobe:
+        matcher = IVFMatcher(
+            list_count=arguments.nlist,
+            probe_count=probe_count,
+            min_gallery_size=1,
+        )
+
+        started = time.perf_counter()
+
+        matcher.build(
+            matrix
+        )
+
+        build_seconds = (
+            time.perf_counter() - started
+        )
+
+        (
+            ivf_results,
+            ivf_latencies,
+        ) = run_matcher(
+            matcher,
+            queries,
+            matrix,
+            face_ids,
+            arguments.threshold,
+        )
+
+        recalled = sum(
+            exact is not None
+            and exact == approximate
+            for exact, approximate in zip(
+                exact_results,
+                ivf_results,
+            )
+        )
+
+        agreement = sum(
+            exact == approximate
+            for exact, approximate in zip(
+                exact_results,
+                ivf_results,
+            )
+        )
+
+        recall = (
+            recalled / exact_matches
+            if exact_matches
+            else 1.0
+        )
+
+        print(
+            f"ivf nprobe={probe_count:<4d} "
+            f"mean {ivf_latencies.mean():7.3f} ms | "
+            f"p95 {np.percentile(ivf_latencies, 95):7.3f} ms | "
+            f"recall {recall:.4f} | "
+            f"agreement {agreement / len(queries):.4f} | "
+            f"build {build_seconds:.2f} s"
+        )
+
+
+if __name__ == "__main__":
+    main()
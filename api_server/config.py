@@ -52,6 +52,15 @@ EMBEDDING_MODEL = os.getenv(
     "ArcFace",
 )
 
+# DeepFace detector used for uploads without a client face box, for
+# example opencv, ssd, yunet, mediapipe, mtcnn or retinaface. Compare
+# latency and recall on your own images with
+# python -m api_server.benchmark_detectors before switching.
+DETECTOR_BACKEND = os.getenv(
+    "DETECTOR_BACKEND",
+    "opencv",
+).strip().lower()
+
 MATCH_THRESHOLD = float(
     os.getenv(
         "MATCH_THRESHOLD",
@@ -59,6 +68,263 @@ MATCH_THRESHOLD = float(
     )
 )
 
+# Embeddings are stored as float32 bytes in embedding_vector. Also
+# writing the JSON embedding column is only needed by tools that
+# still read it.
+STORE_EMBEDDING_JSON = os.getenv(
+    "STORE_EMBEDDING_JSON",
+    "false",
+).strip().lower() in {
+    "1",
+    "true",
+    "yes",
+    "on",
+}
+
+# "deepface" runs the embedding and emotion models through DeepFace
+# and TensorFlow. "onnx" runs exported copies of the same models with
+# ONNX Runtime, which loads faster and uses far less memory per worker;
+# export and check them with python -m api_server.export_onnx.
+INFERENCE_ENGINE = os.getenv(
+    "INFERENCE_ENGINE",
+    "deepface",
+).strip().lower()
+
+# Exported models are read from <ONNX_MODEL_DIR>/<model name>.onnx,
+# for example ArcFace.onnx and Emotion.onnx.
+ONNX_MODEL_DIR = Path(
+    os.getenv(
+        "ONNX_MODEL_DIR",
+        PROJECT_ROOT / "models",
+    )
+).resolve()
+
+# With INFERENCE_ENGINE=onnx the opencv and yunet detectors run on
+# OpenCV directly instead of through DeepFace; yunet reads its model
+# from here (face_detection_yunet_2023mar.onnx in the OpenCV model
+# zoo, the file DeepFace itself downloads).
+YUNET_MODEL_PATH = Path(
+    os.getenv(
+        "YUNET_MODEL_PATH",
+        ONNX_MODEL_DIR / "face_detection_yunet_2023mar.onnx",
+    )
+).resolve()
+
+# Threads ONNX Runtime may use per inference worker. 0 lets it use
+# every core, which oversubscribes the CPU when several workers run.
+ONNX_INTRA_OP_THREADS = bounded_int_env(
+    "ONNX_INTRA_OP_THREADS",
+    0,
+    minimum=0,
+    maximum=256,
+)
+
+# Each visitor is matched against the running mean of its embeddings.
+# After this many faces, older faces stop gaining weight so the
+# centroid follows changes in appearance.
+VISITOR_CENTROID_MAX_WEIGHT = bounded_int_env(
+    "VISITOR_CENTROID_MAX_WEIGHT",
+    20,
+    minimum=1,
+    maximum=10000,
+)
+
+# "exact" scans every gallery row. "ivf" searches an inverted-file
+# index (k-means lists over the normalised embeddings) once a bank
+# holds at least IVF_MIN_GALLERY_SIZE visitors. Measure recall with
+# python -m api_server.benchmark_matcher before switching a bank.
+MATCHER_BACKEND = os.getenv(
+    "MATCHER_BACKEND",
+    "exact",
+).strip().lower()
+
+IVF_MIN_GALLERY_SIZE = bounded_int_env(
+    "IVF_MIN_GALLERY_SIZE",
+    10000,
+    minimum=256,
+    maximum=10_000_000,
+)
+
+# 0 selects roughly 4 * sqrt(gallery size) lists.
+IVF_NLIST = bounded_int_env(
+    "IVF_NLIST",
+    0,
+    minimum=0,
+    maximum=65536,
+)
+
+IVF_NPROBE = bounded_int_env(
+    "IVF_NPROBE",
+    16,
+    minimum=1,
+    maximum=65536,
+)
+
+# The resident embedding index is refreshed incrementally from
+# visitors touched since its last load. A full reload still runs
+# periodically so deleted visitors disappear from the gallery.
+EMBEDDING_INDEX_MAX_AGE_SECONDS = bounded_int_env(
+    "EMBEDDING_INDEX_MAX_AGE_SECONDS",
+    600,
+    minimum=10,
+    maximum=86400,
+)
+
+# Incremental refreshes re-read this many seconds before the last
+# seen version. last_seen is stamped by the database just before
+# commit, so this only has to cover the commit itself; a visitor
+# whose commit takes longer waits for the next full reload.
+EMBEDDING_INDEX_REFRESH_OVERLAP_SECONDS = bounded_int_env(
+    "EMBEDDING_INDEX_REFRESH_OVERLAP_SECONDS",
+    60,
+    minimum=1,
+    maximum=3600,
+)
+
+# Number of inference worker processes. Each loads its own models,
+# so size this to the host's cores and memory. 0 runs inference
+# inside the API process, one image at a time.
+INFERENCE_WORKERS = bounded_int_env(
+    "INFERENCE_WORKERS",
+    1,
+    minimum=0,
+    maximum=64,
+)
+
+# When set, this API process sends its inference work to a shared
+# model server (python -m api_server.model_server) at this address
+# instead of starting its own INFERENCE_WORKERS. Use a socket path on
+# Linux, or \\.\pipe\<name> on Windows. Every HTTP worker on the host
+# then shares one copy of the models.
+MODEL_SERVER_ADDRESS = os.getenv(
+    "MODEL_SERVER_ADDRESS",
+    "",
+).strip()
+
+# Shared secret that the model server and its clients authenticate
+# each other with. Required when MODEL_SERVER_ADDRESS is set.
+MODEL_SERVER_AUTHKEY = os.getenv(
+    "MODEL_SERVER_AUTHKEY",
+    "",
+)
+
+# Images allowed to wait for a busy worker before uploads are
+# refused with 503 and Retry-After.
+INFERENCE_QUEUE_SIZE = bounded_int_env(
+    "INFERENCE_QUEUE_SIZE",
+    8,
+    minimum=0,
+    maximum=1024,
+)
+
+INFERENCE_RETRY_AFTER_SECONDS = bounded_int_env(
+    "INFERENCE_RETRY_AFTER_SECONDS",
+    5,
+    minimum=1,
+    maximum=600,
+)
+
+# Uploads arriving within this many milliseconds of each other are
+# analysed in one inference submission. 0 sends every upload on its
+# own; faces within one image are always batched.
+INFERENCE_BATCH_MAX_WAIT_MS = bounded_int_env(
+    "INFERENCE_BATCH_MAX_WAIT_MS",
+    10,
+    minimum=0,
+    maximum=1000,
+)
+
+INFERENCE_BATCH_MAX_FRAMES = bounded_int_env(
+    "INFERENCE_BATCH_MAX_FRAMES",
+    8,
+    minimum=1,
+    maximum=256,
+)
+
+# Largest tensor passed to the embedding or emotion model at once.
+INFERENCE_MAX_BATCH_FACES = bounded_int_env(
+    "INFERENCE_MAX_BATCH_FACES",
+    32,
+    minimum=1,
+    maximum=512,
+)
+
+# Background threads per API process that drain uploads accepted by
+# /upload-face/async. Workers in different processes coordinate
+# through row locks, so any number of API processes may run them.
+ASYNC_INGEST_WORKERS = bounded_int_env(
+    "ASYNC_INGEST_WORKERS",
+    1,
+    minimum=0,
+    maximum=64,
+)
+
+ASYNC_INGEST_POLL_SECONDS = bounded_int_env(
+    "ASYNC_INGEST_POLL_SECONDS",
+    1,
+    minimum=1,
+    maximum=60,
+)
+
+# A claimed job is committed as processing with a lease, so no row
+# lock or connection is held while it is analysed. If the worker dies,
+# another worker takes the job over once the lease runs out; keep it
+# well above the slowest inference.
+ASYNC_INGEST_LEASE_SECONDS = bounded_int_env(
+    "ASYNC_INGEST_LEASE_SECONDS",
+    300,
+    minimum=10,
+    maximum=86400,
+)
+
+# Jobs that fail with anything other than an unusable image (no face,
+# unreadable file) go back to the queue, waiting this many seconds
+# times the attempt number, until they have been tried
+# ASYNC_INGEST_MAX_ATTEMPTS times. Only then are they marked failed
+# and their image removed.
+ASYNC_INGEST_MAX_ATTEMPTS = bounded_int_env(
+    "ASYNC_INGEST_MAX_ATTEMPTS",
+    5,
+    minimum=1,
+    maximum=100,
+)
+
+ASYNC_INGEST_RETRY_SECONDS = bounded_int_env(
+    "ASYNC_INGEST_RETRY_SECONDS",
+    30,
+    minimum=0,
+    maximum=3600,
+)
+
+# A client that already cropped the face may send its box within the
+# crop (face_box form field). The box must be at least this many
+# pixels on each side and cover this share of the image; otherwise the
+# upload is refused rather than skipping detection on a full frame.
+PRECROPPED_MIN_FACE_PIXELS = bounded_int_env(
+    "PRECROPPED_MIN_FACE_PIXELS",
+    40,
+    minimum=1,
+    maximum=4096,
+)
+
+PRECROPPED_MIN_FACE_AREA_PERCENT = bounded_int_env(
+    "PRECROPPED_MIN_FACE_AREA_PERCENT",
+    15,
+    minimum=1,
+    maximum=100,
+)
+
+# Verified bank API keys and each bank's PC-prefix table are cached
+# for this long. Rotating a key or editing a branch in the dashboard
+# also clears the cache at once through PostgreSQL NOTIFY. 0 turns
+# the cache off.
+TENANT_CACHE_TTL_SECONDS = bounded_int_env(
+    "TENANT_CACHE_TTL_SECONDS",
+    60,
+    minimum=0,
+    maximum=3600,
+)
+
 MAX_UPLOAD_BYTES = int(
     os.getenv(
         "MAX_UPLOAD_BYTES",
@@ -66,6 +332,22 @@ MAX_UPLOAD_BYTES = int(
     )
 )
 
+# Threads per API process that write uploaded images to disk while
+# their frames are analysed.
+IMAGE_WRITE_WORKERS = bounded_int_env(
+    "IMAGE_WRITE_WORKERS",
+    4,
+    minimum=1,
+    maximum=64,
+)
+
+MAX_BATCH_UPLOAD_FILES = bounded_int_env(
+    "MAX_BATCH_UPLOAD_FILES",
+    25,
+    minimum=1,
+    maximum=500,
+)
+
 ALLOWED_IMAGE_TYPES = {
     "image/jpeg",
     "image/png",
@@ -89,4 +371,47 @@ DB_CONFIG = {
         "DB_SSLMODE",
         "require",
     ),
-}
\ No newline at end of file
+}
+
+# Connections kept open per API process. Every upload used to open
+# (and TLS-handshake) several connections; they are now borrowed
+# from this pool.
+DB_POOL_MAX_SIZE = bounded_int_env(
+    "DB_POOL_MAX_SIZE",
+    10,
+    minimum=1,
+    maximum=200,
+)
+
+DB_POOL_MIN_SIZE = bounded_int_env(
+    "DB_POOL_MIN_SIZE",
+    1,
+    minimum=0,
+    maximum=DB_POOL_MAX_SIZE,
+)
+
+# How long a request waits for a free connection before failing.
+DB_POOL_TIMEOUT_SECONDS = bounded_int_env(
+    "DB_POOL_TIMEOUT_SECONDS",
+    10,
+    minimum=1,
+    maximum=300,
+)
+
+# Connections idle for longer are checked with SELECT 1 before reuse.
+# 0 checks on every checkout.
+DB_POOL_IDLE_CHECK_SECONDS = bounded_int_env(
+    "DB_POOL_IDLE_CHECK_SECONDS",
+    30,
+    minimum=0,
+    maximum=3600,
+)
+
+# Connections are closed and replaced after this age so server-side
+# limits and failovers never leave a stale connection in the pool.
+DB_POOL_MAX_LIFETIME_SECONDS = bounded_int_env(
+    "DB_POOL_MAX_LIFETIME_SECONDS",
+    1800,
+    minimum=60,
+    maximum=86400,
+)
@@ -1,41 +1,358 @@
+import asyncio
 import hashlib
 import hmac
 import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from datetime import datetime, timezone
 
 import numpy as np
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2 import sql
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from psycopg2.extras import (
+    RealDictCursor,
+    execute_values,
+)
+from psycopg2.pool import ThreadedConnectionPool
+
+from .config import (
+    DB_CONFIG,
+    DB_POOL_IDLE_CHECK_SECONDS,
+    DB_POOL_MAX_LIFETIME_SECONDS,
+    DB_POOL_MAX_SIZE,
+    DB_POOL_MIN_SIZE,
+    DB_POOL_TIMEOUT_SECONDS,
+    STORE_EMBEDDING_JSON,
+    VISITOR_CENTROID_MAX_WEIGHT,
+)
+from .face_utils import update_centroid
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of PostgreSQL connections for this process.
+
+    Connections are opened lazily and reused across requests. On
+    checkout a connection that is closed, older than
+    DB_POOL_MAX_LIFETIME_SECONDS, or idle for longer than
+    DB_POOL_IDLE_CHECK_SECONDS and failing SELECT 1 is replaced.
+    On return, open transactions are rolled back and connections
+    that raised a connection-level error are closed.
+
+    A forked process builds its own pool instead of sharing the
+    parent's sockets.
+    """
+
+    def __init__(
+        self,
+        min_size=DB_POOL_MIN_SIZE,
+        max_size=DB_POOL_MAX_SIZE,
+        timeout_seconds=DB_POOL_TIMEOUT_SECONDS,
+        idle_check_seconds=DB_POOL_IDLE_CHECK_SECONDS,
+        max_lifetime_seconds=DB_POOL_MAX_LIFETIME_SECONDS,
+    ):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout_seconds = timeout_seconds
+        self.idle_check_seconds = idle_check_seconds
+        self.max_lifetime_seconds = max_lifetime_seconds
+
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._pool = None
+
+        self._slots = threading.BoundedSemaphore(
+            self.max_size
+        )
+
+        self._opened_at = {}
+        self._returned_at = {}
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is not None:
+                return self._pool
+
+            missing_settings = [
+                key
+                for key, value in DB_CONFIG.items()
+                if key != "sslmode" and not value
+            ]
+
+            if missing_settings:
+                raise RuntimeError(
+                    "Missing database settings: "
+                    + ", ".join(missing_settings)
+                )
+
+            self._pool = ThreadedConnectionPool(
+                self.min_size,
+                self.max_size,
+                **DB_CONFIG,
+            )
+
+            return self._pool
+
+    def _is_healthy(
+        self,
+        database,
+    ):
+        if database.closed:
+            return False
+
+        now = time.monotonic()
+
+        opened_at = self._opened_at.setdefault(
+            id(database),
+            now,
+        )
+
+        if now - opened_at > self.max_lifetime_seconds:
+            return False
+
+        returned_at = self._returned_at.get(
+            id(database)
+        )
+
+        # A connection that was just opened needs no ping.
+        if (
+            returned_at is None
+            or now - returned_at < self.idle_check_seconds
+        ):
+            return True
+
+        try:
+            with database.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1"
+                )
+
+            database.rollback()
+
+        except psycopg2.Error:
+            return False
+
+        return True
+
+    def _discard(
+        self,
+        pool,
+        database,
+    ):
+        self._opened_at.pop(
+            id(database),
+            None,
+        )
+
+        self._returned_at.pop(
+            id(database),
+            None,
+        )
+
+        pool.putconn(
+            database,
+            close=True,
+        )
+
+    def _checkout(
+        self,
+        pool,
+    ):
+        # Every idle connection may be stale after a database
+        # restart, so allow one attempt per pooled connection.
+        for _ in range(
+            self.max_size + 1
+        ):
+            database = pool.getconn()
+
+            if self._is_healthy(
+                database
+            ):
+                return database
+
+            self._discard(
+                pool,
+                database,
+            )
+
+        raise psycopg2.OperationalError(
+            "No healthy database connection could be opened."
+        )
+
+    def _checkin(
+        self,
+        pool,
+        database,
+        broken,
+    ):
+        if not broken and not database.closed:
+            try:
+                if (
+                    database.get_transaction_status()
+                    != TRANSACTION_STATUS_IDLE
+                ):
+                    database.rollback()
+
+            except psycopg2.Error:
+                broken = True
+
+        if broken or database.closed:
+            self._discard(
+                pool,
+                database,
+            )
+
+            return
+
+        self._returned_at[id(database)] = (
+            time.monotonic()
+        )
 
-from .config import DB_CONFIG
+        pool.putconn(
+            database
+        )
+
+    @contextmanager
+    def connection(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+
+        slots = self._slots
+
+        if not slots.acquire(
+            timeout=self.timeout_seconds
+        ):
+            raise psycopg2.OperationalError(
+                "No database connection became available within "
+                f"{self.timeout_seconds} seconds."
+            )
+
+        try:
+            pool = self._get_pool()
+
+            database = self._checkout(
+                pool
+            )
+
+            broken = False
+
+            try:
+                yield database
+
+            except (
+                psycopg2.OperationalError,
+                psycopg2.InterfaceError,
+            ):
+                broken = True
+                raise
+
+            finally:
+                self._checkin(
+                    pool,
+                    database,
+                    broken,
+                )
+
+        finally:
+            slots.release()
+
+    def close(self):
+        with self._lock:
+            pool = self._pool
+
+            if self._pid == os.getpid():
+                self._reset()
+
+        if pool is not None:
+            pool.closeall()
+
+
+DB_POOL = ConnectionPool()
 
 
 @contextmanager
 def get_db():
     """
-    Yield a PostgreSQL connection and always close it on exit.
+    Borrow a PostgreSQL connection from the process pool and return
+    it on exit. Uncommitted work is rolled back on return.
     """
-    missing_settings = [
-        key
-        for key, value in DB_CONFIG.items()
-        if key != "sslmode" and not value
-    ]
+    with DB_POOL.connection() as database:
+        yield database
 
-    if missing_settings:
-        raise RuntimeError(
-            "Missing database settings: "
-            + ", ".join(missing_settings)
-        )
 
+# Async handlers run their blocking psycopg2 work here. With one
+# thread per pooled connection, a queued call waits for a thread
+# rather than holding a thread while waiting for a connection.
+DB_EXECUTOR = ThreadPoolExecutor(
+    max_workers=DB_POOL_MAX_SIZE,
+    thread_name_prefix="db",
+)
+
+
+async def run_in_db_thread(
+    function,
+    *args,
+    **kwargs,
+):
+    """
+    Await function(database, *args, **kwargs) run on DB_EXECUTOR
+    with a pooled connection.
+    """
+    def call():
+        with get_db() as database:
+            return function(
+                database,
+                *args,
+                **kwargs,
+            )
+
+    return await asyncio.get_running_loop().run_in_executor(
+        DB_EXECUTOR,
+        call,
+    )
+
+
+def close_db_pool():
+    DB_EXECUTOR.shutdown(
+        wait=False,
+        cancel_futures=True,
+    )
+
+    DB_POOL.close()
+
+
+def connect_listener(
+    channel,
+):
+    """
+    Open a dedicated autocommit connection that LISTENs on channel.
+
+    Listening needs a connection held for the life of the process,
+    so it never comes from the pool.
+    """
     database = psycopg2.connect(
         **DB_CONFIG
     )
 
-    try:
-        yield database
-    finally:
-        database.close()
+    database.autocommit = True
+
+    with database.cursor() as cursor:
+        cursor.execute(
+            sql.SQL("LISTEN {}").format(
+                sql.Identifier(channel)
+            )
+        )
+
+    return database
 
 
 def verify_bank_api_key(
@@ -96,6 +413,39 @@ def verify_bank_api_key(
     return bank
 
 
+def get_active_branches(
+    cursor,
+    bank_id,
+):
+    """
+    Return the bank's active branches that have a PC prefix.
+    """
+    cursor.execute(
+        """
+        SELECT
+            id,
+            bank_id,
+            code,
+            name,
+            pc_prefix,
+            location
+        FROM tenant_branch
+        WHERE bank_id = %s
+          AND is_active = TRUE
+          AND pc_prefix IS NOT NULL
+          AND BTRIM(pc_prefix) <> ''
+        """,
+        (
+            bank_id,
+        ),
+    )
+
+    return [
+        dict(branch_row)
+        for branch_row in cursor.fetchall()
+    ]
+
+
 def get_branch_by_pc_name(
     cursor,
     bank_id,
@@ -129,33 +479,12 @@ def get_branch_by_pc_name(
     if not normalized_pc_name:
         return None
 
-    cursor.execute(
-        """
-        SELECT
-            id,
-            bank_id,
-            code,
-            name,
-            pc_prefix,
-            location
-        FROM tenant_branch
-        WHERE bank_id = %s
-          AND is_active = TRUE
-          AND pc_prefix IS NOT NULL
-          AND BTRIM(pc_prefix) <> ''
-        """,
-        (
-            bank_id,
-        ),
-    )
-
     matching_branches = []
 
-    for branch_row in cursor.fetchall():
-        branch = dict(
-            branch_row
-        )
-
+    for branch in get_active_branches(
+        cursor,
+        bank_id,
+    ):
         configured_prefix = (
             branch["pc_prefix"]
             or ""
@@ -195,62 +524,172 @@ def get_branch_by_pc_name(
     return matching_branches[0]
 
 
+def get_gallery_version(
+    cursor,
+    bank_id,
+):
+    """
+    Return the most recent visitor activity time of one bank.
+
+    Every saved snapshot moves its visitor's last_seen forward,
+    so this value changes whenever the bank's gallery changes.
+    last_seen comes from the database clock just before commit, so
+    a row becomes visible at most a commit's duration after its
+    stamp. The (bank, last_seen) index answers it without a scan.
+    """
+    cursor.execute(
+        """
+        SELECT MAX(last_seen) AS last_seen
+        FROM analytics_visitor
+        WHERE bank_id = %s
+        """,
+        (
+            bank_id,
+        ),
+    )
+
+    row = cursor.fetchone()
+
+    if not row:
+        return None
+
+    return row["last_seen"]
+
+
+# Byte layout of analytics_snapshot.embedding_vector.
+EMBEDDING_DTYPE = np.dtype(
+    "<f4"
+)
+
+
+def embedding_to_bytes(
+    embedding,
+):
+    return np.asarray(
+        embedding,
+        dtype=EMBEDDING_DTYPE,
+    ).tobytes()
+
+
+def embedding_from_row(
+    embedding_vector,
+    embedding_json,
+):
+    """
+    Decode a stored embedding.
+
+    The binary column is wrapped without copying; the JSON column is
+    only parsed for rows written before embedding_vector existed.
+    """
+    if embedding_vector is not None:
+        return np.frombuffer(
+            embedding_vector,
+            dtype=EMBEDDING_DTYPE,
+        )
+
+    if isinstance(
+        embedding_json,
+        str,
+    ):
+        embedding_json = json.loads(
+            embedding_json
+        )
+
+    return np.asarray(
+        embedding_json,
+        dtype=np.float32,
+    )
+
+
 def get_embeddings_db(
     cursor,
     bank_id,
+    updated_since=None,
 ):
     """
-    Return known face embeddings belonging only to one bank.
+    Return the matching embedding of every visitor of one bank.
 
     A face from one bank is never compared with a face
     belonging to another bank.
+
+    Each visitor contributes its centroid, so this reads one row per
+    visitor. Visitors that have no centroid yet fall back to their
+    latest snapshot embedding.
+
+    When updated_since is supplied, only visitors seen at or
+    after that time are returned.
     """
-    cursor.execute(
-        """
-        SELECT DISTINCT ON (visitor.face_id)
-            visitor.face_id,
-            snapshot.embedding
-        FROM analytics_snapshot AS snapshot
+    visitor_filter = ""
 
-        INNER JOIN analytics_visitor AS visitor
-            ON visitor.id = snapshot.visitor_id
+    parameters = [
+        bank_id,
+        bank_id,
+    ]
 
-        WHERE snapshot.bank_id = %s
-          AND visitor.bank_id = %s
-          AND snapshot.embedding IS NOT NULL
-          AND snapshot.status = 'done'
+    if updated_since is not None:
+        visitor_filter = (
+            "AND visitor.last_seen >= %s"
+        )
+
+        parameters.append(
+            updated_since
+        )
 
-        ORDER BY
+    cursor.execute(
+        f"""
+        SELECT
             visitor.face_id,
-            snapshot.timestamp DESC,
-            snapshot.id DESC
+            visitor.centroid,
+            latest.embedding_vector,
+            latest.embedding
+        FROM analytics_visitor AS visitor
+
+        LEFT JOIN LATERAL (
+            SELECT
+                snapshot.embedding_vector,
+                snapshot.embedding
+            FROM analytics_snapshot AS snapshot
+            WHERE visitor.centroid IS NULL
+              AND snapshot.visitor_id = visitor.id
+              AND snapshot.bank_id = %s
+              AND snapshot.status = 'done'
+              AND (
+                  snapshot.embedding_vector IS NOT NULL
+                  OR snapshot.embedding IS NOT NULL
+              )
+            ORDER BY
+                snapshot.timestamp DESC,
+                snapshot.id DESC
+            LIMIT 1
+        ) AS latest ON TRUE
+
+        WHERE visitor.bank_id = %s
+          {visitor_filter}
         """,
-        (
-            bank_id,
-            bank_id,
-        ),
+        parameters,
     )
 
     known_embeddings = []
 
     for database_row in cursor.fetchall():
         try:
-            embedding_value = (
-                database_row["embedding"]
-            )
+            if database_row["centroid"] is not None:
+                embedding_array = np.frombuffer(
+                    database_row["centroid"],
+                    dtype=EMBEDDING_DTYPE,
+                )
 
-            if isinstance(
-                embedding_value,
-                str,
+            elif (
+                database_row["embedding_vector"] is not None
+                or database_row["embedding"] is not None
             ):
-                embedding_value = json.loads(
-                    embedding_value
+                embedding_array = embedding_from_row(
+                    database_row["embedding_vector"],
+                    database_row["embedding"],
                 )
 
-            embedding_array = np.asarray(
-                embedding_value,
-                dtype=np.float64,
-            )
+            else:
+                continue
 
             known_embeddings.append(
                 (
@@ -282,56 +721,103 @@ def save_snapshot_to_db(
     emotion,
     confidence,
     emotion_vector,
+    captured_at=None,
 ):
     """
-    Save a visitor and sentiment snapshot.
+    Save a visitor and sentiment snapshot. Returns the visitor's
+    new centroid.
 
-    Every visitor and snapshot is explicitly linked to a bank.
+    Single-face wrapper around save_snapshots_to_db.
     """
-    current_time = datetime.now(
-        timezone.utc
-    )
-
-    clean_embedding = [
-        float(value)
-        for value in embedding
-    ]
+    return save_snapshots_to_db(
+        database,
+        bank_id=bank_id,
+        branch_id=branch_id,
+        pc_name=pc_name,
+        snapshots=[
+            {
+                "job_id": job_id,
+                "face_id": face_id,
+                "image_path": image_path,
+                "embedding": embedding,
+                "emotion": emotion,
+                "confidence": confidence,
+                "emotion_vector": emotion_vector,
+                "captured_at": captured_at,
+            },
+        ],
+    )[face_id]
+
+
+def save_snapshots_to_db(
+    database,
+    *,
+    bank_id,
+    branch_id,
+    pc_name,
+    snapshots,
+):
+    """
+    Save the visitors and sentiment snapshots of one or more images
+    from one computer.
 
-    clean_emotion_vector = {
-        str(emotion_name): float(emotion_value)
-        for emotion_name, emotion_value
-        in emotion_vector.items()
-    }
+    Every visitor and snapshot is explicitly linked to a bank.
 
-    embedding_json = json.dumps(
-        clean_embedding
-    )
+    Each snapshot is a dict with job_id, face_id, image_path,
+    embedding, emotion, confidence, emotion_vector and captured_at.
+    However many faces there are, this costs two round-trips: one
+    multi-row visitor upsert, and one statement that updates the
+    centroids and inserts every snapshot.
+
+    The upsert locks the visitor rows, in face ID order so
+    concurrent writers cannot deadlock, and the centroids are
+    updated in the same transaction, so concurrent API processes
+    cannot lose each other's updates. Returns the new centroid of
+    every face ID.
+
+    captured_at is the time the image was taken when it differs
+    from the processing time. The visitor's last_seen is not: the
+    embedding index discovers newly written visitors by it, so the
+    last statement before commit stamps it with the database clock.
+    A row committed long after a timestamp taken earlier could
+    otherwise fall behind a version another worker had already
+    read.
+    """
+    if not snapshots:
+        return {}
 
-    emotion_vector_json = json.dumps(
-        clean_emotion_vector
+    current_time = datetime.now(
+        timezone.utc
     )
 
     normalized_pc_name = (
         pc_name.strip().upper()
     )
 
+    # A face ID may appear more than once, for example when one
+    # visitor is in several images of a batch. ON CONFLICT cannot
+    # update the same row twice in one statement.
+    face_ids = sorted(
+        {
+            snapshot["face_id"]
+            for snapshot in snapshots
+        }
+    )
+
     with database.cursor(
         cursor_factory=RealDictCursor
     ) as cursor:
-        cursor.execute(
+        visitors = execute_values(
+            cursor,
             """
             INSERT INTO analytics_visitor (
                 bank_id,
                 face_id,
                 first_seen,
-                last_seen
-            )
-            VALUES (
-                %s,
-                %s,
-                %s,
-                %s
+                last_seen,
+                centroid_count
             )
+            VALUES %s
 
             ON CONFLICT (
                 bank_id,
@@ -340,22 +826,156 @@ def save_snapshot_to_db(
             DO UPDATE SET
                 last_seen = EXCLUDED.last_seen
 
-            RETURNING id
+            RETURNING
+                id,
+                face_id,
+                centroid,
+                centroid_count
             """,
+            [
+                (
+                    bank_id,
+                    face_id,
+                    current_time,
+                    current_time,
+                    0,
+                )
+                for face_id in face_ids
+            ],
+            page_size=len(face_ids),
+            fetch=True,
+        )
+
+        visitors_by_face_id = {
+            visitor["face_id"]: {
+                "id": visitor["id"],
+
+                "centroid": (
+                    np.frombuffer(
+                        visitor["centroid"],
+                        dtype=EMBEDDING_DTYPE,
+                    )
+                    if visitor["centroid"] is not None
+                    else None
+                ),
+
+                "centroid_count": visitor["centroid_count"],
+            }
+            for visitor in visitors
+        }
+
+        snapshot_rows = []
+
+        for snapshot in snapshots:
+            visitor = visitors_by_face_id[
+                snapshot["face_id"]
+            ]
+
+            clean_embedding = [
+                float(value)
+                for value in snapshot["embedding"]
+            ]
+
+            clean_emotion_vector = {
+                str(emotion_name): float(emotion_value)
+                for emotion_name, emotion_value
+                in snapshot["emotion_vector"].items()
+            }
+
             (
-                bank_id,
-                face_id,
-                current_time,
-                current_time,
-            ),
+                visitor["centroid"],
+                visitor["centroid_count"],
+            ) = update_centroid(
+                visitor["centroid"],
+                visitor["centroid_count"],
+                clean_embedding,
+                VISITOR_CENTROID_MAX_WEIGHT,
+            )
+
+            snapshot_rows.append(
+                (
+                    snapshot["job_id"],
+                    bank_id,
+                    branch_id,
+                    visitor["id"],
+                    normalized_pc_name,
+                    snapshot["image_path"],
+                    (
+                        snapshot.get("captured_at")
+                        or current_time
+                    ),
+                    snapshot["emotion"],
+                    snapshot["confidence"],
+                    json.dumps(
+                        clean_emotion_vector
+                    ),
+                    (
+                        json.dumps(
+                            clean_embedding
+                        )
+                        if STORE_EMBEDDING_JSON
+                        else None
+                    ),
+                    psycopg2.Binary(
+                        embedding_to_bytes(
+                            clean_embedding
+                        )
+                    ),
+                )
+            )
+
+        centroid_values = b",".join(
+            cursor.mogrify(
+                "(%s, %s::bytea, %s)",
+                (
+                    visitor["id"],
+                    (
+                        psycopg2.Binary(
+                            embedding_to_bytes(
+                                visitor["centroid"]
+                            )
+                        )
+                        if visitor["centroid"] is not None
+                        else None
+                    ),
+                    visitor["centroid_count"],
+                ),
+            )
+            for visitor in visitors_by_face_id.values()
         )
 
-        visitor_id = cursor.fetchone()[
-            "id"
-        ]
+        snapshot_values = b",".join(
+            cursor.mogrify(
+                (
+                    "(%s, %s, %s, %s, %s, %s, %s, %s, %s, "
+                    "%s::jsonb, %s::jsonb, %s, TRUE, 'done', '')"
+                ),
+                snapshot_row,
+            )
+            for snapshot_row in snapshot_rows
+        )
 
         cursor.execute(
+            b"""
+            WITH visitor_centroid AS (
+                UPDATE analytics_visitor AS visitor
+                SET
+                    centroid = centroid_update.centroid,
+                    centroid_count = centroid_update.centroid_count,
+                    last_seen = clock_timestamp()
+                FROM (
+                    VALUES
             """
+            + centroid_values
+            + b"""
+                ) AS centroid_update (
+                    id,
+                    centroid,
+                    centroid_count
+                )
+                WHERE visitor.id = centroid_update.id
+            )
+
             INSERT INTO analytics_snapshot (
                 job_id,
                 bank_id,
@@ -368,6 +988,46 @@ def save_snapshot_to_db(
                 confidence,
                 emotion_vector,
                 embedding,
+                embedding_vector,
+                processed,
+                status,
+                processing_error
+            )
+            VALUES
+            """
+            + snapshot_values
+        )
+
+    return {
+        face_id: visitor["centroid"]
+        for face_id, visitor in visitors_by_face_id.items()
+    }
+
+
+def insert_pending_snapshot(
+    database,
+    *,
+    job_id,
+    bank_id,
+    branch_id,
+    pc_name,
+    image_path,
+):
+    """
+    Record an accepted image that still has to be processed.
+    """
+    with database.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO analytics_snapshot (
+                job_id,
+                bank_id,
+                branch_id,
+                visitor_id,
+                pc_name,
+                image_path,
+                timestamp,
+                emotion,
                 processed,
                 status,
                 processing_error
@@ -376,16 +1036,13 @@ def save_snapshot_to_db(
                 %s,
                 %s,
                 %s,
+                NULL,
                 %s,
                 %s,
                 %s,
-                %s,
-                %s,
-                %s,
-                %s::jsonb,
-                %s::jsonb,
-                TRUE,
-                'done',
+                '',
+                FALSE,
+                'pending',
                 ''
             )
             """,
@@ -393,18 +1050,242 @@ def save_snapshot_to_db(
                 job_id,
                 bank_id,
                 branch_id,
-                visitor_id,
-                normalized_pc_name,
+                pc_name.strip().upper(),
                 image_path,
-                current_time,
-                emotion,
-                confidence,
-                emotion_vector_json,
-                embedding_json,
+                datetime.now(
+                    timezone.utc
+                ),
             ),
         )
 
 
+class PendingSnapshotLost(Exception):
+    """
+    The lease on a claimed job ran out and another worker took the
+    job over, so this worker's result must not be saved.
+    """
+
+
+def claim_pending_snapshot(
+    cursor,
+    lease_seconds,
+):
+    """
+    Claim the oldest queued snapshot that is due for processing.
+
+    The claimed row is marked processing, its attempt count is
+    raised and it is leased for lease_seconds. The caller commits
+    the claim before analysing the image, so no row lock is held
+    while inference runs. A processing row whose lease has run out
+    belonged to a worker that died, and is claimed again.
+
+    SKIP LOCKED lets several API workers claim at once without
+    taking the same job.
+    """
+    cursor.execute(
+        """
+        WITH claimed AS (
+            SELECT id
+            FROM analytics_snapshot
+            WHERE status IN ('pending', 'processing')
+              AND (
+                  available_at IS NULL
+                  OR available_at <= NOW()
+              )
+
+            ORDER BY timestamp
+
+            LIMIT 1
+
+            FOR UPDATE SKIP LOCKED
+        )
+        UPDATE analytics_snapshot AS snapshot
+        SET
+            status = 'processing',
+            processing_attempts = snapshot.processing_attempts + 1,
+            available_at = NOW() + %s * INTERVAL '1 second'
+        FROM
+            claimed,
+            tenant_bank AS bank,
+            tenant_branch AS branch
+        WHERE snapshot.id = claimed.id
+          AND bank.id = snapshot.bank_id
+          AND branch.id = snapshot.branch_id
+        RETURNING
+            snapshot.id,
+            snapshot.job_id,
+            snapshot.pc_name,
+            snapshot.image_path,
+            snapshot.timestamp,
+            snapshot.processing_attempts,
+            bank.id AS bank_id,
+            bank.code AS bank_code,
+            branch.id AS branch_id,
+            branch.code AS branch_code
+        """,
+        (
+            lease_seconds,
+        ),
+    )
+
+    return cursor.fetchone()
+
+
+def delete_pending_snapshot(
+    cursor,
+    snapshot_id,
+    attempt,
+):
+    """
+    Remove a claimed queued row so its processed snapshots can be
+    written under the same job ID.
+
+    attempt is the attempt number returned by the claim. Raises
+    PendingSnapshotLost when the row is no longer held by that
+    claim.
+    """
+    cursor.execute(
+        """
+        DELETE FROM analytics_snapshot
+        WHERE id = %s
+          AND status = 'processing'
+          AND processing_attempts = %s
+        """,
+        (
+            snapshot_id,
+            attempt,
+        ),
+    )
+
+    if cursor.rowcount != 1:
+        raise PendingSnapshotLost(
+            f"Snapshot {snapshot_id} is no longer claimed by "
+            f"attempt {attempt}."
+        )
+
+
+def release_pending_snapshot(
+    database,
+    snapshot_id,
+    attempt,
+    retry_delay_seconds,
+    *,
+    count_attempt=True,
+):
+    """
+    Put a claimed job back in the queue, due after
+    retry_delay_seconds.
+
+    With count_attempt=False the claim does not count towards
+    ASYNC_INGEST_MAX_ATTEMPTS, for example when inference capacity
+    was full. Returns False when the claim had already been lost.
+    """
+    with database.cursor() as cursor:
+        cursor.execute(
+            """
+            UPDATE analytics_snapshot
+            SET
+                status = 'pending',
+                processing_attempts = (
+                    processing_attempts
+                    - CASE WHEN %s THEN 0 ELSE 1 END
+                ),
+                available_at = NOW() + %s * INTERVAL '1 second'
+            WHERE id = %s
+              AND status = 'processing'
+              AND processing_attempts = %s
+            """,
+            (
+                count_attempt,
+                retry_delay_seconds,
+                snapshot_id,
+                attempt,
+            ),
+        )
+
+        return cursor.rowcount == 1
+
+
+def fail_pending_snapshot(
+    database,
+    snapshot_id,
+    attempt,
+    error_message,
+):
+    """
+    Mark a claimed job failed for good. Returns False when the
+    claim had already been lost.
+    """
+    with database.cursor() as cursor:
+        cursor.execute(
+            """
+            UPDATE analytics_snapshot
+            SET
+                status = 'failed',
+                processed = TRUE,
+                processing_error = %s,
+                available_at = NULL
+            WHERE id = %s
+              AND status = 'processing'
+              AND processing_attempts = %s
+            """,
+            (
+                error_message,
+                snapshot_id,
+                attempt,
+            ),
+        )
+
+        return cursor.rowcount == 1
+
+
+def get_job_snapshots(
+    cursor,
+    bank_id,
+    job_id,
+):
+    """
+    Return every snapshot written for one upload job.
+
+    Extra faces of a multi-face image are stored as
+    <job_id>-1, <job_id>-2 and so on.
+    """
+    cursor.execute(
+        """
+        SELECT
+            snapshot.job_id,
+            snapshot.status,
+            snapshot.emotion,
+            snapshot.confidence,
+            snapshot.processing_error,
+            snapshot.timestamp,
+            visitor.face_id
+        FROM analytics_snapshot AS snapshot
+
+        LEFT JOIN analytics_visitor AS visitor
+            ON visitor.id = snapshot.visitor_id
+
+        WHERE snapshot.bank_id = %s
+          AND (
+              snapshot.job_id = %s
+              OR snapshot.job_id LIKE %s
+          )
+
+        ORDER BY snapshot.id
+        """,
+        (
+            bank_id,
+            job_id,
+            f"{job_id}-%",
+        ),
+    )
+
+    return [
+        dict(row)
+        for row in cursor.fetchall()
+    ]
+
+
 def db_healthcheck():
     """
     Confirm that the PostgreSQL connection is working.
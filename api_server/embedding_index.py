@@ -0,0 +1,453 @@
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+
+from .config import (
+    EMBEDDING_INDEX_MAX_AGE_SECONDS,
+    EMBEDDING_INDEX_REFRESH_OVERLAP_SECONDS,
+    MATCH_THRESHOLD,
+)
+from .db_utils import (
+    get_embeddings_db,
+    get_gallery_version,
+)
+from .face_utils import normalize_embedding
+from .matchers import create_matcher
+
+
+class _EmbeddingBlock:
+    """
+    Normalised embeddings of one dimensionality.
+
+    Rows are kept in a preallocated float32 matrix that grows
+    by doubling, so adding a visitor does not copy the gallery.
+    Searches go through the configured matcher backend.
+    """
+
+    def __init__(
+        self,
+        dimension,
+    ):
+        self.dimension = dimension
+        self.size = 0
+
+        self.matrix = np.empty(
+            (
+                16,
+                dimension,
+            ),
+            dtype=np.float32,
+        )
+
+        self.face_ids = np.empty(
+            16,
+            dtype=object,
+        )
+
+        self.matcher = create_matcher()
+
+    def append(
+        self,
+        face_id,
+        unit_embedding,
+    ):
+        if self.size == len(self.face_ids):
+            capacity = self.size * 2
+
+            matrix = np.empty(
+                (
+                    capacity,
+                    self.dimension,
+                ),
+                dtype=np.float32,
+            )
+
+            matrix[:self.size] = (
+                self.matrix[:self.size]
+            )
+
+            face_ids = np.empty(
+                capacity,
+                dtype=object,
+            )
+
+            face_ids[:self.size] = (
+                self.face_ids[:self.size]
+            )
+
+            self.matrix = matrix
+            self.face_ids = face_ids
+
+        row = self.size
+
+        self.matrix[row] = unit_embedding
+        self.face_ids[row] = face_id
+        self.size += 1
+
+        self.matcher.row_added(
+            row
+        )
+
+        return row
+
+    def replace(
+        self,
+        row,
+        unit_embedding,
+    ):
+        self.matrix[row] = unit_embedding
+
+        self.matcher.row_changed(
+            row
+        )
+
+    def remove(
+        self,
+        row,
+    ):
+        """
+        Remove a row by moving the last row into its place.
+
+        Returns the face ID that moved, if any.
+        """
+        last_row = self.size - 1
+        moved_face_id = None
+
+        if row != last_row:
+            self.matrix[row] = (
+                self.matrix[last_row]
+            )
+
+            moved_face_id = (
+                self.face_ids[last_row]
+            )
+
+            self.face_ids[row] = (
+                moved_face_id
+            )
+
+        self.face_ids[last_row] = None
+        self.size = last_row
+
+        self.matcher.rows_moved()
+
+        return moved_face_id
+
+    def closest(
+        self,
+        unit_candidate,
+    ):
+        return self.matcher.closest(
+            unit_candidate,
+            self.matrix[:self.size],
+            self.face_ids[:self.size],
+        )
+
+
+class EmbeddingIndex:
+    """
+    Resident gallery of the matching centroid of every visitor
+    belonging to one bank.
+
+    The gallery is loaded once and then kept current in two ways:
+    faces saved by this process are added in place after commit,
+    and faces saved by other API workers are picked up through a
+    cheap version check on analytics_visitor.last_seen.
+    """
+
+    def __init__(
+        self,
+        bank_id,
+    ):
+        self.bank_id = bank_id
+        self.version = None
+        self.loaded_at = None
+        self.lock = threading.RLock()
+
+        self._blocks = {}
+        self._rows = {}
+
+    def __len__(self):
+        return len(
+            self._rows
+        )
+
+    def clear(self):
+        with self.lock:
+            self.version = None
+            self.loaded_at = None
+            self._blocks = {}
+            self._rows = {}
+
+    def refresh(
+        self,
+        cursor,
+    ):
+        """
+        Bring the gallery up to date with the database.
+
+        A full load runs on first use and once the gallery is
+        older than EMBEDDING_INDEX_MAX_AGE_SECONDS. Otherwise only
+        visitors seen since the loaded version are re-read.
+        """
+        with self.lock:
+            now = time.monotonic()
+
+            full_reload = (
+                self.loaded_at is None
+                or now - self.loaded_at
+                >= EMBEDDING_INDEX_MAX_AGE_SECONDS
+            )
+
+            latest_version = get_gallery_version(
+                cursor,
+                self.bank_id,
+            )
+
+            if full_reload:
+                known_embeddings = get_embeddings_db(
+                    cursor,
+                    self.bank_id,
+                )
+
+                self._blocks = {}
+                self._rows = {}
+                self.loaded_at = now
+
+            elif (
+                latest_version is not None
+                and (
+                    self.version is None
+                    or latest_version > self.version
+                )
+            ):
+                updated_since = self.version
+
+                if updated_since is not None:
+                    updated_since -= timedelta(
+                        seconds=(
+                            EMBEDDING_INDEX_REFRESH_OVERLAP_SECONDS
+                        )
+                    )
+
+                known_embeddings = get_embeddings_db(
+                    cursor,
+                    self.bank_id,
+                    updated_since=updated_since,
+                )
+
+            else:
+                return self
+
+            self.upsert_many(
+                known_embeddings
+            )
+
+            self.version = latest_version
+
+            return self
+
+    def upsert(
+        self,
+        face_id,
+        embedding,
+    ):
+        """
+        Make the embedding the gallery entry for face_id.
+        """
+        unit_embedding = normalize_embedding(
+            embedding
+        )
+
+        if unit_embedding is None:
+            return
+
+        dimension = unit_embedding.shape[0]
+
+        with self.lock:
+            existing = self._rows.get(
+                face_id
+            )
+
+            if existing is not None:
+                (
+                    existing_dimension,
+                    existing_row,
+                ) = existing
+
+                if existing_dimension == dimension:
+                    self._blocks[
+                        dimension
+                    ].replace(
+                        existing_row,
+                        unit_embedding,
+                    )
+
+                    return
+
+                moved_face_id = self._blocks[
+                    existing_dimension
+                ].remove(
+                    existing_row
+                )
+
+                if moved_face_id is not None:
+                    self._rows[moved_face_id] = (
+                        existing_dimension,
+                        existing_row,
+                    )
+
+            block = self._blocks.get(
+                dimension
+            )
+
+            if block is None:
+                block = _EmbeddingBlock(
+                    dimension
+                )
+
+                self._blocks[dimension] = block
+
+            self._rows[face_id] = (
+                dimension,
+                block.append(
+                    face_id,
+                    unit_embedding,
+                ),
+            )
+
+    def upsert_many(
+        self,
+        known_embeddings,
+    ):
+        with self.lock:
+            for face_id, embedding in known_embeddings:
+                self.upsert(
+                    face_id,
+                    embedding,
+                )
+
+    def match(
+        self,
+        embedding,
+        threshold=MATCH_THRESHOLD,
+        pending=(),
+    ):
+        """
+        Return the face ID closest to the embedding when its cosine
+        distance is below the threshold.
+
+        pending holds (face_id, embedding) pairs that belong to the
+        current, not yet committed, image.
+        """
+        candidate = normalize_embedding(
+            embedding
+        )
+
+        if candidate is None:
+            return None
+
+        best_face_id = None
+        best_distance = np.inf
+
+        with self.lock:
+            block = self._blocks.get(
+                candidate.shape[0]
+            )
+
+            if block is not None:
+                (
+                    best_face_id,
+                    best_distance,
+                ) = block.closest(
+                    candidate
+                )
+
+        for face_id, pending_embedding in pending:
+            pending_unit = normalize_embedding(
+                pending_embedding
+            )
+
+            if (
+                pending_unit is None
+                or pending_unit.shape != candidate.shape
+            ):
+                continue
+
+            distance = 1.0 - float(
+                np.clip(
+                    pending_unit @ candidate,
+                    -1.0,
+                    1.0,
+                )
+            )
+
+            if distance < best_distance:
+                best_face_id = face_id
+                best_distance = distance
+
+        if best_distance < threshold:
+            return best_face_id
+
+        return None
+
+
+class EmbeddingIndexRegistry:
+    """
+    One resident EmbeddingIndex per bank for this process.
+    """
+
+    def __init__(self):
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        bank_id,
+    ):
+        """
+        Return the bank's index. Callers refresh it under its lock.
+        """
+        with self._lock:
+            index = self._indexes.get(
+                bank_id
+            )
+
+            if index is None:
+                index = EmbeddingIndex(
+                    bank_id
+                )
+
+                self._indexes[bank_id] = index
+
+        return index
+
+    def invalidate(
+        self,
+        bank_id=None,
+    ):
+        """
+        Force a full reload of one bank, or of every bank, on
+        next use.
+        """
+        with self._lock:
+            if bank_id is None:
+                indexes = list(
+                    self._indexes.values()
+                )
+
+            elif bank_id in self._indexes:
+                indexes = [
+                    self._indexes[bank_id]
+                ]
+
+            else:
+                indexes = []
+
+        for index in indexes:
+            index.clear()
+
+
+EMBEDDING_INDEXES = EmbeddingIndexRegistry()
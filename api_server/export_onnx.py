@@ -0,0 +1,306 @@
+"""
+Export the DeepFace embedding and emotion models to ONNX and check that
+ONNX Runtime reproduces them.
+
+Run from the project root, with the export tools installed:
+
+    python -m pip install tf2onnx onnxruntime
+    python -m api_server.export_onnx --images captured_faces/FIDELITY_GH
+
+The models are written to ONNX_MODEL_DIR as <model name>.onnx. The
+parity check then feeds the same preprocessed face batches to both
+engines. It reports the cosine similarity of every embedding pair,
+how often both engines pick the same dominant emotion, and the largest
+emotion probability difference. Use --check-only to re-check models
+exported earlier. The exit status is 1 when the lowest embedding cosine
+similarity is below --min-cosine, so do not switch INFERENCE_ENGINE
+to onnx until this passes on real face crops.
+"""
+
+import argparse
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from .config import ONNX_MODEL_DIR
+from .face_analysis import (
+    emotion_batch,
+    prepare_faces,
+)
+from .inference_engines import (
+    MODEL_ROLES,
+    DeepFaceModel,
+    OnnxModel,
+    onnx_model_path,
+)
+
+
+IMAGE_SUFFIXES = {
+    ".jpg",
+    ".jpeg",
+    ".png",
+    ".webp",
+}
+
+
+def export_model(
+    role,
+    output_path,
+):
+    import tensorflow as tf
+    import tf2onnx
+
+    keras_model = DeepFaceModel(
+        role
+    ).client.model
+
+    output_path.parent.mkdir(
+        parents=True,
+        exist_ok=True,
+    )
+
+    tf2onnx.convert.from_keras(
+        keras_model,
+        input_signature=(
+            tf.TensorSpec(
+                (
+                    None,
+                    *keras_model.input_shape[1:],
+                ),
+                tf.float32,
+                name="input",
+            ),
+        ),
+        opset=13,
+        output_path=str(output_path),
+    )
+
+
+def load_face_images(
+    image_root,
+    limit,
+    generator,
+):
+    """
+    Return face crops from image_root, or random images when no
+    directory is given. Random images only prove the graphs match;
+    real crops are needed to trust the embeddings.
+    """
+    if image_root is None:
+        return [
+            generator.integers(
+                0,
+                256,
+                size=(
+                    160,
+                    160,
+                    3,
+                ),
+                dtype=np.uint8,
+            )
+            for _ in range(
+                limit
+            )
+        ]
+
+    face_images = []
+
+    for path in sorted(
+        image_root.rglob("*")
+    ):
+        if path.suffix.lower() not in IMAGE_SUFFIXES:
+            continue
+
+        face_image = cv2.imread(
+            str(path),
+            cv2.IMREAD_COLOR,
+        )
+
+        if face_image is not None:
+            face_images.append(
+                face_image
+            )
+
+        if len(face_images) >= limit:
+            break
+
+    return face_images
+
+
+def unit_rows(
+    rows,
+):
+    norms = np.linalg.norm(
+        rows,
+        axis=1,
+        keepdims=True,
+    )
+
+    norms[norms == 0] = 1.0
+
+    return rows / norms
+
+
+def check_parity(
+    face_images,
+):
+    """
+    Return (min_cosine, mean_cosine, emotion_agreement,
+    max_emotion_difference) between the DeepFace and ONNX engines.
+    """
+    deepface_embedding = DeepFaceModel(
+        "embedding"
+    )
+
+    onnx_embedding = OnnxModel(
+        "embedding"
+    )
+
+    prepared_faces = prepare_faces(
+        face_images,
+        deepface_embedding.input_size,
+    )
+
+    cosines = np.sum(
+        unit_rows(
+            deepface_embedding.predict(
+                prepared_faces
+            )
+        )
+        * unit_rows(
+            onnx_embedding.predict(
+                prepared_faces
+            )
+        ),
+        axis=1,
+    )
+
+    batch = emotion_batch(
+        prepared_faces
+    )
+
+    deepface_emotions = DeepFaceModel(
+        "emotion"
+    ).predict(
+        batch
+    )
+
+    onnx_emotions = OnnxModel(
+        "emotion"
+    ).predict(
+        batch
+    )
+
+    return (
+        float(cosines.min()),
+        float(cosines.mean()),
+        float(
+            np.mean(
+                deepface_emotions.argmax(axis=1)
+                == onnx_emotions.argmax(axis=1)
+            )
+        ),
+        float(
+            np.abs(
+                deepface_emotions - onnx_emotions
+            ).max()
+        ),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+
+    parser.add_argument(
+        "--images",
+        type=Path,
+    )
+
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=64,
+    )
+
+    parser.add_argument(
+        "--min-cosine",
+        type=float,
+        default=0.999,
+    )
+
+    parser.add_argument(
+        "--check-only",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+    )
+
+    arguments = parser.parse_args()
+
+    if not arguments.check_only:
+        for role in MODEL_ROLES:
+            output_path = onnx_model_path(
+                role
+            )
+
+            export_model(
+                role,
+                output_path,
+            )
+
+            print(
+                f"Exported {role} model to {output_path}"
+            )
+
+    face_images = load_face_images(
+        arguments.images,
+        arguments.limit,
+        np.random.default_rng(
+            arguments.seed
+        ),
+    )
+
+    if not face_images:
+        raise SystemExit(
+            f"No readable images under {arguments.images}."
+        )
+
+    (
+        min_cosine,
+        mean_cosine,
+        emotion_agreement,
+        max_emotion_difference,
+    ) = check_parity(
+        face_images
+    )
+
+    print(
+        f"Faces: {len(face_images)} | models: {ONNX_MODEL_DIR}"
+    )
+
+    print(
+        f"embedding cosine min {min_cosine:.6f} | "
+        f"mean {mean_cosine:.6f}"
+    )
+
+    print(
+        f"emotion agreement {emotion_agreement:.1%} | "
+        f"max probability difference {max_emotion_difference:.6f}"
+    )
+
+    if min_cosine < arguments.min_cosine:
+        raise SystemExit(
+            f"Embedding parity below {arguments.min_cosine}."
+        )
+
+
+if __name__ == "__main__":
+    main()
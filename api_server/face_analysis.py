@@ -0,0 +1,793 @@
+import logging
+import os
+import time
+
+import cv2
+import numpy as np
+
+from .config import (
+    DETECTOR_BACKEND,
+    EMBEDDING_MODEL,
+    INFERENCE_ENGINE,
+    INFERENCE_MAX_BATCH_FACES,
+)
+from .face_detectors import (
+    NATIVE_DETECTORS,
+    align_face_box,
+    detect_aligned_faces,
+    get_native_detector,
+)
+from .face_utils import enhance_face
+from .inference_engines import (
+    build_deepface_model,
+    get_deepface,
+    get_inference_model,
+)
+
+
+logger = logging.getLogger(
+    "face_api"
+)
+
+
+# Seconds each model took to build in this process.
+MODEL_LOAD_SECONDS = {}
+
+
+def uses_native_detector(
+    detector_backend=DETECTOR_BACKEND,
+):
+    """
+    Whether detection runs on OpenCV directly rather than through
+    DeepFace, which would load TensorFlow into an ONNX worker.
+    """
+    return (
+        INFERENCE_ENGINE == "onnx"
+        and detector_backend in NATIVE_DETECTORS
+    )
+
+
+def load_models():
+    """
+    Load the detector, embedding and emotion models into this
+    process so the first image does not pay for model builds.
+
+    The embedding and emotion models come from INFERENCE_ENGINE.
+    The detector comes from DeepFace, except that ONNX workers run
+    the opencv and yunet detectors without it.
+    """
+    started = time.perf_counter()
+
+    if uses_native_detector():
+        get_native_detector(
+            DETECTOR_BACKEND
+        )
+
+    else:
+        build_deepface_model(
+            DETECTOR_BACKEND,
+            "face_detector",
+        )
+
+    MODEL_LOAD_SECONDS["detector"] = {
+        "model": DETECTOR_BACKEND,
+
+        "engine": (
+            "opencv"
+            if uses_native_detector()
+            else "deepface"
+        ),
+
+        "load_seconds": round(
+            time.perf_counter() - started,
+            3,
+        ),
+    }
+
+    for role in (
+        "embedding",
+        "emotion",
+    ):
+        started = time.perf_counter()
+
+        model = get_inference_model(
+            role
+        )
+
+        MODEL_LOAD_SECONDS[role] = {
+            "model": model.model_name,
+
+            "engine": model.engine,
+
+            "load_seconds": round(
+                time.perf_counter() - started,
+                3,
+            ),
+        }
+
+    logger.info(
+        "Face models loaded: detector=%s embedding=%s engine=%s",
+        DETECTOR_BACKEND,
+        EMBEDDING_MODEL,
+        INFERENCE_ENGINE,
+    )
+
+
+def warm_up_models():
+    """
+    Load the models if needed and run one dummy image through
+    detection, embedding and emotion analysis.
+
+    TensorFlow builds its kernels on the first call, so without
+    this the first real upload is still slow after the models are
+    loaded. Returns this process's load and warm-up timings.
+    """
+    if not MODEL_LOAD_SECONDS:
+        load_models()
+
+    started = time.perf_counter()
+
+    dummy_face = np.full(
+        (
+            160,
+            160,
+            3,
+        ),
+        128,
+        dtype=np.uint8,
+    )
+
+    if uses_native_detector():
+        detect_aligned_faces(
+            dummy_face,
+            DETECTOR_BACKEND,
+        )
+
+    else:
+        get_deepface().extract_faces(
+            img_path=dummy_face,
+            detector_backend=DETECTOR_BACKEND,
+            enforce_detection=False,
+        )
+
+    prepared_faces = prepare_faces(
+        [
+            dummy_face,
+        ]
+    )
+
+    embed_faces(
+        prepared_faces
+    )
+
+    classify_emotions(
+        prepared_faces
+    )
+
+    return {
+        "pid": os.getpid(),
+
+        "models": dict(
+            MODEL_LOAD_SECONDS
+        ),
+
+        "warm_up_seconds": round(
+            time.perf_counter() - started,
+            3,
+        ),
+    }
+
+
+# This worker's warm_up_models() report, kept by warm_up_worker().
+WARM_UP_REPORT = {}
+
+
+def warm_up_worker():
+    """
+    Inference pool initializer: load and warm up the models before
+    the worker takes its first image.
+    """
+    WARM_UP_REPORT.update(
+        warm_up_models()
+    )
+
+
+def worker_report(
+    hold_seconds=0.0,
+):
+    """
+    Return this worker's warm-up report.
+
+    The worker is held for hold_seconds first, so calls submitted
+    together land on different idle workers.
+    """
+    time.sleep(
+        hold_seconds
+    )
+
+    return dict(
+        WARM_UP_REPORT
+    )
+
+
+# Output order of the DeepFace emotion model.
+EMOTION_LABELS = (
+    "angry",
+    "disgust",
+    "fear",
+    "happy",
+    "sad",
+    "surprise",
+    "neutral",
+)
+
+EMOTION_INPUT_SIZE = (
+    48,
+    48,
+)
+
+
+def resize_with_padding(
+    image,
+    target_size,
+):
+    """
+    Fit the image inside target_size (height, width) without
+    distorting it, padding the rest with black.
+
+    Mirrors DeepFace's own resize so batched inputs match what
+    DeepFace.represent would have produced for a single image.
+    """
+    target_height, target_width = target_size
+
+    factor = min(
+        target_height / image.shape[0],
+        target_width / image.shape[1],
+    )
+
+    resized = cv2.resize(
+        image,
+        (
+            max(
+                1,
+                int(image.shape[1] * factor),
+            ),
+            max(
+                1,
+                int(image.shape[0] * factor),
+            ),
+        ),
+    )
+
+    height_padding = target_height - resized.shape[0]
+    width_padding = target_width - resized.shape[1]
+
+    resized = cv2.copyMakeBorder(
+        resized,
+        height_padding // 2,
+        height_padding - height_padding // 2,
+        width_padding // 2,
+        width_padding - width_padding // 2,
+        cv2.BORDER_CONSTANT,
+        value=0,
+    )
+
+    if resized.shape[:2] != (
+        target_height,
+        target_width,
+    ):
+        resized = cv2.resize(
+            resized,
+            (
+                target_width,
+                target_height,
+            ),
+        )
+
+    return resized
+
+
+def prepare_faces(
+    face_images,
+    target_size=None,
+):
+    """
+    Stack BGR face images into one 0-1 float batch at the embedding
+    model's input size.
+
+    This is the only resize and normalise pass per face: the
+    embedding model takes the batch as it is, and the emotion
+    model's input is derived from it by emotion_batch().
+    """
+    if target_size is None:
+        target_size = get_inference_model(
+            "embedding"
+        ).input_size
+
+    return np.stack(
+        [
+            resize_with_padding(
+                face_image,
+                target_size,
+            )
+            for face_image in face_images
+        ]
+    ).astype(
+        np.float32
+    ) / 255.0
+
+
+def emotion_batch(
+    prepared_faces,
+):
+    """
+    Turn a prepare_faces() batch into the 48x48 grey batch the
+    emotion model takes.
+
+    The prepared faces are already padded and scaled to 0-1, so
+    this only converts to grey and shrinks each one.
+    """
+    return np.stack(
+        [
+            resize_with_padding(
+                cv2.cvtColor(
+                    prepared_face,
+                    cv2.COLOR_BGR2GRAY,
+                ),
+                EMOTION_INPUT_SIZE,
+            )
+            for prepared_face in prepared_faces
+        ]
+    )[..., np.newaxis]
+
+
+def embed_faces(
+    prepared_faces,
+):
+    """
+    Return one embedding per face of a prepare_faces() batch.
+    """
+    if not len(prepared_faces):
+        return []
+
+    return [
+        [
+            float(value)
+            for value in embedding
+        ]
+        for embedding in get_inference_model(
+            "embedding"
+        ).predict(
+            prepared_faces
+        )
+    ]
+
+
+def classify_emotions(
+    prepared_faces,
+):
+    """
+    Return (dominant_emotion, confidence, emotion_vector) for every
+    face of a prepare_faces() batch.
+    """
+    if not len(prepared_faces):
+        return []
+
+    emotions = []
+
+    for prediction in get_inference_model(
+        "emotion"
+    ).predict(
+        emotion_batch(
+            prepared_faces
+        )
+    ):
+        total = float(
+            prediction.sum()
+        ) or 1.0
+
+        emotion_vector = {
+            emotion_name: 100.0 * float(value) / total
+            for emotion_name, value in zip(
+                EMOTION_LABELS,
+                prediction,
+            )
+        }
+
+        dominant_emotion = max(
+            emotion_vector,
+            key=emotion_vector.get,
+        )
+
+        emotions.append(
+            (
+                dominant_emotion,
+                emotion_vector[dominant_emotion],
+                emotion_vector,
+            )
+        )
+
+    return emotions
+
+
+def extract_aligned_faces(
+    frame,
+    detector_backend=DETECTOR_BACKEND,
+):
+    """
+    Run the detector and return DeepFace's face dictionaries with
+    "face" as the aligned BGR uint8 crop. Raises ValueError when no
+    face is found.
+
+    DeepFace releases before 0.0.90 cannot return BGR uint8 faces,
+    so their RGB 0-1 faces are converted back.
+    """
+    if uses_native_detector(
+        detector_backend
+    ):
+        extracted_faces = [
+            {
+                "face": face_image,
+            }
+            for face_image in detect_aligned_faces(
+                frame,
+                detector_backend,
+            )
+        ]
+
+        if not extracted_faces:
+            raise ValueError(
+                "Face could not be detected."
+            )
+
+        return extracted_faces
+
+    DeepFace = get_deepface()
+
+    try:
+        return DeepFace.extract_faces(
+            img_path=frame,
+            detector_backend=detector_backend,
+            enforce_detection=True,
+            align=True,
+            color_face="bgr",
+            normalize_face=False,
+        )
+
+    except TypeError:
+        pass
+
+    extracted_faces = DeepFace.extract_faces(
+        img_path=frame,
+        detector_backend=detector_backend,
+        enforce_detection=True,
+        align=True,
+    )
+
+    for extracted_face in extracted_faces:
+        extracted_face["face"] = np.clip(
+            np.asarray(
+                extracted_face["face"]
+            )[..., ::-1] * 255.0,
+            0,
+            255,
+        ).astype(
+            np.uint8
+        )
+
+    return extracted_faces
+
+
+def detect_face_crops(
+    frame,
+    face_box=None,
+    detector_backend=DETECTOR_BACKEND,
+):
+    """
+    Detect every face in the frame and return
+    (face_index, enhanced_face) pairs.
+
+    The faces are the detector's own aligned crops, so they are not
+    cut from the frame again. With a face_box the client already
+    located the face, so the detector is skipped and only that box
+    is aligned, the same way, so both upload modes give the models
+    the same kind of crop.
+    """
+    if face_box is not None:
+        face_image = align_face_box(
+            frame,
+            face_box,
+        )
+
+        if face_image.size == 0:
+            raise ValueError(
+                "The face box could not be aligned."
+            )
+
+        return [
+            (
+                0,
+                enhance_face(
+                    face_image
+                ),
+            ),
+        ]
+
+    try:
+        extracted_faces = extract_aligned_faces(
+            frame,
+            detector_backend,
+        )
+
+    except ValueError as error:
+        raise ValueError(
+            "No face was detected in the uploaded image."
+        ) from error
+
+    if not extracted_faces:
+        raise ValueError(
+            "No face was detected in the uploaded image."
+        )
+
+    face_crops = []
+
+    for face_index, extracted_face in enumerate(
+        extracted_faces
+    ):
+        face_image = np.ascontiguousarray(
+            extracted_face.get(
+                "face",
+                (),
+            ),
+            dtype=np.uint8,
+        )
+
+        if face_image.ndim != 3 or face_image.size == 0:
+            continue
+
+        face_crops.append(
+            (
+                face_index,
+                enhance_face(
+                    face_image
+                ),
+            )
+        )
+
+    return face_crops
+
+
+def analyse_faces(
+    frame,
+    face_box=None,
+):
+    """
+    Detect every face in the frame and return its embedding and
+    emotion.
+
+    This function only runs models. It does not touch the database,
+    so it can execute inside an inference worker process.
+    """
+    frame_result = analyse_frames(
+        [
+            frame,
+        ],
+        [
+            face_box,
+        ],
+    )[0]
+
+    if "error" in frame_result:
+        raise ValueError(
+            frame_result["error"]
+        )
+
+    return frame_result["faces"]
+
+
+def analyse_frames_timed(
+    frames,
+    face_boxes=None,
+):
+    """
+    analyse_frames() that also returns how long each stage took.
+
+    Returns (frame_results, stage_timings), where stage_timings maps
+    extract_faces, prepare_faces, represent and analyze to lists of
+    seconds. It runs in an inference worker, so the API process
+    records the timings into its metrics.
+    """
+    stage_timings = {}
+
+    frame_results = analyse_frames(
+        frames,
+        face_boxes,
+        stage_timings,
+    )
+
+    return (
+        frame_results,
+        stage_timings,
+    )
+
+
+def record_stage(
+    stage_timings,
+    stage,
+    started,
+):
+    if stage_timings is not None:
+        stage_timings.setdefault(
+            stage,
+            [],
+        ).append(
+            time.perf_counter() - started
+        )
+
+
+def analyse_frames(
+    frames,
+    face_boxes=None,
+    stage_timings=None,
+):
+    """
+    Analyse several frames in one inference submission.
+
+    Detection runs per frame, except for frames whose entry in
+    face_boxes is a client-supplied box. The crops of every face in
+    every frame are then prepared once, in chunks of at most
+    INFERENCE_MAX_BATCH_FACES, and each chunk goes through the
+    embedding model and the emotion model as one shared tensor.
+
+    Each item is either {"faces": [...]} or {"error": "..."}, so one
+    unusable image does not fail the rest of the batch. Stage
+    durations are appended to stage_timings when it is given.
+    """
+    frame_results = []
+    face_owners = []
+    face_images = []
+
+    if face_boxes is None:
+        face_boxes = [
+            None,
+        ] * len(frames)
+
+    for frame, face_box in zip(
+        frames,
+        face_boxes,
+    ):
+        # Client-cropped frames skip detection and are not timed.
+        detection_timings = (
+            stage_timings
+            if face_box is None
+            else None
+        )
+
+        started = time.perf_counter()
+
+        try:
+            face_crops = detect_face_crops(
+                frame,
+                face_box,
+            )
+
+        except ValueError as error:
+            record_stage(
+                detection_timings,
+                "extract_faces",
+                started,
+            )
+
+            frame_results.append(
+                {
+                    "error": str(error),
+                }
+            )
+
+            continue
+
+        record_stage(
+            detection_timings,
+            "extract_faces",
+            started,
+        )
+
+        frame_results.append(
+            {
+                "faces": [],
+            }
+        )
+
+        for face_index, face_image in face_crops:
+            face_owners.append(
+                (
+                    len(frame_results) - 1,
+                    face_index,
+                )
+            )
+
+            face_images.append(
+                face_image
+            )
+
+    embeddings = []
+    emotions = []
+
+    for start in range(
+        0,
+        len(face_images),
+        INFERENCE_MAX_BATCH_FACES,
+    ):
+        started = time.perf_counter()
+
+        prepared_faces = prepare_faces(
+            face_images[
+                start:start + INFERENCE_MAX_BATCH_FACES
+            ]
+        )
+
+        record_stage(
+            stage_timings,
+            "prepare_faces",
+            started,
+        )
+
+        started = time.perf_counter()
+
+        embeddings.extend(
+            embed_faces(
+                prepared_faces
+            )
+        )
+
+        record_stage(
+            stage_timings,
+            "represent",
+            started,
+        )
+
+        started = time.perf_counter()
+
+        emotions.extend(
+            classify_emotions(
+                prepared_faces
+            )
+        )
+
+        record_stage(
+            stage_timings,
+            "analyze",
+            started,
+        )
+
+    for (
+        (
+            frame_number,
+            face_index,
+        ),
+        embedding,
+        (
+            emotion,
+            confidence,
+            emotion_vector,
+        ),
+    ) in zip(
+        face_owners,
+        embeddings,
+        emotions,
+    ):
+        frame_results[frame_number]["faces"].append(
+            {
+                "face_index": face_index,
+
+                "embedding": embedding,
+
+                "emotion": emotion,
+
+                "confidence": confidence,
+
+                "emotion_vector": emotion_vector,
+            }
+        )
+
+    return frame_results
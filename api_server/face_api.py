@@ -1,5 +1,8 @@
+import asyncio
 import logging
 import threading
+import time
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from typing import Annotated
 
@@ -13,28 +16,69 @@ from fastapi import (
     Form,
     Header,
     HTTPException,
+    Response,
     UploadFile,
     status,
 )
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import (
+    JSONResponse,
+    PlainTextResponse,
+)
 from psycopg2.extras import RealDictCursor
 
 from .config import (
     ALLOWED_IMAGE_TYPES,
+    ASYNC_INGEST_LEASE_SECONDS,
+    ASYNC_INGEST_MAX_ATTEMPTS,
+    ASYNC_INGEST_POLL_SECONDS,
+    ASYNC_INGEST_RETRY_SECONDS,
+    ASYNC_INGEST_WORKERS,
     CAPTURED_FACES_ROOT,
-    EMBEDDING_MODEL,
+    INFERENCE_RETRY_AFTER_SECONDS,
+    MAX_BATCH_UPLOAD_FILES,
     MAX_UPLOAD_BYTES,
+    PRECROPPED_MIN_FACE_AREA_PERCENT,
+    PRECROPPED_MIN_FACE_PIXELS,
+    TENANT_CACHE_TTL_SECONDS,
 )
 from .db_utils import (
+    PendingSnapshotLost,
+    claim_pending_snapshot,
+    close_db_pool,
     db_healthcheck,
-    get_branch_by_pc_name,
+    delete_pending_snapshot,
+    fail_pending_snapshot,
+    get_active_branches,
     get_db,
-    get_embeddings_db,
-    save_snapshot_to_db,
+    get_job_snapshots,
+    insert_pending_snapshot,
+    release_pending_snapshot,
+    run_in_db_thread,
+    save_snapshots_to_db,
     verify_bank_api_key,
 )
-from .face_utils import (
-    enhance_face,
-    match_face_id,
+from .embedding_index import EMBEDDING_INDEXES
+from .image_store import (
+    IMAGE_EXTENSIONS,
+    IMAGE_WRITER,
+    StoredImage,
+)
+from .inference_batcher import INFERENCE_BATCHER
+from .inference_pool import (
+    INFERENCE_EXECUTOR,
+    InferenceQueueFull,
+)
+from .metrics import (
+    GALLERY_LOCK_WAIT_SECONDS,
+    GALLERY_SIZE,
+    REGISTRY,
+    STAGE_SECONDS,
+    UPLOADS_TOTAL,
+)
+from .tenant_cache import (
+    TENANT_CACHE,
+    run_invalidation_listener,
 )
 
 
@@ -52,9 +96,6 @@ logger = logging.getLogger(
 )
 
 
-FACE_PROCESSING_LOCK = threading.Lock()
-
-
 app = FastAPI(
     title="Multi-bank Customer Sentiment API",
     version="3.0",
@@ -65,25 +106,6 @@ app = FastAPI(
 )
 
 
-def get_deepface():
-    """
-    Import DeepFace only when image processing is needed.
-
-    This allows the API health endpoint to start even before
-    the machine-learning model has been loaded.
-    """
-    try:
-        from deepface import DeepFace
-
-        return DeepFace
-
-    except ImportError as error:
-        raise RuntimeError(
-            "DeepFace is not installed. Run: "
-            "python -m pip install deepface tensorflow"
-        ) from error
-
-
 def authenticate_bank(
     x_bank_code: Annotated[
         str | None,
@@ -107,17 +129,27 @@ def authenticate_bank(
             ),
         )
 
-    try:
+    def load_bank():
         with get_db() as database:
             with database.cursor(
                 cursor_factory=RealDictCursor
             ) as cursor:
-                bank = verify_bank_api_key(
+                return verify_bank_api_key(
                     cursor,
                     x_bank_code,
                     x_api_key,
                 )
 
+    try:
+        with STAGE_SECONDS.time(
+            "auth_query"
+        ):
+            bank = TENANT_CACHE.verified_bank(
+                x_bank_code,
+                x_api_key,
+                load_bank,
+            )
+
     except Exception:
         logger.exception(
             "Bank authentication database error"
@@ -139,247 +171,575 @@ def authenticate_bank(
     return bank
 
 
-def detect_emotion(
-    face_image,
+def count_upload(
+    endpoint,
+    bank,
+    branch_code,
+    outcome,
+):
+    UPLOADS_TOTAL.inc(
+        endpoint,
+        bank["code"],
+        branch_code,
+        outcome,
+    )
+
+
+def count_refused_upload(
+    endpoint,
+    bank,
+    error,
 ):
     """
-    Use DeepFace to determine the dominant emotion.
+    Count an upload refused before its branch was known.
+    """
+    count_upload(
+        endpoint,
+        bank,
+        "",
+        (
+            "rejected"
+            if error.status_code < 500
+            else "failed"
+        ),
+    )
+
+
+def save_face_results(
+    database,
+    face_results,
+    *,
+    job_id,
+    bank,
+    branch,
+    pc_name,
+    relative_image_path,
+    captured_at=None,
+    pending_snapshot_id=None,
+    pending_attempt=None,
+):
     """
-    DeepFace = get_deepface()
+    Match the analysed faces of one image against the bank's gallery
+    and save the resulting records atomically.
 
-    analysis_result = DeepFace.analyze(
-        img_path=face_image,
-        actions=["emotion"],
-        enforce_detection=False,
+    When pending_snapshot_id is supplied, that queued row, claimed
+    by attempt pending_attempt, is replaced by the processed
+    snapshots in the same transaction.
+    """
+    return save_image_results(
+        database,
+        [
+            {
+                "face_results": face_results,
+                "job_id": job_id,
+                "relative_image_path": relative_image_path,
+                "captured_at": captured_at,
+                "pending_snapshot_id": pending_snapshot_id,
+                "pending_attempt": pending_attempt,
+            },
+        ],
+        bank=bank,
+        branch=branch,
+        pc_name=pc_name,
+    )[0]
+
+
+def save_image_results(
+    database,
+    images,
+    *,
+    bank,
+    branch,
+    pc_name,
+):
+    """
+    Match the analysed faces of several images from one computer
+    and save them in one transaction with two bulk statements.
+
+    Each image is a dict with face_results, job_id,
+    relative_image_path, captured_at, pending_snapshot_id and
+    pending_attempt.
+    Returns the saved faces of every image, in order. Raises
+    ValueError when an image produced no face, in which case
+    nothing is saved.
+
+    Matching and saving hold the bank's gallery lock, so two
+    concurrent images of a new visitor cannot both create a face ID
+    in this process.
+    """
+    gallery = EMBEDDING_INDEXES.get(
+        bank["id"]
     )
 
-    if isinstance(
-        analysis_result,
-        list,
-    ):
-        analysis_result = analysis_result[0]
+    lock_requested = time.perf_counter()
+
+    with gallery.lock:
+        GALLERY_LOCK_WAIT_SECONDS.set(
+            time.perf_counter() - lock_requested,
+            bank["code"],
+        )
 
-    dominant_emotion = analysis_result[
-        "dominant_emotion"
-    ]
+        try:
+            with database.cursor(
+                cursor_factory=RealDictCursor
+            ) as cursor:
+                with STAGE_SECONDS.time(
+                    "gallery_load"
+                ):
+                    gallery.refresh(
+                        cursor
+                    )
 
-    raw_emotion_vector = analysis_result[
-        "emotion"
-    ]
+                for image in images:
+                    if image.get("pending_snapshot_id") is not None:
+                        delete_pending_snapshot(
+                            cursor,
+                            image["pending_snapshot_id"],
+                            image["pending_attempt"],
+                        )
 
-    clean_emotion_vector = {
-        str(emotion_name): float(emotion_value)
-        for emotion_name, emotion_value
-        in raw_emotion_vector.items()
-    }
+            # Faces of these images are matched against each other
+            # too, but only join the resident gallery after commit.
+            new_embeddings = []
+            snapshots = []
+            saved_images = []
 
-    confidence = float(
-        clean_emotion_vector[
-            dominant_emotion
-        ]
-    )
+            for image in images:
+                saved_faces = []
 
-    return (
-        dominant_emotion,
-        confidence,
-        clean_emotion_vector,
-    )
+                for face_result in image["face_results"]:
+                    embedding = face_result[
+                        "embedding"
+                    ]
+
+                    with STAGE_SECONDS.time(
+                        "match_face_id"
+                    ):
+                        matched_face_id = gallery.match(
+                            embedding,
+                            pending=new_embeddings,
+                        )
+
+                    face_id = (
+                        matched_face_id
+                        or str(ulid.new())
+                    )
+
+                    face_index = face_result[
+                        "face_index"
+                    ]
+
+                    snapshots.append(
+                        {
+                            "job_id": (
+                                image["job_id"]
+                                if face_index == 0
+                                else f"{image['job_id']}-{face_index}"
+                            ),
+
+                            "face_id": face_id,
+
+                            "image_path": image["relative_image_path"],
+
+                            "embedding": embedding,
+
+                            "emotion": face_result["emotion"],
+
+                            "confidence": face_result["confidence"],
+
+                            "emotion_vector": face_result["emotion_vector"],
+
+                            "captured_at": image.get("captured_at"),
+                        }
+                    )
+
+                    new_embeddings.append(
+                        (
+                            face_id,
+                            embedding,
+                        )
+                    )
+
+                    saved_faces.append(
+                        {
+                            "face_id": face_id,
+                            "emotion": face_result["emotion"],
+                            "confidence": face_result["confidence"],
+                        }
+                    )
+
+                if not saved_faces:
+                    raise ValueError(
+                        "The image did not produce a valid face record."
+                    )
+
+                saved_images.append(
+                    saved_faces
+                )
+
+            with STAGE_SECONDS.time(
+                "db_write"
+            ):
+                updated_centroids = save_snapshots_to_db(
+                    database,
+                    bank_id=bank["id"],
+                    branch_id=branch["id"],
+                    pc_name=pc_name,
+                    snapshots=snapshots,
+                )
+
+            with STAGE_SECONDS.time(
+                "db_commit"
+            ):
+                database.commit()
+
+            gallery.upsert_many(
+                updated_centroids.items()
+            )
+
+            GALLERY_SIZE.set(
+                len(gallery),
+                bank["code"],
+            )
+
+            return saved_images
+
+        except Exception:
+            database.rollback()
+            raise
 
 
-def process_face_image(
+async def process_face_image(
     frame,
     *,
+    face_box=None,
     job_id,
     bank,
     branch,
     pc_name,
     relative_image_path,
+    stored_image=None,
 ):
     """
     Detect all faces, generate embeddings, match visitors,
     analyse emotions and save the resulting records atomically.
+
+    Model inference runs on the bounded inference pool, batched
+    with concurrent uploads; matching and database writes run on
+    the database threads. No thread is held while inference runs.
+    The stored_image write overlaps inference and is awaited before
+    its path is saved.
     """
-    DeepFace = get_deepface()
+    face_results = await INFERENCE_BATCHER.analyse_async(
+        frame,
+        face_box,
+    )
 
-    try:
-        extracted_faces = DeepFace.extract_faces(
-            img_path=frame,
-            enforce_detection=True,
+    if stored_image is not None:
+        await stored_image.wait_async()
+
+    return await run_in_db_thread(
+        save_face_results,
+        face_results,
+        job_id=job_id,
+        bank=bank,
+        branch=branch,
+        pc_name=pc_name,
+        relative_image_path=relative_image_path,
+    )
+
+
+def finish_pending_job(
+    job,
+    error_message=None,
+    retry_delay_seconds=0,
+    count_attempt=True,
+):
+    """
+    Fail a claimed job for good when error_message is given,
+    otherwise put it back in the queue.
+
+    The stored image is only removed once the job has failed, so a
+    retried job can still be read.
+    """
+    with get_db() as database:
+        if error_message is None:
+            release_pending_snapshot(
+                database,
+                job["id"],
+                job["processing_attempts"],
+                retry_delay_seconds,
+                count_attempt=count_attempt,
+            )
+
+            database.commit()
+
+            return
+
+        failed = fail_pending_snapshot(
+            database,
+            job["id"],
+            job["processing_attempts"],
+            error_message,
         )
 
-    except ValueError as error:
-        raise ValueError(
-            "No face was detected in the uploaded image."
-        ) from error
+        database.commit()
 
-    if not extracted_faces:
-        raise ValueError(
-            "No face was detected in the uploaded image."
+    if failed:
+        (
+            CAPTURED_FACES_ROOT
+            / job["image_path"]
+        ).unlink(
+            missing_ok=True
         )
 
+
+def process_pending_snapshot():
+    """
+    Claim and process one pending upload from the asynchronous
+    ingest queue.
+
+    The claim is committed before the image is analysed, so no row
+    lock, transaction or pooled connection is held during inference.
+    Only an unusable image (ValueError) fails a job at once; other
+    errors return it to the queue until ASYNC_INGEST_MAX_ATTEMPTS
+    claims have been made.
+
+    Returns False when no pending upload was available.
+    """
     with get_db() as database:
-        try:
-            with database.cursor(
-                cursor_factory=RealDictCursor
-            ) as cursor:
-                known_embeddings = get_embeddings_db(
-                    cursor,
-                    bank["id"],
-                )
+        with database.cursor(
+            cursor_factory=RealDictCursor
+        ) as cursor:
+            job = claim_pending_snapshot(
+                cursor,
+                ASYNC_INGEST_LEASE_SECONDS,
+            )
 
-            saved_faces = []
+        database.commit()
 
-            for face_index, extracted_face in enumerate(
-                extracted_faces
-            ):
-                facial_area = (
-                    extracted_face.get(
-                        "facial_area"
-                    )
-                    or {}
-                )
+    if not job:
+        return False
 
-                x = max(
-                    0,
-                    int(
-                        facial_area.get(
-                            "x",
-                            0,
-                        )
-                    ),
-                )
+    bank = {
+        "id": job["bank_id"],
+        "code": job["bank_code"],
+    }
 
-                y = max(
-                    0,
-                    int(
-                        facial_area.get(
-                            "y",
-                            0,
-                        )
-                    ),
-                )
+    attempt = job["processing_attempts"]
 
-                width = int(
-                    facial_area.get(
-                        "w",
-                        0,
-                    )
-                )
+    # A worker that died mid-job leaves no error to record, so a job
+    # that keeps taking its worker down ends here.
+    if attempt > ASYNC_INGEST_MAX_ATTEMPTS:
+        count_upload(
+            "ingest",
+            bank,
+            job["branch_code"],
+            "failed",
+        )
 
-                height = int(
-                    facial_area.get(
-                        "h",
-                        0,
-                    )
-                )
+        finish_pending_job(
+            job,
+            "Face and emotion processing failed.",
+        )
 
-                if width > 0 and height > 0:
-                    face_image = frame[
-                        y:y + height,
-                        x:x + width,
-                    ]
+        return True
 
-                else:
-                    face_image = frame
+    try:
+        frame = cv2.imread(
+            str(
+                CAPTURED_FACES_ROOT
+                / job["image_path"]
+            ),
+            cv2.IMREAD_COLOR,
+        )
 
-                if face_image.size == 0:
-                    continue
+        if frame is None:
+            raise ValueError(
+                "The stored image could not be read."
+            )
 
-                enhanced_face = enhance_face(
-                    face_image
-                )
+        face_results = INFERENCE_BATCHER.analyse(
+            frame
+        )
 
-                representation_results = DeepFace.represent(
-                    img_path=enhanced_face,
-                    model_name=EMBEDDING_MODEL,
-                    enforce_detection=False,
-                )
+        with get_db() as database:
+            save_face_results(
+                database,
+                face_results,
+                job_id=job["job_id"],
+                bank=bank,
+                branch={
+                    "id": job["branch_id"],
+                    "code": job["branch_code"],
+                },
+                pc_name=job["pc_name"],
+                relative_image_path=job["image_path"],
+                captured_at=job["timestamp"],
+                pending_snapshot_id=job["id"],
+                pending_attempt=attempt,
+            )
 
-                if not representation_results:
-                    continue
+    except PendingSnapshotLost:
+        logger.warning(
+            "Queued job was taken over after its lease ran out: job=%s",
+            job["job_id"],
+        )
 
-                embedding = representation_results[0][
-                    "embedding"
-                ]
+        return True
 
-                matched_face_id = match_face_id(
-                    embedding,
-                    known_embeddings,
-                )
+    except InferenceQueueFull:
+        # Inference capacity is full, which is not the job's fault.
+        finish_pending_job(
+            job,
+            count_attempt=False,
+        )
 
-                face_id = (
-                    matched_face_id
-                    or str(ulid.new())
-                )
+        time.sleep(
+            ASYNC_INGEST_POLL_SECONDS
+        )
 
-                (
-                    emotion,
-                    confidence,
-                    emotion_vector,
-                ) = detect_emotion(
-                    enhanced_face
-                )
+        return True
 
-                snapshot_job_id = (
-                    job_id
-                    if face_index == 0
-                    else f"{job_id}-{face_index}"
-                )
+    except ValueError as error:
+        count_upload(
+            "ingest",
+            bank,
+            job["branch_code"],
+            "rejected",
+        )
 
-                save_snapshot_to_db(
-                    database,
+        finish_pending_job(
+            job,
+            str(error),
+        )
 
-                    job_id=snapshot_job_id,
+        return True
 
-                    bank_id=bank["id"],
+    except Exception:
+        logger.exception(
+            (
+                "Queued face processing failed: "
+                "bank=%s branch=%s pc=%s job=%s attempt=%s"
+            ),
+            job["bank_code"],
+            job["branch_code"],
+            job["pc_name"],
+            job["job_id"],
+            attempt,
+        )
 
-                    branch_id=branch["id"],
+        if attempt >= ASYNC_INGEST_MAX_ATTEMPTS:
+            count_upload(
+                "ingest",
+                bank,
+                job["branch_code"],
+                "failed",
+            )
 
-                    face_id=face_id,
+            finish_pending_job(
+                job,
+                "Face and emotion processing failed.",
+            )
 
-                    pc_name=pc_name,
+        else:
+            count_upload(
+                "ingest",
+                bank,
+                job["branch_code"],
+                "retried",
+            )
 
-                    image_path=relative_image_path,
+            finish_pending_job(
+                job,
+                retry_delay_seconds=(
+                    ASYNC_INGEST_RETRY_SECONDS * attempt
+                ),
+            )
 
-                    embedding=embedding,
+        return True
 
-                    emotion=emotion,
+    count_upload(
+        "ingest",
+        bank,
+        job["branch_code"],
+        "processed",
+    )
 
-                    confidence=confidence,
+    return True
 
-                    emotion_vector=emotion_vector,
-                )
 
-                known_embeddings.append(
-                    (
-                        face_id,
+def run_ingest_worker(
+    stop_event,
+):
+    while not stop_event.is_set():
+        try:
+            processed = process_pending_snapshot()
 
-                        np.asarray(
-                            embedding,
-                            dtype=np.float64,
-                        ),
-                    )
-                )
+        except Exception:
+            logger.exception(
+                "Ingest worker database error"
+            )
 
-                saved_faces.append(
-                    {
-                        "face_id": face_id,
-                        "emotion": emotion,
-                        "confidence": confidence,
-                    }
-                )
+            processed = False
 
-            if not saved_faces:
-                raise ValueError(
-                    "The image did not produce a valid face record."
-                )
+        if not processed:
+            stop_event.wait(
+                ASYNC_INGEST_POLL_SECONDS
+            )
 
-            database.commit()
-            return saved_faces
 
-        except Exception:
-            database.rollback()
-            raise
+INGEST_WORKERS_STOP = threading.Event()
+
+TENANT_LISTENER_STOP = threading.Event()
+
+
+@app.on_event("startup")
+def start_inference_pool():
+    INFERENCE_EXECUTOR.start()
+
+    # Warm up in the background so liveness answers at once while
+    # readiness stays false until the models are usable.
+    threading.Thread(
+        target=INFERENCE_EXECUTOR.warm_up,
+        name="inference-warm-up",
+        daemon=True,
+    ).start()
+
+    INGEST_WORKERS_STOP.clear()
+
+    for worker_number in range(
+        ASYNC_INGEST_WORKERS
+    ):
+        threading.Thread(
+            target=run_ingest_worker,
+            args=(
+                INGEST_WORKERS_STOP,
+            ),
+            name=f"ingest-worker-{worker_number}",
+            daemon=True,
+        ).start()
+
+    if TENANT_CACHE_TTL_SECONDS:
+        TENANT_LISTENER_STOP.clear()
+
+        threading.Thread(
+            target=run_invalidation_listener,
+            args=(
+                TENANT_LISTENER_STOP,
+            ),
+            name="tenant-cache-listener",
+            daemon=True,
+        ).start()
+
+
+@app.on_event("shutdown")
+def stop_inference_pool():
+    INGEST_WORKERS_STOP.set()
+    TENANT_LISTENER_STOP.set()
+    INFERENCE_EXECUTOR.shutdown()
+    IMAGE_WRITER.shutdown()
+    close_db_pool()
 
 
 @app.get("/")
@@ -397,50 +757,106 @@ def root():
     }
 
 
-@app.get("/health")
-def health():
+def database_is_available():
     try:
-        return {
-            "status": "ok",
-            "database": db_healthcheck(),
-        }
+        return db_healthcheck()
 
     except Exception:
         logger.exception(
             "Health-check database error"
         )
 
+        return False
+
+
+@app.get("/health")
+def health():
+    """
+    Combined report: the process is live, and it is ready once the
+    models are warmed up and the database answers.
+    """
+    if not database_is_available():
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="The database is unavailable.",
         )
 
+    inference = INFERENCE_EXECUTOR.readiness()
 
-@app.post(
-    "/upload-face",
-    status_code=status.HTTP_201_CREATED,
-)
-def upload_face(
-    file: UploadFile = File(...),
+    return {
+        "status": "ok",
+        "live": True,
+        "ready": inference["ready"],
+        "database": True,
+        "inference": inference,
+    }
 
-    pc_name: str = Form(
-        ...,
-        min_length=1,
-        max_length=128,
-    ),
 
-    bank=Depends(
-        authenticate_bank
-    ),
-):
+@app.get("/health/live")
+def health_live():
     """
-    Receive an image and automatically determine its branch
-    using the supplied Windows computer name.
+    Liveness probe: the API process is up and serving requests.
+    """
+    return {
+        "status": "ok",
+        "live": True,
+    }
 
-    The client is not allowed to choose a branch manually.
+
+@app.get("/health/ready")
+def health_ready():
     """
-    normalized_pc_name = (
-        pc_name.strip().upper()
+    Readiness probe for the load balancer: 503 until the inference
+    models are warmed up and while the database is unreachable.
+    """
+    inference = INFERENCE_EXECUTOR.readiness()
+
+    database = database_is_available()
+
+    ready = bool(
+        inference["ready"]
+        and database
+    )
+
+    return JSONResponse(
+        status_code=(
+            status.HTTP_200_OK
+            if ready
+            else status.HTTP_503_SERVICE_UNAVAILABLE
+        ),
+        content={
+            "status": "ok" if ready else "unavailable",
+            "ready": ready,
+            "database": database,
+            "inference": inference,
+        },
+    )
+
+
+@app.get("/metrics")
+def metrics():
+    """
+    Stage latencies, upload outcomes and gallery gauges of this API
+    process in the Prometheus text format.
+    """
+    return PlainTextResponse(
+        REGISTRY.render(),
+        media_type="text/plain; version=0.0.4",
+    )
+
+
+def resolve_branch(
+    bank,
+    pc_name,
+):
+    """
+    Validate the computer name and find the bank branch it
+    belongs to.
+
+    The client is not allowed to choose a branch manually.
+    """
+    normalized_pc_name = (
+        pc_name.strip().upper()
     )
 
     if not normalized_pc_name:
@@ -459,6 +875,144 @@ def upload_face(
             detail="An invalid image storage path was generated.",
         )
 
+    def load_branches():
+        with get_db() as database:
+            with database.cursor(
+                cursor_factory=RealDictCursor
+            ) as cursor:
+                return get_active_branches(
+                    cursor,
+                    bank["id"],
+                )
+
+    try:
+        with STAGE_SECONDS.time(
+            "branch_lookup"
+        ):
+            branch = TENANT_CACHE.branch_for_pc(
+                bank["id"],
+                normalized_pc_name,
+                load_branches,
+            )
+
+    except Exception:
+        logger.exception(
+            "Branch lookup failed for bank=%s pc=%s",
+            bank["code"],
+            normalized_pc_name,
+        )
+
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=(
+                "The database could not determine "
+                "the computer's branch."
+            ),
+        )
+
+    if not branch:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=(
+                f"Computer '{normalized_pc_name}' is not "
+                f"assigned to any active branch of "
+                f"{bank['name']}. "
+                "Configure a matching PC prefix in the "
+                "branch settings."
+            ),
+        )
+
+    return (
+        normalized_pc_name,
+        branch,
+    )
+
+
+def parse_face_box(
+    value,
+    frame,
+):
+    """
+    Parse a client face box "x,y,width,height" within the uploaded
+    image.
+
+    A valid box marks the upload as pre-cropped: server-side face
+    detection is skipped. The box must lie inside the image and cover
+    most of it, so a full frame cannot bypass detection.
+    """
+    if not value or not value.strip():
+        return None
+
+    try:
+        (
+            x,
+            y,
+            width,
+            height,
+        ) = (
+            int(part)
+            for part in value.split(",")
+        )
+
+    except ValueError:
+        raise ValueError(
+            "face_box must be four integers: x,y,width,height."
+        ) from None
+
+    frame_height, frame_width = frame.shape[:2]
+
+    if (
+        x < 0
+        or y < 0
+        or x + width > frame_width
+        or y + height > frame_height
+    ):
+        raise ValueError(
+            "face_box lies outside the uploaded image."
+        )
+
+    if min(
+        width,
+        height,
+    ) < PRECROPPED_MIN_FACE_PIXELS:
+        raise ValueError(
+            "face_box is too small for face recognition."
+        )
+
+    if (
+        width * height * 100
+        < frame_width
+        * frame_height
+        * PRECROPPED_MIN_FACE_AREA_PERCENT
+    ):
+        raise ValueError(
+            "face_box covers too little of the image; "
+            "upload a face crop or omit face_box."
+        )
+
+    return (
+        x,
+        y,
+        width,
+        height,
+    )
+
+
+def store_upload(
+    file,
+    bank,
+    branch,
+    pc_name,
+    face_box=None,
+):
+    """
+    Validate and decode an uploaded image and store it under a new
+    job ID.
+
+    The uploaded bytes are decoded once for inference and written to
+    disk unchanged, in the background, instead of re-encoding the
+    decoded frame. upload["image"] tracks that write.
+    """
     if (
         file.content_type
         not in ALLOWED_IMAGE_TYPES
@@ -486,10 +1040,13 @@ def upload_face(
         np.uint8,
     )
 
-    frame = cv2.imdecode(
-        image_array,
-        cv2.IMREAD_COLOR,
-    )
+    with STAGE_SECONDS.time(
+        "decode"
+    ):
+        frame = cv2.imdecode(
+            image_array,
+            cv2.IMREAD_COLOR,
+        )
 
     if frame is None:
         raise HTTPException(
@@ -498,41 +1055,15 @@ def upload_face(
         )
 
     try:
-        with get_db() as database:
-            with database.cursor(
-                cursor_factory=RealDictCursor
-            ) as cursor:
-                branch = get_branch_by_pc_name(
-                    cursor,
-                    bank["id"],
-                    normalized_pc_name,
-                )
-
-    except Exception:
-        logger.exception(
-            "Branch lookup failed for bank=%s pc=%s",
-            bank["code"],
-            normalized_pc_name,
+        parsed_face_box = parse_face_box(
+            face_box,
+            frame,
         )
 
+    except ValueError as error:
         raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail=(
-                "The database could not determine "
-                "the computer's branch."
-            ),
-        )
-
-    if not branch:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail=(
-                f"Computer '{normalized_pc_name}' is not "
-                f"assigned to any active branch of "
-                f"{bank['name']}. "
-                "Configure a matching PC prefix in the "
-                "branch settings."
-            ),
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(error),
         )
 
     job_id = str(
@@ -542,8 +1073,8 @@ def upload_face(
     relative_image_path = str(
         Path(bank["code"])
         / branch["code"]
-        / normalized_pc_name
-        / f"{job_id}.jpg"
+        / pc_name
+        / f"{job_id}{IMAGE_EXTENSIONS[file.content_type]}"
     )
 
     absolute_image_path = (
@@ -560,41 +1091,176 @@ def upload_face(
             detail="An invalid image storage path was generated.",
         )
 
-    absolute_image_path.parent.mkdir(
-        parents=True,
-        exist_ok=True,
+    stored_image = StoredImage(
+        absolute_image_path,
+        uploaded_data,
     )
 
-    image_saved = cv2.imwrite(
-        str(absolute_image_path),
-        frame,
+    return {
+        "job_id": job_id,
+        "pc_name": pc_name,
+        "frame": frame,
+        "face_box": parsed_face_box,
+        "branch": branch,
+        "relative_image_path": relative_image_path,
+        "absolute_image_path": absolute_image_path,
+        "image": stored_image,
+    }
+
+
+def accept_upload(
+    file,
+    pc_name,
+    bank,
+    face_box=None,
+):
+    (
+        normalized_pc_name,
+        branch,
+    ) = resolve_branch(
+        bank,
+        pc_name,
     )
 
-    if not image_saved:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="The uploaded image could not be saved.",
+    return store_upload(
+        file,
+        bank,
+        branch,
+        normalized_pc_name,
+        face_box,
+    )
+
+
+def upload_summary(
+    upload,
+    bank,
+):
+    branch = upload["branch"]
+
+    return {
+        "job_id": upload["job_id"],
+
+        "bank": {
+            "code": bank["code"],
+            "name": bank["name"],
+        },
+
+        "branch": {
+            "code": branch["code"],
+            "name": branch["name"],
+            "matched_pc_prefix": (
+                branch["matched_prefix"]
+            ),
+        },
+
+        "pc_name": upload["pc_name"],
+    }
+
+
+@app.post(
+    "/upload-face",
+    status_code=status.HTTP_201_CREATED,
+)
+async def upload_face(
+    file: UploadFile = File(...),
+
+    pc_name: str = Form(
+        ...,
+        min_length=1,
+        max_length=128,
+    ),
+
+    face_box: str | None = Form(
+        default=None,
+        max_length=64,
+    ),
+
+    bank=Depends(
+        authenticate_bank
+    ),
+):
+    """
+    Receive an image and automatically determine its branch
+    using the supplied Windows computer name.
+
+    The image is processed before the response is returned. A
+    face_box "x,y,width,height" marks the image as a face crop that
+    the client already detected, and skips server-side detection.
+
+    The handler is async: decoding and database work run on worker
+    threads, and waiting for inference holds no thread at all.
+    """
+    try:
+        upload = await run_in_threadpool(
+            accept_upload,
+            file,
+            pc_name,
+            bank,
+            face_box,
+        )
+
+    except HTTPException as error:
+        count_refused_upload(
+            "upload-face",
+            bank,
+            error,
         )
 
+        raise
+
+    branch = upload["branch"]
+    stored_image = upload["image"]
+
     try:
-        with FACE_PROCESSING_LOCK:
-            processed_faces = process_face_image(
-                frame,
+        processed_faces = await process_face_image(
+            upload["frame"],
 
-                job_id=job_id,
+            face_box=upload["face_box"],
 
-                bank=bank,
+            job_id=upload["job_id"],
 
-                branch=branch,
+            bank=bank,
 
-                pc_name=normalized_pc_name,
+            branch=branch,
 
-                relative_image_path=relative_image_path,
-            )
+            pc_name=upload["pc_name"],
+
+            relative_image_path=upload["relative_image_path"],
+
+            stored_image=stored_image,
+        )
+
+    except InferenceQueueFull:
+        stored_image.discard()
+
+        count_upload(
+            "upload-face",
+            bank,
+            branch["code"],
+            "busy",
+        )
+
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=(
+                "The face API is busy. "
+                "Retry the upload shortly."
+            ),
+            headers={
+                "Retry-After": str(
+                    INFERENCE_RETRY_AFTER_SECONDS
+                ),
+            },
+        )
 
     except ValueError as error:
-        absolute_image_path.unlink(
-            missing_ok=True
+        stored_image.discard()
+
+        count_upload(
+            "upload-face",
+            bank,
+            branch["code"],
+            "rejected",
         )
 
         raise HTTPException(
@@ -602,6 +1268,28 @@ def upload_face(
             detail=str(error),
         )
 
+    except OSError:
+        logger.exception(
+            "Could not store upload: bank=%s pc=%s job=%s",
+            bank["code"],
+            upload["pc_name"],
+            upload["job_id"],
+        )
+
+        stored_image.discard()
+
+        count_upload(
+            "upload-face",
+            bank,
+            branch["code"],
+            "failed",
+        )
+
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="The uploaded image could not be saved.",
+        )
+
     except Exception:
         logger.exception(
             (
@@ -610,12 +1298,17 @@ def upload_face(
             ),
             bank["code"],
             branch["code"],
-            normalized_pc_name,
-            job_id,
+            upload["pc_name"],
+            upload["job_id"],
         )
 
-        absolute_image_path.unlink(
-            missing_ok=True
+        stored_image.discard()
+
+        count_upload(
+            "upload-face",
+            bank,
+            branch["code"],
+            "failed",
         )
 
         raise HTTPException(
@@ -623,10 +1316,523 @@ def upload_face(
             detail="Face and emotion processing failed.",
         )
 
+    count_upload(
+        "upload-face",
+        bank,
+        branch["code"],
+        "processed",
+    )
+
     return {
         "status": "processed",
 
-        "job_id": job_id,
+        **upload_summary(
+            upload,
+            bank,
+        ),
+
+        "faces": processed_faces,
+    }
+
+
+def queue_upload(
+    database,
+    upload,
+    bank,
+):
+    insert_pending_snapshot(
+        database,
+        job_id=upload["job_id"],
+        bank_id=bank["id"],
+        branch_id=upload["branch"]["id"],
+        pc_name=upload["pc_name"],
+        image_path=upload["relative_image_path"],
+    )
+
+    database.commit()
+
+
+@app.post(
+    "/upload-face/async",
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def upload_face_async(
+    file: UploadFile = File(...),
+
+    pc_name: str = Form(
+        ...,
+        min_length=1,
+        max_length=128,
+    ),
+
+    bank=Depends(
+        authenticate_bank
+    ),
+):
+    """
+    Store an image and queue it for background processing.
+
+    The response returns immediately with a job ID that can be
+    polled through GET /jobs/{job_id}.
+    """
+    try:
+        upload = await run_in_threadpool(
+            accept_upload,
+            file,
+            pc_name,
+            bank,
+        )
+
+    except HTTPException as error:
+        count_refused_upload(
+            "upload-face-async",
+            bank,
+            error,
+        )
+
+        raise
+
+    try:
+        # The ingest worker reads the stored file, so it must be on
+        # disk before the job becomes visible.
+        await upload["image"].wait_async()
+
+        await run_in_db_thread(
+            queue_upload,
+            upload,
+            bank,
+        )
+
+    except Exception:
+        logger.exception(
+            "Could not queue upload: bank=%s pc=%s job=%s",
+            bank["code"],
+            upload["pc_name"],
+            upload["job_id"],
+        )
+
+        upload["image"].discard()
+
+        count_upload(
+            "upload-face-async",
+            bank,
+            upload["branch"]["code"],
+            "failed",
+        )
+
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The upload could not be queued.",
+        )
+
+    count_upload(
+        "upload-face-async",
+        bank,
+        upload["branch"]["code"],
+        "queued",
+    )
+
+    return {
+        "status": "pending",
+
+        **upload_summary(
+            upload,
+            bank,
+        ),
+    }
+
+
+@app.get("/jobs/{job_id}")
+def get_job(
+    job_id: str,
+
+    bank=Depends(
+        authenticate_bank
+    ),
+):
+    """
+    Return the processing status and result of an upload job.
+    """
+    normalized_job_id = (
+        job_id.strip().upper()
+    )
+
+    if (
+        len(normalized_job_id) != 26
+        or not normalized_job_id.isalnum()
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="The job was not found.",
+        )
+
+    try:
+        with get_db() as database:
+            with database.cursor(
+                cursor_factory=RealDictCursor
+            ) as cursor:
+                snapshots = get_job_snapshots(
+                    cursor,
+                    bank["id"],
+                    normalized_job_id,
+                )
+
+    except Exception:
+        logger.exception(
+            "Job lookup failed for bank=%s job=%s",
+            bank["code"],
+            normalized_job_id,
+        )
+
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The database is currently unavailable.",
+        )
+
+    if not snapshots:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="The job was not found.",
+        )
+
+    job_status = snapshots[0]["status"]
+
+    # Clients only know pending, done and failed.
+    if job_status == "processing":
+        job_status = "pending"
+
+    response = {
+        "job_id": normalized_job_id,
+        "status": job_status,
+    }
+
+    if job_status == "done":
+        response["faces"] = [
+            {
+                "face_id": snapshot["face_id"],
+                "emotion": snapshot["emotion"],
+                "confidence": snapshot["confidence"],
+            }
+            for snapshot in snapshots
+        ]
+
+    elif job_status == "failed":
+        response["error"] = (
+            snapshots[0]["processing_error"]
+        )
+
+    return response
+
+
+def parse_captured_at(
+    value,
+):
+    """
+    Parse a client capture timestamp.
+
+    Naive values are treated as UTC. Missing, invalid or future
+    timestamps fall back to the processing time.
+    """
+    if not value:
+        return None
+
+    try:
+        captured_at = datetime.fromisoformat(
+            value.strip()
+        )
+
+    except ValueError:
+        return None
+
+    if captured_at.tzinfo is None:
+        captured_at = captured_at.replace(
+            tzinfo=timezone.utc
+        )
+
+    if captured_at > datetime.now(
+        timezone.utc
+    ) + timedelta(
+        minutes=5
+    ):
+        return None
+
+    return captured_at
+
+
+@app.post("/upload-faces/batch")
+async def upload_faces_batch(
+    response: Response,
+
+    files: list[UploadFile] = File(...),
+
+    pc_name: str = Form(
+        ...,
+        min_length=1,
+        max_length=128,
+    ),
+
+    captured_at: list[str] = Form(
+        default=[],
+    ),
+
+    face_box: list[str] = Form(
+        default=[],
+    ),
+
+    bank=Depends(
+        authenticate_bank
+    ),
+):
+    """
+    Receive several images from one computer, for example when a
+    branch PC drains its offline queue.
+
+    The bank and branch are resolved once. Every image gets its own
+    result, so the client can delete exactly the images that were
+    processed and retry only those reported busy or failed.
+    captured_at and face_box values, when supplied, are matched to
+    files by position; an empty face_box means the image needs
+    server-side detection.
+    """
+    try:
+        if len(files) > MAX_BATCH_UPLOAD_FILES:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=(
+                    "A batch may contain at most "
+                    f"{MAX_BATCH_UPLOAD_FILES} images."
+                ),
+            )
+
+        (
+            normalized_pc_name,
+            branch,
+        ) = await run_in_threadpool(
+            resolve_branch,
+            bank,
+            pc_name,
+        )
+
+    except HTTPException as error:
+        for _ in files:
+            count_refused_upload(
+                "upload-faces-batch",
+                bank,
+                error,
+            )
+
+        raise
+
+    results = []
+    uploads = []
+
+    for file_index, file in enumerate(
+        files
+    ):
+        result = {
+            "index": file_index,
+            "filename": file.filename,
+        }
+
+        results.append(
+            result
+        )
+
+        try:
+            upload = await run_in_threadpool(
+                store_upload,
+                file,
+                bank,
+                branch,
+                normalized_pc_name,
+                (
+                    face_box[file_index]
+                    if file_index < len(face_box)
+                    else None
+                ),
+            )
+
+        except HTTPException as error:
+            result["status"] = (
+                "rejected"
+                if error.status_code < 500
+                else "failed"
+            )
+
+            result["detail"] = error.detail
+            continue
+
+        upload["captured_at"] = parse_captured_at(
+            captured_at[file_index]
+            if file_index < len(captured_at)
+            else None
+        )
+
+        upload["result"] = result
+        result["job_id"] = upload["job_id"]
+
+        uploads.append(
+            upload
+        )
+
+    # Every image joins the shared inference batches on its own, so
+    # a full queue or a failed batch only affects the images in it.
+    inference_results = await asyncio.gather(
+        *(
+            INFERENCE_BATCHER.analyse_async(
+                upload["frame"],
+                upload["face_box"],
+            )
+            for upload in uploads
+        ),
+        return_exceptions=True,
+    )
+
+    analysed_uploads = []
+
+    for upload, face_results in zip(
+        uploads,
+        inference_results,
+    ):
+        if isinstance(
+            face_results,
+            BaseException,
+        ):
+            upload["image"].discard()
+
+            if isinstance(
+                face_results,
+                InferenceQueueFull,
+            ):
+                upload["result"]["status"] = "busy"
+                upload["result"]["detail"] = (
+                    "The face API is busy. "
+                    "Retry the upload shortly."
+                )
+
+            elif isinstance(
+                face_results,
+                ValueError,
+            ):
+                upload["result"]["status"] = "rejected"
+                upload["result"]["detail"] = str(
+                    face_results
+                )
+
+            else:
+                logger.error(
+                    (
+                        "Batch face processing failed: "
+                        "bank=%s pc=%s job=%s"
+                    ),
+                    bank["code"],
+                    normalized_pc_name,
+                    upload["job_id"],
+                    exc_info=face_results,
+                )
+
+                upload["result"]["status"] = "failed"
+                upload["result"]["detail"] = (
+                    "Face and emotion processing failed."
+                )
+
+            continue
+
+        if not face_results:
+            upload["image"].discard()
+
+            upload["result"]["status"] = "rejected"
+            upload["result"]["detail"] = (
+                "The image did not produce a valid face record."
+            )
+            continue
+
+        try:
+            await upload["image"].wait_async()
+
+        except OSError:
+            logger.exception(
+                "Could not store upload: bank=%s pc=%s job=%s",
+                bank["code"],
+                normalized_pc_name,
+                upload["job_id"],
+            )
+
+            upload["image"].discard()
+
+            upload["result"]["status"] = "failed"
+            upload["result"]["detail"] = (
+                "The uploaded image could not be saved."
+            )
+            continue
+
+        upload["face_results"] = face_results
+
+        analysed_uploads.append(
+            upload
+        )
+
+    if analysed_uploads:
+        # Every analysed image is saved in one transaction with two
+        # bulk statements rather than two round-trips per face.
+        try:
+            saved_images = await run_in_db_thread(
+                save_image_results,
+                analysed_uploads,
+                bank=bank,
+                branch=branch,
+                pc_name=normalized_pc_name,
+            )
+
+        except Exception:
+            logger.exception(
+                (
+                    "Face processing failed: "
+                    "bank=%s branch=%s pc=%s jobs=%s"
+                ),
+                bank["code"],
+                branch["code"],
+                normalized_pc_name,
+                [
+                    upload["job_id"]
+                    for upload in analysed_uploads
+                ],
+            )
+
+            for upload in analysed_uploads:
+                upload["image"].discard()
+
+                upload["result"]["status"] = "failed"
+                upload["result"]["detail"] = (
+                    "Face and emotion processing failed."
+                )
+
+        else:
+            for upload, saved_faces in zip(
+                analysed_uploads,
+                saved_images,
+            ):
+                upload["result"]["faces"] = saved_faces
+                upload["result"]["status"] = "processed"
+
+    for result in results:
+        count_upload(
+            "upload-faces-batch",
+            bank,
+            branch["code"],
+            result["status"],
+        )
+
+    if any(
+        result["status"] == "busy"
+        for result in results
+    ):
+        response.headers["Retry-After"] = str(
+            INFERENCE_RETRY_AFTER_SECONDS
+        )
+
+    return {
+        "status": "processed",
 
         "bank": {
             "code": bank["code"],
@@ -643,5 +1849,5 @@ def upload_face(
 
         "pc_name": normalized_pc_name,
 
-        "faces": processed_faces,
-    }
\ No newline at end of file
+        "results": results,
+    }
@@ -0,0 +1,585 @@
+"""
+Face detection and alignment with OpenCV alone.
+
+DeepFace imports TensorFlow even when it only runs an OpenCV
+detector. With INFERENCE_ENGINE=onnx the opencv and yunet backends run
+from here instead, so inference workers never load TensorFlow. Faces
+located by the client (face_box uploads) are aligned here under
+either engine.
+
+Detection and alignment follow DeepFace's extract_faces(align=True)
+for the same backends. The image is bordered with black by half its
+size, each face is rotated about the bordered image's centre until
+its eyes are level, and the face box is projected into the rotated
+image. The crops therefore match what the deepface engine produces,
+and both engines can share one gallery.
+"""
+
+import math
+import os
+
+import cv2
+
+from .config import YUNET_MODEL_PATH
+
+
+NATIVE_DETECTORS = (
+    "opencv",
+    "yunet",
+)
+
+
+def cascade(
+    file_name,
+):
+    classifier = cv2.CascadeClassifier(
+        os.path.join(
+            cv2.data.haarcascades,
+            file_name,
+        )
+    )
+
+    if classifier.empty():
+        raise RuntimeError(
+            f"The OpenCV cascade {file_name} could not be loaded."
+        )
+
+    return classifier
+
+
+_EYE_CASCADE = None
+
+
+def find_eyes(
+    face_image,
+):
+    """
+    Return the (left_eye, right_eye) centres in face_image, or
+    (None, None) when two eyes are not found.
+
+    The two largest eye cascade hits are used; the one further
+    right in the image is the person's left eye.
+    """
+    global _EYE_CASCADE
+
+    if face_image.shape[0] == 0 or face_image.shape[1] == 0:
+        return (
+            None,
+            None,
+        )
+
+    if _EYE_CASCADE is None:
+        _EYE_CASCADE = cascade(
+            "haarcascade_eye.xml"
+        )
+
+    eyes = sorted(
+        _EYE_CASCADE.detectMultiScale(
+            cv2.cvtColor(
+                face_image,
+                cv2.COLOR_BGR2GRAY,
+            ),
+            1.1,
+            10,
+        ),
+        key=lambda eye: abs(eye[2] * eye[3]),
+        reverse=True,
+    )
+
+    if len(eyes) < 2:
+        return (
+            None,
+            None,
+        )
+
+    (
+        right_eye,
+        left_eye,
+    ) = sorted(
+        eyes[:2],
+        key=lambda eye: eye[0],
+    )
+
+    return tuple(
+        (
+            int(eye[0] + eye[2] / 2),
+            int(eye[1] + eye[3] / 2),
+        )
+        for eye in (
+            left_eye,
+            right_eye,
+        )
+    )
+
+
+def project_facial_area(
+    facial_area,
+    angle,
+    size,
+):
+    """
+    Return where the (x1, y1, x2, y2) facial_area lies after an
+    image of size (height, width) is rotated by angle degrees about
+    its centre, clipped to the image.
+    """
+    direction = (
+        1
+        if angle >= 0
+        else -1
+    )
+
+    angle = abs(angle) % 360
+
+    if angle == 0:
+        return facial_area
+
+    angle = math.radians(
+        angle
+    )
+
+    height, width = size
+
+    x = (facial_area[0] + facial_area[2]) / 2 - width / 2
+    y = (facial_area[1] + facial_area[3]) / 2 - height / 2
+
+    x_new = (
+        x * math.cos(angle)
+        + y * direction * math.sin(angle)
+        + width / 2
+    )
+
+    y_new = (
+        -x * direction * math.sin(angle)
+        + y * math.cos(angle)
+        + height / 2
+    )
+
+    half_width = (facial_area[2] - facial_area[0]) / 2
+    half_height = (facial_area[3] - facial_area[1]) / 2
+
+    return (
+        max(
+            int(x_new - half_width),
+            0,
+        ),
+        max(
+            int(y_new - half_height),
+            0,
+        ),
+        min(
+            int(x_new + half_width),
+            width,
+        ),
+        min(
+            int(y_new + half_height),
+            height,
+        ),
+    )
+
+
+def alignment_border(
+    image,
+):
+    """
+    Return the (height, width) of the black border DeepFace adds
+    around an image before aligning its faces.
+    """
+    return (
+        int(0.5 * image.shape[0]),
+        int(0.5 * image.shape[1]),
+    )
+
+
+def align_face(
+    image,
+    face_box,
+    left_eye,
+    right_eye,
+    border=(
+        0,
+        0,
+    ),
+):
+    """
+    Return the face in face_box with its eyes level, cut as DeepFace
+    cuts it from the whole rotated image.
+
+    Coordinates are in image; border is how far image sits inside
+    the bordered image that is rotated. Only the face's own pixels
+    are warped, so neither the border nor the whole rotated image
+    is ever built.
+    """
+    x, y, width, height = face_box
+
+    if left_eye is None or right_eye is None:
+        return image[
+            max(y, 0):y + height,
+            max(x, 0):x + width,
+        ]
+
+    angle = math.degrees(
+        math.atan2(
+            left_eye[1] - right_eye[1],
+            left_eye[0] - right_eye[0],
+        )
+    )
+
+    height_border, width_border = border
+
+    bordered_height = image.shape[0] + 2 * height_border
+    bordered_width = image.shape[1] + 2 * width_border
+
+    (
+        x1,
+        y1,
+        x2,
+        y2,
+    ) = project_facial_area(
+        (
+            x + width_border,
+            y + height_border,
+            x + width_border + width,
+            y + height_border + height,
+        ),
+        angle,
+        (
+            bordered_height,
+            bordered_width,
+        ),
+    )
+
+    if x2 <= x1 or y2 <= y1:
+        return image[:0, :0]
+
+    rotation = cv2.getRotationMatrix2D(
+        (
+            bordered_width // 2 - width_border,
+            bordered_height // 2 - height_border,
+        ),
+        angle,
+        1.0,
+    )
+
+    rotation[0, 2] += width_border - x1
+    rotation[1, 2] += height_border - y1
+
+    return cv2.warpAffine(
+        image,
+        rotation,
+        (
+            int(x2 - x1),
+            int(y2 - y1),
+        ),
+        flags=cv2.INTER_CUBIC,
+        borderMode=cv2.BORDER_CONSTANT,
+        borderValue=(
+            0,
+            0,
+            0,
+        ),
+    )
+
+
+def align_face_box(
+    frame,
+    face_box,
+):
+    """
+    Return the client-supplied face_box of frame aligned like a
+    detected face, using the eye cascade to find the eyes.
+    """
+    x, y, width, height = face_box
+
+    (
+        left_eye,
+        right_eye,
+    ) = find_eyes(
+        frame[
+            y:y + height,
+            x:x + width,
+        ]
+    )
+
+    if left_eye is not None:
+        left_eye = (
+            x + left_eye[0],
+            y + left_eye[1],
+        )
+
+        right_eye = (
+            x + right_eye[0],
+            y + right_eye[1],
+        )
+
+    return align_face(
+        frame,
+        face_box,
+        left_eye,
+        right_eye,
+        alignment_border(
+            frame
+        ),
+    )
+
+
+class HaarDetector:
+    """
+    OpenCV's frontal face cascade, DeepFace's "opencv" backend.
+    """
+
+    name = "opencv"
+
+    def __init__(self):
+        self._cascade = cascade(
+            "haarcascade_frontalface_default.xml"
+        )
+
+    def detect(
+        self,
+        image,
+    ):
+        """
+        Return (face_box, left_eye, right_eye) for every face.
+        """
+        (
+            faces,
+            _,
+            _,
+        ) = self._cascade.detectMultiScale3(
+            cv2.cvtColor(
+                image,
+                cv2.COLOR_BGR2GRAY,
+            ),
+            1.1,
+            10,
+            outputRejectLevels=True,
+        )
+
+        detections = []
+
+        for x, y, width, height in faces:
+            (
+                left_eye,
+                right_eye,
+            ) = find_eyes(
+                image[
+                    y:y + height,
+                    x:x + width,
+                ]
+            )
+
+            if left_eye is not None:
+                left_eye = (
+                    int(x + left_eye[0]),
+                    int(y + left_eye[1]),
+                )
+
+                right_eye = (
+                    int(x + right_eye[0]),
+                    int(y + right_eye[1]),
+                )
+
+            detections.append(
+                (
+                    (
+                        int(x),
+                        int(y),
+                        int(width),
+                        int(height),
+                    ),
+                    left_eye,
+                    right_eye,
+                )
+            )
+
+        return detections
+
+
+class YuNetDetector:
+    """
+    OpenCV's YuNet CNN detector, DeepFace's "yunet" backend.
+
+    Images larger than 640 pixels are shrunk first, as YuNet misses
+    faces on large inputs.
+    """
+
+    name = "yunet"
+
+    max_side = 640
+
+    def __init__(
+        self,
+        model_path=YUNET_MODEL_PATH,
+    ):
+        if not model_path.is_file():
+            raise RuntimeError(
+                f"The YuNet model {model_path} does not exist. "
+                "Download face_detection_yunet_2023mar.onnx from "
+                "the OpenCV model zoo or set YUNET_MODEL_PATH."
+            )
+
+        self._detector = cv2.FaceDetectorYN.create(
+            str(model_path),
+            "",
+            (
+                0,
+                0,
+            ),
+        )
+
+        # The same variable DeepFace's yunet backend reads.
+        self._detector.setScoreThreshold(
+            float(
+                os.getenv(
+                    "yunet_score_threshold",
+                    "0.9",
+                )
+            )
+        )
+
+    def detect(
+        self,
+        image,
+    ):
+        """
+        Return (face_box, left_eye, right_eye) for every face.
+        """
+        height, width = image.shape[:2]
+        scale = 1.0
+
+        if max(height, width) > self.max_side:
+            scale = self.max_side / max(height, width)
+
+            image = cv2.resize(
+                image,
+                (
+                    int(width * scale),
+                    int(height * scale),
+                ),
+            )
+
+        self._detector.setInputSize(
+            (
+                image.shape[1],
+                image.shape[0],
+            )
+        )
+
+        _, faces = self._detector.detect(
+            image
+        )
+
+        if faces is None:
+            return []
+
+        detections = []
+
+        for face in faces:
+            (
+                x,
+                y,
+                face_width,
+                face_height,
+                right_eye_x,
+                right_eye_y,
+                left_eye_x,
+                left_eye_y,
+            ) = (
+                int(value)
+                for value in face[:8]
+            )
+
+            # YuNet extends boxes past the frame for cut-off faces.
+            x = max(x, 0)
+            y = max(y, 0)
+
+            detections.append(
+                (
+                    tuple(
+                        int(value / scale)
+                        for value in (
+                            x,
+                            y,
+                            face_width,
+                            face_height,
+                        )
+                    ),
+                    (
+                        int(left_eye_x / scale),
+                        int(left_eye_y / scale),
+                    ),
+                    (
+                        int(right_eye_x / scale),
+                        int(right_eye_y / scale),
+                    ),
+                )
+            )
+
+        return detections
+
+
+DETECTOR_CLASSES = {
+    "opencv": HaarDetector,
+    "yunet": YuNetDetector,
+}
+
+# Detectors built in this process, by backend name.
+_DETECTORS = {}
+
+
+def get_native_detector(
+    backend,
+):
+    detector = _DETECTORS.get(
+        backend
+    )
+
+    if detector is None:
+        detector = DETECTOR_CLASSES[backend]()
+        _DETECTORS[backend] = detector
+
+    return detector
+
+
+def detect_aligned_faces(
+    frame,
+    backend,
+):
+    """
+    Return the aligned BGR uint8 crop of every face found in frame.
+    """
+    border = alignment_border(
+        frame
+    )
+
+    bordered = cv2.copyMakeBorder(
+        frame,
+        border[0],
+        border[0],
+        border[1],
+        border[1],
+        cv2.BORDER_CONSTANT,
+        value=(
+            0,
+            0,
+            0,
+        ),
+    )
+
+    return [
+        align_face(
+            bordered,
+            face_box,
+            left_eye,
+            right_eye,
+        )
+        for (
+            face_box,
+            left_eye,
+            right_eye,
+        ) in get_native_detector(
+            backend
+        ).detect(
+            bordered
+        )
+    ]
@@ -4,14 +4,16 @@ import numpy as np
 from .config import MATCH_THRESHOLD
 
 
-def match_face_id(
+def normalize_embedding(
     embedding,
-    known_embeddings,
-    threshold=MATCH_THRESHOLD,
 ):
+    """
+    Return the embedding as an L2-normalised float32 vector,
+    or None when it cannot be compared.
+    """
     candidate = np.asarray(
         embedding,
-        dtype=np.float64,
+        dtype=np.float32,
     )
 
     if (
@@ -30,76 +32,150 @@ def match_face_id(
     ):
         return None
 
-    face_ids = []
-    compatible_embeddings = []
+    return candidate / candidate_norm
 
-    for face_id, known_embedding in known_embeddings:
-        known_array = np.asarray(
-            known_embedding,
-            dtype=np.float64,
-        )
 
-        if (
-            known_array.ndim != 1
-            or known_array.shape != candidate.shape
-        ):
-            continue
+def update_centroid(
+    centroid,
+    count,
+    embedding,
+    max_weight,
+):
+    """
+    Fold a new embedding into a visitor's running centroid.
+
+    The centroid is the mean of the visitor's normalised
+    embeddings. Once count reaches max_weight the existing centroid
+    stops gaining weight, so it keeps following gradual changes in
+    appearance. Returns (centroid, count).
+    """
+    unit_embedding = normalize_embedding(
+        embedding
+    )
 
-        face_ids.append(
-            face_id
+    if unit_embedding is None:
+        return (
+            centroid,
+            count,
         )
 
-        compatible_embeddings.append(
-            known_array
+    if (
+        centroid is None
+        or not count
+        or centroid.shape != unit_embedding.shape
+    ):
+        return (
+            unit_embedding,
+            1,
         )
 
-    if not compatible_embeddings:
-        return None
-
-    embedding_matrix = np.vstack(
-        compatible_embeddings
+    weight = min(
+        count,
+        max_weight - 1,
     )
 
-    known_norms = np.linalg.norm(
-        embedding_matrix,
-        axis=1,
+    return (
+        (
+            (centroid * weight + unit_embedding)
+            / (weight + 1)
+        ).astype(
+            np.float32
+        ),
+        count + 1,
     )
 
-    denominators = (
-        known_norms * candidate_norm
+
+def best_match(
+    unit_candidate,
+    unit_matrix,
+    face_ids,
+):
+    """
+    Return the closest face ID and its cosine distance.
+
+    Both the candidate and the matrix rows must already be
+    L2-normalised, so the similarity is a single matrix product.
+    """
+    if len(face_ids) == 0:
+        return (
+            None,
+            np.inf,
+        )
+
+    similarities = (
+        unit_matrix @ unit_candidate
     )
 
-    with np.errstate(
-        divide="ignore",
-        invalid="ignore",
-    ):
-        similarities = (
-            embedding_matrix @ candidate
-        ) / denominators
+    best_index = int(
+        np.argmax(
+            similarities
+        )
+    )
 
-        distances = 1.0 - np.clip(
-            similarities,
+    distance = 1.0 - float(
+        np.clip(
+            similarities[best_index],
             -1.0,
             1.0,
         )
+    )
 
-    valid_indices = np.flatnonzero(
-        np.isfinite(distances)
+    return (
+        face_ids[best_index],
+        distance,
     )
 
-    if valid_indices.size == 0:
+
+def match_face_id(
+    embedding,
+    known_embeddings,
+    threshold=MATCH_THRESHOLD,
+):
+    candidate = normalize_embedding(
+        embedding
+    )
+
+    if candidate is None:
         return None
 
-    best_index = valid_indices[
-        np.argmin(
-            distances[valid_indices]
+    face_ids = []
+    compatible_embeddings = []
+
+    for face_id, known_embedding in known_embeddings:
+        known_array = normalize_embedding(
+            known_embedding
+        )
+
+        if (
+            known_array is None
+            or known_array.shape != candidate.shape
+        ):
+            continue
+
+        face_ids.append(
+            face_id
         )
-    ]
 
-    if distances[best_index] < threshold:
-        return face_ids[
-            int(best_index)
-        ]
+        compatible_embeddings.append(
+            known_array
+        )
+
+    if not compatible_embeddings:
+        return None
+
+    (
+        face_id,
+        distance,
+    ) = best_match(
+        candidate,
+        np.vstack(
+            compatible_embeddings
+        ),
+        face_ids,
+    )
+
+    if distance < threshold:
+        return face_id
 
     return None
 
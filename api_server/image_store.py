@@ -0,0 +1,107 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from .config import IMAGE_WRITE_WORKERS
+from .metrics import STAGE_SECONDS
+
+
+logger = logging.getLogger(
+    "face_api"
+)
+
+
+# Stored images keep the uploaded encoding, so the file extension
+# follows the upload's content type.
+IMAGE_EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/webp": ".webp",
+}
+
+IMAGE_WRITER = ThreadPoolExecutor(
+    max_workers=IMAGE_WRITE_WORKERS,
+    thread_name_prefix="image-writer",
+)
+
+
+def write_image_bytes(
+    absolute_image_path,
+    image_bytes,
+):
+    with STAGE_SECONDS.time(
+        "image_write"
+    ):
+        absolute_image_path.parent.mkdir(
+            parents=True,
+            exist_ok=True,
+        )
+
+        absolute_image_path.write_bytes(
+            image_bytes
+        )
+
+
+class StoredImage:
+    """
+    An uploaded image being written to disk in the background.
+
+    The original bytes are written unchanged with one write, while
+    the decoded frame goes through inference. Callers wait() or
+    await wait_async() before recording the image path in the
+    database, and discard() to remove the file of a refused upload.
+    """
+
+    def __init__(
+        self,
+        absolute_image_path,
+        image_bytes,
+    ):
+        self.absolute_image_path = absolute_image_path
+
+        self._future = IMAGE_WRITER.submit(
+            write_image_bytes,
+            absolute_image_path,
+            image_bytes,
+        )
+
+    def wait(self):
+        """
+        Block until the image is on disk. Raises OSError when it
+        could not be written.
+        """
+        self._future.result()
+
+    async def wait_async(self):
+        await asyncio.wrap_future(
+            self._future
+        )
+
+    def discard(self):
+        """
+        Remove the file once its write has finished, without
+        waiting for it.
+        """
+        self._future.add_done_callback(
+            self._remove
+        )
+
+    def _remove(
+        self,
+        future,
+    ):
+        if future.cancelled():
+            return
+
+        error = future.exception()
+
+        if error is not None:
+            logger.warning(
+                "Discarded image was not written: %s (%s)",
+                self.absolute_image_path,
+                error,
+            )
+
+        self.absolute_image_path.unlink(
+            missing_ok=True
+        )
@@ -0,0 +1,283 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+
+from .config import (
+    INFERENCE_BATCH_MAX_FRAMES,
+    INFERENCE_BATCH_MAX_WAIT_MS,
+)
+from .face_analysis import analyse_frames_timed
+from .inference_pool import (
+    INFERENCE_EXECUTOR,
+    InferenceQueueFull,
+)
+from .metrics import observe_stage_timings
+
+
+class _FrameBatch:
+    def __init__(
+        self,
+        deadline,
+    ):
+        self.deadline = deadline
+        self.frames = []
+        self.face_boxes = []
+        self.futures = []
+
+
+class InferenceBatcher:
+    """
+    Group frames from concurrent uploads into one inference
+    submission.
+
+    The first upload to arrive opens a batch that is sent to the
+    inference pool after max_wait_ms, or as soon as max_frames
+    frames have joined. Uploads only wait for their own result, and
+    no request thread is held while a batch fills, so async handlers
+    can await it. A new batch can open while earlier batches are
+    still running, so every inference worker stays busy.
+
+    Each frame of a batch takes its own inference slot, so the
+    bounded queue still counts images; frames that find no free
+    slot are refused with InferenceQueueFull. One long-lived
+    flusher thread sends batches whose wait is over; no thread or
+    timer is started per batch.
+    """
+
+    def __init__(
+        self,
+        executor=INFERENCE_EXECUTOR,
+        max_frames=INFERENCE_BATCH_MAX_FRAMES,
+        max_wait_ms=INFERENCE_BATCH_MAX_WAIT_MS,
+    ):
+        self.executor = executor
+        self.max_frames = max_frames
+        self.max_wait_seconds = max_wait_ms / 1000.0
+
+        self._lock = threading.Lock()
+        self._batch_opened = threading.Condition(
+            self._lock
+        )
+
+        self._open_batch = None
+        self._flusher = None
+
+    def _flush_when_due(self):
+        """
+        Flusher thread: send the open batch once its deadline has
+        passed, unless it filled up and was sent first.
+        """
+        while True:
+            with self._batch_opened:
+                while True:
+                    batch = self._open_batch
+
+                    if batch is None:
+                        self._batch_opened.wait()
+                        continue
+
+                    remaining = batch.deadline - time.monotonic()
+
+                    if remaining <= 0:
+                        break
+
+                    self._batch_opened.wait(
+                        remaining
+                    )
+
+                self._open_batch = None
+
+            self._dispatch(
+                batch
+            )
+
+    def _dispatch(
+        self,
+        batch,
+    ):
+        """
+        Submit the batch with one inference slot per frame. Frames
+        beyond the free slots are refused with InferenceQueueFull.
+        """
+        try:
+            reserved_slots = self.executor.reserve(
+                len(batch.frames)
+            )
+
+            if not reserved_slots:
+                raise InferenceQueueFull(
+                    "The inference queue is full."
+                )
+
+            batch_future = self.executor.submit(
+                analyse_frames_timed,
+                batch.frames[:reserved_slots],
+                batch.face_boxes[:reserved_slots],
+                reserved_slots=reserved_slots,
+            )
+
+        except BaseException as error:
+            for future in batch.futures:
+                future.set_exception(
+                    error
+                )
+
+            return
+
+        batch_future.add_done_callback(
+            lambda done_future: self._deliver(
+                batch,
+                done_future,
+            )
+        )
+
+    def _deliver(
+        self,
+        batch,
+        batch_future,
+    ):
+        try:
+            (
+                frame_results,
+                stage_timings,
+            ) = batch_future.result()
+
+        except BaseException as error:
+            for future in batch.futures:
+                future.set_exception(
+                    error
+                )
+
+            return
+
+        observe_stage_timings(
+            stage_timings
+        )
+
+        for future, frame_result in zip(
+            batch.futures,
+            frame_results,
+        ):
+            future.set_result(
+                frame_result
+            )
+
+        # Frames that found no free slot, here or on a model server.
+        for future in batch.futures[len(frame_results):]:
+            future.set_exception(
+                InferenceQueueFull(
+                    "The inference queue is full."
+                )
+            )
+
+    def submit(
+        self,
+        frame,
+        face_box=None,
+    ):
+        """
+        Queue one frame and return a concurrent.futures.Future for
+        its {"faces": [...]} or {"error": "..."} result. face_box
+        marks a client-cropped frame that skips detection.
+        """
+        future = Future()
+
+        with self._lock:
+            batch = self._open_batch
+            opened = batch is None
+
+            if opened:
+                batch = _FrameBatch(
+                    time.monotonic() + self.max_wait_seconds
+                )
+
+                self._open_batch = batch
+
+            batch.frames.append(
+                frame
+            )
+
+            batch.face_boxes.append(
+                face_box
+            )
+
+            batch.futures.append(
+                future
+            )
+
+            full = (
+                len(batch.frames) >= self.max_frames
+                or self.max_wait_seconds == 0
+            )
+
+            if full:
+                self._open_batch = None
+
+            elif opened:
+                if self._flusher is None:
+                    self._flusher = threading.Thread(
+                        target=self._flush_when_due,
+                        name="inference-batcher",
+                        daemon=True,
+                    )
+
+                    self._flusher.start()
+
+                self._batch_opened.notify()
+
+        if full:
+            self._dispatch(
+                batch
+            )
+
+        return future
+
+    def analyse(
+        self,
+        frame,
+        face_box=None,
+    ):
+        """
+        Return the detected faces of one frame.
+
+        Raises ValueError when no face was found and
+        InferenceQueueFull when the pool refused the batch.
+        """
+        return faces_of(
+            self.submit(
+                frame,
+                face_box,
+            ).result()
+        )
+
+    async def analyse_async(
+        self,
+        frame,
+        face_box=None,
+    ):
+        """
+        Awaitable analyse() for async handlers.
+        """
+        return faces_of(
+            await asyncio.wrap_future(
+                self.submit(
+                    frame,
+                    face_box,
+                )
+            )
+        )
+
+
+def faces_of(
+    frame_result,
+):
+    if "error" in frame_result:
+        raise ValueError(
+            frame_result["error"]
+        )
+
+    return frame_result["faces"]
+
+
+INFERENCE_BATCHER = InferenceBatcher()
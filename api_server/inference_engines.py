@@ -0,0 +1,309 @@
+import numpy as np
+
+from .config import (
+    EMBEDDING_MODEL,
+    INFERENCE_ENGINE,
+    ONNX_INTRA_OP_THREADS,
+    ONNX_MODEL_DIR,
+)
+
+
+# DeepFace model name and task of each model the API runs itself.
+# Detection goes through DeepFace.extract_faces, or through
+# face_detectors for the OpenCV backends under the onnx engine.
+MODEL_ROLES = {
+    "embedding": (
+        EMBEDDING_MODEL,
+        "facial_recognition",
+    ),
+    "emotion": (
+        "Emotion",
+        "facial_attribute",
+    ),
+}
+
+
+def get_deepface():
+    """
+    Import DeepFace only when image processing is needed.
+
+    This allows the API health endpoint to start even before
+    the machine-learning model has been loaded.
+    """
+    try:
+        from deepface import DeepFace
+
+        return DeepFace
+
+    except ImportError as error:
+        raise RuntimeError(
+            "DeepFace is not installed. Run: "
+            "python -m pip install deepface tensorflow"
+        ) from error
+
+
+def get_onnxruntime():
+    try:
+        import onnxruntime
+
+        return onnxruntime
+
+    except ImportError as error:
+        raise RuntimeError(
+            "ONNX Runtime is not installed. Run: "
+            "python -m pip install onnxruntime"
+        ) from error
+
+
+def build_deepface_model(
+    model_name,
+    task,
+):
+    """
+    Build (and cache inside DeepFace) one model.
+
+    DeepFace releases before 0.0.93 take only the model name.
+    """
+    DeepFace = get_deepface()
+
+    try:
+        return DeepFace.build_model(
+            model_name=model_name,
+            task=task,
+        )
+
+    except TypeError:
+        return DeepFace.build_model(
+            model_name
+        )
+
+
+def model_input_size(
+    model_client,
+):
+    """
+    Return the (height, width) the model expects.
+
+    DeepFace recognition clients store (width, height). Attribute
+    clients such as the emotion model have no input_shape of their
+    own, and releases before 0.0.86 return the bare Keras model, so
+    otherwise the Keras (None, height, width, channels) is used.
+    """
+    input_shape = getattr(
+        model_client,
+        "input_shape",
+        None,
+    )
+
+    if input_shape is None:
+        input_shape = model_client.model.input_shape
+
+    input_shape = tuple(
+        input_shape
+    )
+
+    if len(input_shape) == 4:
+        return (
+            input_shape[1],
+            input_shape[2],
+        )
+
+    return (
+        input_shape[1],
+        input_shape[0],
+    )
+
+
+def predict_batch(
+    model_client,
+    batch,
+):
+    """
+    Run one forward pass of a DeepFace model over a whole batch.
+    """
+    keras_model = getattr(
+        model_client,
+        "model",
+        model_client,
+    )
+
+    if hasattr(
+        keras_model,
+        "predict_on_batch",
+    ):
+        return np.asarray(
+            keras_model.predict_on_batch(
+                batch
+            )
+        )
+
+    # Non-Keras models (Dlib, SFace) take one image at a time.
+    return np.asarray(
+        [
+            np.asarray(
+                model_client.forward(
+                    batch[index:index + 1]
+                )
+            ).reshape(-1)
+            for index in range(
+                len(batch)
+            )
+        ]
+    )
+
+
+class DeepFaceModel:
+    """
+    A DeepFace model run through TensorFlow.
+    """
+
+    engine = "deepface"
+
+    def __init__(
+        self,
+        role,
+    ):
+        (
+            self.model_name,
+            task,
+        ) = MODEL_ROLES[role]
+
+        self.client = build_deepface_model(
+            self.model_name,
+            task,
+        )
+
+        self.input_size = model_input_size(
+            self.client
+        )
+
+    def predict(
+        self,
+        batch,
+    ):
+        return predict_batch(
+            self.client,
+            batch,
+        )
+
+
+def onnx_model_path(
+    role,
+):
+    return (
+        ONNX_MODEL_DIR
+        / f"{MODEL_ROLES[role][0]}.onnx"
+    )
+
+
+class OnnxModel:
+    """
+    An exported copy of a DeepFace model run through ONNX Runtime.
+
+    It takes the same NHWC float batches as the Keras model it was
+    exported from, so preprocessing is shared between engines.
+    """
+
+    engine = "onnx"
+
+    def __init__(
+        self,
+        role,
+        model_path=None,
+    ):
+        onnxruntime = get_onnxruntime()
+
+        self.model_name = MODEL_ROLES[role][0]
+
+        model_path = (
+            model_path
+            or onnx_model_path(
+                role
+            )
+        )
+
+        if not model_path.is_file():
+            raise RuntimeError(
+                f"The ONNX model {model_path} does not exist. "
+                "Run: python -m api_server.export_onnx"
+            )
+
+        options = onnxruntime.SessionOptions()
+
+        if ONNX_INTRA_OP_THREADS:
+            options.intra_op_num_threads = (
+                ONNX_INTRA_OP_THREADS
+            )
+
+        self.session = onnxruntime.InferenceSession(
+            str(model_path),
+            sess_options=options,
+            providers=[
+                "CPUExecutionProvider",
+            ],
+        )
+
+        model_input = self.session.get_inputs()[0]
+
+        self.input_name = model_input.name
+
+        self.input_size = (
+            int(model_input.shape[1]),
+            int(model_input.shape[2]),
+        )
+
+    def predict(
+        self,
+        batch,
+    ):
+        return np.asarray(
+            self.session.run(
+                None,
+                {
+                    self.input_name: batch.astype(
+                        np.float32,
+                        copy=False,
+                    ),
+                },
+            )[0]
+        )
+
+
+INFERENCE_ENGINES = {
+    "deepface": DeepFaceModel,
+    "onnx": OnnxModel,
+}
+
+# Models loaded in this process, by role.
+_LOADED_MODELS = {}
+
+
+def get_inference_model(
+    role,
+):
+    """
+    Return this process's embedding or emotion model for the
+    configured INFERENCE_ENGINE, loading it on first use.
+    """
+    model = _LOADED_MODELS.get(
+        role
+    )
+
+    if model is None:
+        engine = INFERENCE_ENGINES.get(
+            INFERENCE_ENGINE
+        )
+
+        if engine is None:
+            raise RuntimeError(
+                f"Unknown INFERENCE_ENGINE {INFERENCE_ENGINE!r}. "
+                f"Use one of: {', '.join(INFERENCE_ENGINES)}."
+            )
+
+        model = engine(
+            role
+        )
+
+        _LOADED_MODELS[role] = model
+
+    return model
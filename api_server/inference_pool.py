@@ -0,0 +1,669 @@
+import itertools
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import (
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.connection import Client
+
+from .config import (
+    INFERENCE_QUEUE_SIZE,
+    INFERENCE_WORKERS,
+    MODEL_SERVER_ADDRESS,
+    MODEL_SERVER_AUTHKEY,
+)
+from .face_analysis import (
+    warm_up_models,
+    warm_up_worker,
+    worker_report,
+)
+
+
+logger = logging.getLogger(
+    "face_api"
+)
+
+
+# How long each warm-up report call occupies its worker, so that one
+# round of calls reaches every idle worker rather than one fast one.
+WARM_UP_REPORT_HOLD_SECONDS = 0.1
+
+
+class InferenceQueueFull(RuntimeError):
+    """
+    Raised when every inference slot is taken and the bounded
+    submission queue is full.
+    """
+
+
+class InferenceExecutor:
+    """
+    Bounded pool of inference worker processes.
+
+    Each worker loads and warms up its own models in the pool's
+    initializer, before it takes its first image.
+    Every image holds one slot until its result is back. There are
+    worker_count + queue_size slots; images that find none free are
+    refused immediately instead of queueing without limit. A batch
+    of frames takes one slot per frame, reserved with reserve().
+
+    With worker_count set to 0, inference runs one image at a time
+    on a single thread of the API process, as it did before the pool
+    existed.
+    """
+
+    def __init__(
+        self,
+        worker_count=INFERENCE_WORKERS,
+        queue_size=INFERENCE_QUEUE_SIZE,
+        initializer=warm_up_worker,
+    ):
+        self.worker_count = worker_count
+        self.queue_size = queue_size
+        self.initializer = initializer
+
+        self._slots = threading.BoundedSemaphore(
+            max(
+                1,
+                worker_count,
+            )
+            + queue_size
+        )
+
+        # Threads are only started on first use, so this costs
+        # nothing when worker processes are configured.
+        self._inline_pool = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix="inference",
+        )
+
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+        self._readiness = {
+            "ready": False,
+            "state": "not_started",
+        }
+
+    def start(self):
+        if self.worker_count == 0:
+            return None
+
+        with self._pool_lock:
+            if self._pool is not None:
+                return self._pool
+
+            # Spawned workers never inherit TensorFlow state from a
+            # forked parent.
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.worker_count,
+                mp_context=multiprocessing.get_context(
+                    "spawn"
+                ),
+                initializer=self.initializer,
+            )
+
+            logger.info(
+                "Inference pool started: workers=%s queue=%s",
+                self.worker_count,
+                self.queue_size,
+            )
+
+            return self._pool
+
+    def shutdown(self):
+        with self._pool_lock:
+            pool = self._pool
+            self._pool = None
+
+        if pool is not None:
+            pool.shutdown(
+                wait=False,
+                cancel_futures=True,
+            )
+
+        self._inline_pool.shutdown(
+            wait=False,
+            cancel_futures=True,
+        )
+
+    def _discard(
+        self,
+        broken_pool,
+    ):
+        with self._pool_lock:
+            if self._pool is not broken_pool:
+                return
+
+            self._pool = None
+
+        logger.error(
+            "An inference worker died; the pool will be restarted."
+        )
+
+        broken_pool.shutdown(
+            wait=False,
+            cancel_futures=True,
+        )
+
+    def warm_up(self):
+        """
+        Start every worker and wait until each has warmed up,
+        recording per-worker timings.
+
+        Workers warm up in the pool initializer, so a worker that
+        answers a call is warm. Report calls are submitted in rounds
+        until every worker process has answered; the pool does not
+        promise to spread one round over all of them.
+
+        Runs once at API start-up; the API reports ready only after
+        it has succeeded.
+        """
+        self._readiness = {
+            "ready": False,
+            "state": "warming_up",
+        }
+
+        started = time.perf_counter()
+
+        try:
+            if self.worker_count == 0:
+                worker_reports = [
+                    self._inline_pool.submit(
+                        warm_up_models
+                    ).result(),
+                ]
+
+            else:
+                pool = self.start()
+
+                try:
+                    reports_by_pid = {}
+
+                    while len(reports_by_pid) < self.worker_count:
+                        futures = [
+                            pool.submit(
+                                worker_report,
+                                WARM_UP_REPORT_HOLD_SECONDS,
+                            )
+                            for _ in range(
+                                self.worker_count
+                            )
+                        ]
+
+                        for future in futures:
+                            report = future.result()
+
+                            reports_by_pid[report["pid"]] = report
+
+                    worker_reports = list(
+                        reports_by_pid.values()
+                    )
+
+                except BrokenProcessPool:
+                    self._discard(
+                        pool
+                    )
+
+                    raise
+
+        except Exception as error:
+            logger.exception(
+                "Inference warm-up failed"
+            )
+
+            self._readiness = {
+                "ready": False,
+                "state": "failed",
+                "error": str(error),
+            }
+
+            return False
+
+        self._readiness = {
+            "ready": True,
+            "state": "ready",
+
+            "warm_up_seconds": round(
+                time.perf_counter() - started,
+                3,
+            ),
+
+            "workers": worker_reports,
+        }
+
+        logger.info(
+            "Inference warm-up finished in %.1f s",
+            self._readiness["warm_up_seconds"],
+        )
+
+        return True
+
+    def readiness(self):
+        return dict(
+            self._readiness
+        )
+
+    def reserve(
+        self,
+        count,
+    ):
+        """
+        Take up to count free slots without waiting and return how
+        many were taken. Pass them to submit() as reserved_slots.
+        """
+        reserved = 0
+
+        while (
+            reserved < count
+            and self._slots.acquire(
+                blocking=False
+            )
+        ):
+            reserved += 1
+
+        return reserved
+
+    def _finished(
+        self,
+        pool,
+        slots,
+        future,
+    ):
+        self._slots.release(
+            slots
+        )
+
+        if (
+            pool is not None
+            and not future.cancelled()
+            and isinstance(
+                future.exception(),
+                BrokenProcessPool,
+            )
+        ):
+            self._discard(
+                pool
+            )
+
+    def submit(
+        self,
+        function,
+        *args,
+        reserved_slots=0,
+    ):
+        """
+        Schedule function(*args) on an inference worker and return
+        a concurrent.futures.Future for its result, without waiting.
+
+        The work holds reserved_slots slots taken with reserve(), or
+        takes one itself, and releases them when it finishes.
+        Raises InferenceQueueFull at once when no slot is free. A
+        worker that dies fails the future with BrokenProcessPool, a
+        RuntimeError, and the pool is restarted on the next
+        submission.
+        """
+        slots = reserved_slots
+
+        if not slots:
+            if not self.reserve(
+                1
+            ):
+                raise InferenceQueueFull(
+                    "The inference queue is full."
+                )
+
+            slots = 1
+
+        pool = None
+
+        try:
+            if self.worker_count == 0:
+                future = self._inline_pool.submit(
+                    function,
+                    *args,
+                )
+
+            else:
+                pool = self.start()
+
+                future = pool.submit(
+                    function,
+                    *args,
+                )
+
+        except BaseException:
+            self._slots.release(
+                slots
+            )
+
+            if pool is not None:
+                self._discard(
+                    pool
+                )
+
+            raise
+
+        future.add_done_callback(
+            lambda done_future: self._finished(
+                pool,
+                slots,
+                done_future,
+            )
+        )
+
+        return future
+
+    def run(
+        self,
+        function,
+        *args,
+    ):
+        """
+        Run function(*args) on an inference worker and return its
+        result.
+
+        Raises InferenceQueueFull without waiting when the pool and
+        its queue are already full.
+        """
+        try:
+            return self.submit(
+                function,
+                *args,
+            ).result()
+
+        except BrokenProcessPool as error:
+            raise RuntimeError(
+                "The inference worker stopped unexpectedly."
+            ) from error
+
+
+# Seconds a health check waits for the model server to answer.
+MODEL_SERVER_READINESS_TIMEOUT_SECONDS = 2
+
+
+class ModelServerClient:
+    """
+    Send inference work to a shared model server instead of running
+    worker processes in this API process.
+
+    It has the same interface as InferenceExecutor, but the slots
+    are kept by the model server: reserve() grants every slot asked
+    for, and the server runs only the frames of a batch that fit.
+    One connection per API process carries many requests at a time;
+    each reply is matched to its request by ID. If the connection
+    drops, pending requests fail and the next request reconnects.
+    """
+
+    def __init__(
+        self,
+        address=MODEL_SERVER_ADDRESS,
+        authkey=MODEL_SERVER_AUTHKEY,
+    ):
+        self.address = address
+        self.authkey = authkey
+
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pending = {}
+        self._request_ids = itertools.count()
+
+    def start(self):
+        return None
+
+    def shutdown(self):
+        with self._lock:
+            connection = self._connection
+
+        if connection is not None:
+            self._drop(
+                connection,
+                "The API is shutting down.",
+            )
+
+    def _connect(self):
+        if self._connection is not None:
+            return self._connection
+
+        if not self.authkey:
+            raise RuntimeError(
+                "MODEL_SERVER_AUTHKEY must be set to use "
+                "a model server."
+            )
+
+        try:
+            connection = Client(
+                self.address,
+                authkey=self.authkey.encode("utf-8"),
+            )
+
+        except (
+            OSError,
+            multiprocessing.AuthenticationError,
+        ) as error:
+            raise RuntimeError(
+                f"The model server at {self.address} "
+                f"is unavailable: {error}"
+            ) from error
+
+        self._connection = connection
+
+        threading.Thread(
+            target=self._receive,
+            args=(
+                connection,
+            ),
+            name="model-server-client",
+            daemon=True,
+        ).start()
+
+        return connection
+
+    def _drop(
+        self,
+        connection,
+        reason,
+    ):
+        """
+        Forget a broken connection and fail the requests sent on it.
+        """
+        with self._lock:
+            if self._connection is not connection:
+                return
+
+            self._connection = None
+
+            pending = self._pending
+            self._pending = {}
+
+        connection.close()
+
+        for future in pending.values():
+            future.set_exception(
+                RuntimeError(
+                    reason
+                )
+            )
+
+    def _receive(
+        self,
+        connection,
+    ):
+        while True:
+            try:
+                (
+                    request_id,
+                    succeeded,
+                    value,
+                ) = connection.recv()
+
+            except (
+                EOFError,
+                OSError,
+            ):
+                self._drop(
+                    connection,
+                    "The model server connection was lost.",
+                )
+
+                return
+
+            with self._lock:
+                future = self._pending.pop(
+                    request_id,
+                    None,
+                )
+
+            if future is None:
+                continue
+
+            if succeeded:
+                future.set_result(
+                    value
+                )
+
+            elif value[0] == "busy":
+                future.set_exception(
+                    InferenceQueueFull(
+                        value[1]
+                    )
+                )
+
+            else:
+                future.set_exception(
+                    RuntimeError(
+                        value[1]
+                    )
+                )
+
+    def _request(
+        self,
+        operation,
+        payload,
+    ):
+        future = Future()
+
+        with self._lock:
+            connection = self._connect()
+            request_id = next(
+                self._request_ids
+            )
+
+            self._pending[request_id] = future
+
+            try:
+                connection.send(
+                    (
+                        request_id,
+                        operation,
+                        payload,
+                    )
+                )
+
+                return future
+
+            except (
+                OSError,
+                ValueError,
+            ):
+                pass
+
+        self._drop(
+            connection,
+            "The model server connection was lost.",
+        )
+
+        return future
+
+    def reserve(
+        self,
+        count,
+    ):
+        return count
+
+    def submit(
+        self,
+        function,
+        *args,
+        reserved_slots=0,
+    ):
+        """
+        Ask the model server to run function(*args) and return a
+        concurrent.futures.Future for its result. Only functions the
+        server exposes can be called. A full server queue fails the
+        future with InferenceQueueFull; a server with fewer free
+        slots than frames returns results for the first frames only.
+        """
+        return self._request(
+            "run",
+            (
+                function.__name__,
+                args,
+            ),
+        )
+
+    def run(
+        self,
+        function,
+        *args,
+    ):
+        return self.submit(
+            function,
+            *args,
+        ).result()
+
+    def readiness(self):
+        try:
+            readiness = self._request(
+                "readiness",
+                None,
+            ).result(
+                timeout=MODEL_SERVER_READINESS_TIMEOUT_SECONDS
+            )
+
+        except Exception as error:
+            readiness = {
+                "ready": False,
+                "state": "model_server_unavailable",
+                "error": str(error),
+            }
+
+        return {
+            **readiness,
+            "model_server": self.address,
+        }
+
+    def warm_up(self):
+        """
+        Wait until the model server has loaded and warmed up its
+        models. The server warms itself up at start-up.
+        """
+        while True:
+            readiness = self.readiness()
+
+            if readiness["ready"]:
+                logger.info(
+                    "Model server at %s is ready",
+                    self.address,
+                )
+
+                return True
+
+            if readiness["state"] == "failed":
+                return False
+
+            time.sleep(
+                1
+            )
+
+
+INFERENCE_EXECUTOR = (
+    ModelServerClient()
+    if MODEL_SERVER_ADDRESS
+    else InferenceExecutor()
+)
@@ -0,0 +1,464 @@
+import logging
+import threading
+
+import numpy as np
+
+from .config import (
+    IVF_MIN_GALLERY_SIZE,
+    IVF_NLIST,
+    IVF_NPROBE,
+    MATCHER_BACKEND,
+)
+from .face_utils import best_match
+
+
+logger = logging.getLogger(
+    "face_api"
+)
+
+
+KMEANS_ITERATIONS = 8
+KMEANS_TRAINING_ROWS = 16384
+ASSIGNMENT_CHUNK_ROWS = 8192
+
+# Rows added or changed after a build are scanned exactly. Once they
+# exceed this share of the indexed rows, the lists are rebuilt.
+REBUILD_TAIL_RATIO = 0.1
+
+
+class ExactMatcher:
+    """
+    Brute-force cosine scan over every row of a gallery block.
+    """
+
+    name = "exact"
+
+    def closest(
+        self,
+        unit_candidate,
+        matrix,
+        face_ids,
+    ):
+        return best_match(
+            unit_candidate,
+            matrix,
+            face_ids,
+        )
+
+    def row_added(
+        self,
+        row,
+    ):
+        pass
+
+    def row_changed(
+        self,
+        row,
+    ):
+        pass
+
+    def rows_moved(self):
+        pass
+
+
+def assign_to_centroids(
+    unit_rows,
+    centroids,
+):
+    """
+    Return the index of the most similar centroid for every row.
+    """
+    assignments = np.empty(
+        len(unit_rows),
+        dtype=np.int64,
+    )
+
+    for start in range(
+        0,
+        len(unit_rows),
+        ASSIGNMENT_CHUNK_ROWS,
+    ):
+        stop = start + ASSIGNMENT_CHUNK_ROWS
+
+        assignments[start:stop] = np.argmax(
+            unit_rows[start:stop] @ centroids.T,
+            axis=1,
+        )
+
+    return assignments
+
+
+def train_centroids(
+    unit_rows,
+    list_count,
+    seed=0,
+):
+    """
+    Spherical k-means over L2-normalised rows.
+    """
+    generator = np.random.default_rng(
+        seed
+    )
+
+    if len(unit_rows) > KMEANS_TRAINING_ROWS:
+        training_rows = unit_rows[
+            generator.choice(
+                len(unit_rows),
+                KMEANS_TRAINING_ROWS,
+                replace=False,
+            )
+        ]
+
+    else:
+        training_rows = unit_rows
+
+    centroids = training_rows[
+        generator.choice(
+            len(training_rows),
+            list_count,
+            replace=False,
+        )
+    ].copy()
+
+    for _ in range(KMEANS_ITERATIONS):
+        assignments = assign_to_centroids(
+            training_rows,
+            centroids,
+        )
+
+        order = np.argsort(
+            assignments,
+            kind="stable",
+        )
+
+        (
+            used_lists,
+            list_starts,
+        ) = np.unique(
+            assignments[order],
+            return_index=True,
+        )
+
+        centroids[used_lists] = np.add.reduceat(
+            training_rows[order],
+            list_starts,
+            axis=0,
+        )
+
+        norms = np.linalg.norm(
+            centroids,
+            axis=1,
+            keepdims=True,
+        )
+
+        norms[norms == 0] = 1.0
+        centroids /= norms
+
+    return centroids
+
+
+class IVFMatcher:
+    """
+    Inverted-file approximate matcher in pure NumPy.
+
+    The gallery is partitioned into k-means lists. A query scans
+    only the IVF_NPROBE lists whose centroids are closest, plus any
+    rows added or changed since the lists were built.
+
+    Lists are (re)built on a background thread from a copy of the
+    gallery. Until the first build finishes, queries use an exact
+    scan, so a large bank never waits on k-means.
+    """
+
+    name = "ivf"
+
+    def __init__(
+        self,
+        list_count=IVF_NLIST,
+        probe_count=IVF_NPROBE,
+        min_gallery_size=IVF_MIN_GALLERY_SIZE,
+    ):
+        self.list_count = list_count
+        self.probe_count = probe_count
+        self.min_gallery_size = min_gallery_size
+
+        self._lock = threading.Lock()
+        self._lists = None
+        self._unindexed_rows = set()
+        self._changed_during_build = None
+        self._generation = 0
+
+    @property
+    def is_built(self):
+        return self._lists is not None
+
+    def build(
+        self,
+        matrix,
+        generation=None,
+    ):
+        """
+        Build the inverted lists for the given rows and install them.
+
+        A build is discarded when gallery rows were moved after the
+        copy it works from was taken.
+        """
+        size = len(matrix)
+
+        list_count = (
+            self.list_count
+            or int(
+                4 * np.sqrt(size)
+            )
+        )
+
+        list_count = max(
+            1,
+            min(
+                list_count,
+                size,
+            ),
+        )
+
+        centroids = train_centroids(
+            matrix,
+            list_count,
+        )
+
+        assignments = assign_to_centroids(
+            matrix,
+            centroids,
+        )
+
+        list_rows = np.argsort(
+            assignments,
+            kind="stable",
+        )
+
+        list_starts = np.searchsorted(
+            assignments[list_rows],
+            np.arange(
+                list_count + 1
+            ),
+        )
+
+        with self._lock:
+            if (
+                generation is not None
+                and generation != self._generation
+            ):
+                self._changed_during_build = None
+                return
+
+            self._lists = (
+                centroids,
+                list_rows,
+                list_starts,
+                size,
+            )
+
+            self._unindexed_rows = (
+                self._changed_during_build
+                or set()
+            )
+
+            self._changed_during_build = None
+
+    def _build_in_background(
+        self,
+        matrix,
+        generation,
+    ):
+        try:
+            self.build(
+                matrix,
+                generation,
+            )
+
+        except Exception:
+            logger.exception(
+                "IVF matcher build failed"
+            )
+
+            with self._lock:
+                self._changed_during_build = None
+
+    def _needs_build(
+        self,
+        size,
+    ):
+        if self._lists is None:
+            return True
+
+        indexed_size = self._lists[3]
+
+        return (
+            len(self._unindexed_rows)
+            + size
+            - indexed_size
+            > indexed_size * REBUILD_TAIL_RATIO
+        )
+
+    def _start_build(
+        self,
+        matrix,
+    ):
+        with self._lock:
+            if self._changed_during_build is not None:
+                return
+
+            self._changed_during_build = set()
+            generation = self._generation
+
+        threading.Thread(
+            target=self._build_in_background,
+            args=(
+                matrix.copy(),
+                generation,
+            ),
+            name="ivf-matcher-build",
+            daemon=True,
+        ).start()
+
+    def closest(
+        self,
+        unit_candidate,
+        matrix,
+        face_ids,
+    ):
+        size = len(matrix)
+
+        if size < self.min_gallery_size:
+            return best_match(
+                unit_candidate,
+                matrix,
+                face_ids,
+            )
+
+        if self._needs_build(
+            size
+        ):
+            self._start_build(
+                matrix
+            )
+
+        with self._lock:
+            lists = self._lists
+
+            unindexed_rows = list(
+                self._unindexed_rows
+            )
+
+        if lists is None:
+            return best_match(
+                unit_candidate,
+                matrix,
+                face_ids,
+            )
+
+        (
+            centroids,
+            list_rows,
+            list_starts,
+            indexed_size,
+        ) = lists
+
+        probe_count = min(
+            self.probe_count,
+            len(centroids),
+        )
+
+        centroid_scores = (
+            centroids @ unit_candidate
+        )
+
+        probed_lists = np.argpartition(
+            -centroid_scores,
+            probe_count - 1,
+        )[:probe_count]
+
+        candidate_rows = [
+            list_rows[
+                list_starts[list_index]:
+                list_starts[list_index + 1]
+            ]
+            for list_index in probed_lists
+        ]
+
+        candidate_rows.append(
+            np.arange(
+                indexed_size,
+                size,
+            )
+        )
+
+        candidate_rows.append(
+            np.asarray(
+                unindexed_rows,
+                dtype=np.int64,
+            )
+        )
+
+        rows = np.unique(
+            np.concatenate(
+                candidate_rows
+            )
+        )
+
+        return best_match(
+            unit_candidate,
+            matrix[rows],
+            face_ids[rows],
+        )
+
+    def row_added(
+        self,
+        row,
+    ):
+        # Rows past the indexed size are always scanned exactly.
+        pass
+
+    def row_changed(
+        self,
+        row,
+    ):
+        with self._lock:
+            self._unindexed_rows.add(
+                row
+            )
+
+            if self._changed_during_build is not None:
+                self._changed_during_build.add(
+                    row
+                )
+
+    def rows_moved(self):
+        # Row positions are no longer valid for the built lists.
+        with self._lock:
+            self._lists = None
+            self._unindexed_rows = set()
+            self._generation += 1
+
+
+MATCHER_BACKENDS = {
+    ExactMatcher.name: ExactMatcher,
+    IVFMatcher.name: IVFMatcher,
+}
+
+
+def create_matcher(
+    backend=MATCHER_BACKEND,
+):
+    matcher_class = MATCHER_BACKENDS.get(
+        backend
+    )
+
+    if matcher_class is None:
+        logger.warning(
+            "Unknown MATCHER_BACKEND %r; using exact matching.",
+            backend,
+        )
+
+        matcher_class = ExactMatcher
+
+    return matcher_class()
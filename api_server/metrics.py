@@ -0,0 +1,400 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Upper bounds, in seconds, of the latency histogram buckets. They
+# span a cached lookup (sub-millisecond) to a cold model call.
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def escape_label_value(
+    value,
+):
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\n", "\\n")
+        .replace('"', '\\"')
+    )
+
+
+def format_labels(
+    label_names,
+    label_values,
+    extra=(),
+):
+    pairs = [
+        f'{name}="{escape_label_value(value)}"'
+        for name, value in (
+            *zip(
+                label_names,
+                label_values,
+            ),
+            *extra,
+        )
+    ]
+
+    if not pairs:
+        return ""
+
+    return "{" + ",".join(pairs) + "}"
+
+
+class _Metric:
+    metric_type = None
+
+    def __init__(
+        self,
+        name,
+        help_text,
+        label_names=(),
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(
+            label_names
+        )
+
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(
+        self,
+        label_values,
+    ):
+        if len(label_values) != len(self.label_names):
+            raise ValueError(
+                f"{self.name} expects labels {self.label_names}."
+            )
+
+        return tuple(
+            str(value)
+            for value in label_values
+        )
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} {self.metric_type}",
+        ]
+
+        with self._lock:
+            values = {
+                key: self._snapshot(value)
+                for key, value in self._values.items()
+            }
+
+        for label_values, value in sorted(
+            values.items()
+        ):
+            lines.extend(
+                self._render_value(
+                    label_values,
+                    value,
+                )
+            )
+
+        return lines
+
+    def _snapshot(
+        self,
+        value,
+    ):
+        return value
+
+    def _render_value(
+        self,
+        label_values,
+        value,
+    ):
+        return [
+            self.name
+            + format_labels(
+                self.label_names,
+                label_values,
+            )
+            + f" {value}",
+        ]
+
+
+class Counter(_Metric):
+    metric_type = "counter"
+
+    def inc(
+        self,
+        *label_values,
+        amount=1,
+    ):
+        key = self._key(
+            label_values
+        )
+
+        with self._lock:
+            self._values[key] = (
+                self._values.get(
+                    key,
+                    0,
+                )
+                + amount
+            )
+
+
+class Gauge(_Metric):
+    metric_type = "gauge"
+
+    def set(
+        self,
+        value,
+        *label_values,
+    ):
+        key = self._key(
+            label_values
+        )
+
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """
+    Cumulative latency histogram with fixed buckets.
+
+    observe() does a binary search and three additions under the
+    metric's lock; buckets are only accumulated when rendered.
+    """
+
+    metric_type = "histogram"
+
+    def __init__(
+        self,
+        name,
+        help_text,
+        label_names=(),
+        buckets=DEFAULT_BUCKETS,
+    ):
+        super().__init__(
+            name,
+            help_text,
+            label_names,
+        )
+
+        self.buckets = tuple(
+            sorted(buckets)
+        )
+
+    def observe(
+        self,
+        seconds,
+        *label_values,
+    ):
+        key = self._key(
+            label_values
+        )
+
+        bucket_index = bisect.bisect_left(
+            self.buckets,
+            seconds,
+        )
+
+        with self._lock:
+            value = self._values.get(
+                key
+            )
+
+            if value is None:
+                value = [
+                    [0] * (len(self.buckets) + 1),
+                    0.0,
+                    0,
+                ]
+
+                self._values[key] = value
+
+            value[0][bucket_index] += 1
+            value[1] += seconds
+            value[2] += 1
+
+    @contextmanager
+    def time(
+        self,
+        *label_values,
+    ):
+        started = time.perf_counter()
+
+        try:
+            yield
+
+        finally:
+            self.observe(
+                time.perf_counter() - started,
+                *label_values,
+            )
+
+    def _snapshot(
+        self,
+        value,
+    ):
+        return (
+            list(value[0]),
+            value[1],
+            value[2],
+        )
+
+    def _render_value(
+        self,
+        label_values,
+        value,
+    ):
+        (
+            bucket_counts,
+            total_seconds,
+            count,
+        ) = value
+
+        lines = []
+        cumulative = 0
+
+        for upper_bound, bucket_count in zip(
+            (
+                *self.buckets,
+                "+Inf",
+            ),
+            bucket_counts,
+        ):
+            cumulative += bucket_count
+
+            lines.append(
+                f"{self.name}_bucket"
+                + format_labels(
+                    self.label_names,
+                    label_values,
+                    (
+                        (
+                            "le",
+                            upper_bound,
+                        ),
+                    ),
+                )
+                + f" {cumulative}"
+            )
+
+        labels = format_labels(
+            self.label_names,
+            label_values,
+        )
+
+        lines.append(
+            f"{self.name}_sum{labels} {total_seconds}"
+        )
+
+        lines.append(
+            f"{self.name}_count{labels} {count}"
+        )
+
+        return lines
+
+
+class MetricsRegistry:
+    """
+    The metrics of this API process, rendered in the Prometheus
+    text exposition format.
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(
+        self,
+        metric,
+    ):
+        self._metrics.append(
+            metric
+        )
+
+        return metric
+
+    def render(self):
+        lines = []
+
+        for metric in self._metrics:
+            lines.extend(
+                metric.render()
+            )
+
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.register(
+    Histogram(
+        "face_api_stage_seconds",
+        "Time spent in each stage of processing an upload.",
+        (
+            "stage",
+        ),
+    )
+)
+
+UPLOADS_TOTAL = REGISTRY.register(
+    Counter(
+        "face_api_uploads_total",
+        "Uploaded images by endpoint, bank, branch and outcome.",
+        (
+            "endpoint",
+            "bank",
+            "branch",
+            "outcome",
+        ),
+    )
+)
+
+GALLERY_LOCK_WAIT_SECONDS = REGISTRY.register(
+    Gauge(
+        "face_api_gallery_lock_wait_seconds",
+        "Time the latest save waited for the bank's gallery lock.",
+        (
+            "bank",
+        ),
+    )
+)
+
+GALLERY_SIZE = REGISTRY.register(
+    Gauge(
+        "face_api_gallery_size",
+        "Visitors in the bank's resident embedding index.",
+        (
+            "bank",
+        ),
+    )
+)
+
+
+def observe_stage_timings(
+    stage_timings,
+):
+    """
+    Record {stage: [seconds, ...]} measured in an inference worker.
+    """
+    for stage, durations in stage_timings.items():
+        for seconds in durations:
+            STAGE_SECONDS.observe(
+                seconds,
+                stage,
+            )
@@ -0,0 +1,306 @@
+"""
+Host the inference models in one process for every API worker on a host.
+
+Without it, each uvicorn or gunicorn worker starts its own inference
+workers, each with its own copy of TensorFlow and the models. Start the
+model server first, then the API workers with the same settings:
+
+    MODEL_SERVER_ADDRESS=/run/face-api/models.sock
+    MODEL_SERVER_AUTHKEY=<long random secret>
+
+    python -m api_server.model_server
+    gunicorn -w 8 -k uvicorn.workers.UvicornWorker api_server.face_api:app
+
+On Windows use an address such as \\\\.\\pipe\\face-api-models.
+
+INFERENCE_WORKERS and INFERENCE_QUEUE_SIZE apply to the model server;
+API workers send it frames over the local socket and no longer load
+any model themselves.
+"""
+
+import logging
+import os
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener
+
+from .config import (
+    MODEL_SERVER_ADDRESS,
+    MODEL_SERVER_AUTHKEY,
+)
+from .face_analysis import analyse_frames_timed
+from .inference_pool import (
+    InferenceExecutor,
+    InferenceQueueFull,
+)
+
+
+logger = logging.getLogger(
+    "face_api"
+)
+
+
+# Functions API workers may run on the model server, by name. Each
+# takes (frames, face_boxes).
+REMOTE_FUNCTIONS = {
+    function.__name__: function
+    for function in (
+        analyse_frames_timed,
+    )
+}
+
+
+class ModelServer:
+    """
+    Accept connections from API workers and run their requests on
+    one bounded InferenceExecutor.
+
+    Each connection has a thread that reads requests and submits
+    them without waiting, so one API worker can have many requests
+    in flight. Replies are sent from the executor's callbacks.
+
+    A batch takes one executor slot per frame. When fewer slots are
+    free, only the first frames run and the reply carries their
+    results alone; the API worker refuses the rest as busy.
+    """
+
+    def __init__(
+        self,
+        address=MODEL_SERVER_ADDRESS,
+        authkey=MODEL_SERVER_AUTHKEY,
+        executor=None,
+    ):
+        if not address or not authkey:
+            raise RuntimeError(
+                "MODEL_SERVER_ADDRESS and MODEL_SERVER_AUTHKEY "
+                "must be set."
+            )
+
+        self.address = address
+        self.authkey = authkey
+
+        self.executor = (
+            executor
+            or InferenceExecutor()
+        )
+
+    def serve_forever(self):
+        self.executor.start()
+
+        threading.Thread(
+            target=self.executor.warm_up,
+            name="inference-warm-up",
+            daemon=True,
+        ).start()
+
+        # A socket file left behind by a previous run would make
+        # the listener fail to bind.
+        if (
+            not self.address.startswith("\\\\")
+            and os.path.exists(self.address)
+        ):
+            os.unlink(
+                self.address
+            )
+
+        with Listener(
+            self.address,
+            authkey=self.authkey.encode("utf-8"),
+        ) as listener:
+            logger.info(
+                "Model server listening on %s",
+                self.address,
+            )
+
+            while True:
+                try:
+                    connection = listener.accept()
+
+                except (
+                    AuthenticationError,
+                    OSError,
+                ) as error:
+                    logger.warning(
+                        "Refused a model server connection: %s",
+                        error,
+                    )
+
+                    continue
+
+                threading.Thread(
+                    target=self.serve_connection,
+                    args=(
+                        connection,
+                    ),
+                    name="model-server-connection",
+                    daemon=True,
+                ).start()
+
+    def serve_connection(
+        self,
+        connection,
+    ):
+        send_lock = threading.Lock()
+
+        def reply(
+            request_id,
+            succeeded,
+            value,
+        ):
+            try:
+                with send_lock:
+                    connection.send(
+                        (
+                            request_id,
+                            succeeded,
+                            value,
+                        )
+                    )
+
+            except (
+                OSError,
+                ValueError,
+            ):
+                # The API worker went away; its reader closes the
+                # connection.
+                pass
+
+        def reply_with_result(
+            request_id,
+            future,
+        ):
+            try:
+                result = future.result()
+
+            except Exception as error:
+                reply(
+                    request_id,
+                    False,
+                    (
+                        "error",
+                        str(error),
+                    ),
+                )
+
+                return
+
+            reply(
+                request_id,
+                True,
+                result,
+            )
+
+        try:
+            while True:
+                (
+                    request_id,
+                    operation,
+                    payload,
+                ) = connection.recv()
+
+                if operation == "readiness":
+                    reply(
+                        request_id,
+                        True,
+                        self.executor.readiness(),
+                    )
+
+                    continue
+
+                (
+                    function_name,
+                    args,
+                ) = payload
+
+                function = REMOTE_FUNCTIONS.get(
+                    function_name
+                )
+
+                if operation != "run" or function is None:
+                    reply(
+                        request_id,
+                        False,
+                        (
+                            "error",
+                            f"Unsupported request {function_name!r}.",
+                        ),
+                    )
+
+                    continue
+
+                try:
+                    (
+                        frames,
+                        face_boxes,
+                    ) = args
+
+                    reserved_slots = self.executor.reserve(
+                        len(frames)
+                    )
+
+                    if not reserved_slots:
+                        raise InferenceQueueFull(
+                            "The inference queue is full."
+                        )
+
+                    future = self.executor.submit(
+                        function,
+                        frames[:reserved_slots],
+                        face_boxes[:reserved_slots],
+                        reserved_slots=reserved_slots,
+                    )
+
+                except InferenceQueueFull as error:
+                    reply(
+                        request_id,
+                        False,
+                        (
+                            "busy",
+                            str(error),
+                        ),
+                    )
+
+                    continue
+
+                except Exception as error:
+                    reply(
+                        request_id,
+                        False,
+                        (
+                            "error",
+                            str(error),
+                        ),
+                    )
+
+                    continue
+
+                future.add_done_callback(
+                    lambda done_future, request_id=request_id: (
+                        reply_with_result(
+                            request_id,
+                            done_future,
+                        )
+                    )
+                )
+
+        except (
+            EOFError,
+            OSError,
+        ):
+            pass
+
+        finally:
+            connection.close()
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(message)s",
+    )
+
+    ModelServer().serve_forever()
+
+
+if __name__ == "__main__":
+    main()
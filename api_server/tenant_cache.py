@@ -0,0 +1,341 @@
+import hashlib
+import logging
+import select
+import threading
+import time
+
+from .config import TENANT_CACHE_TTL_SECONDS
+from .db_utils import connect_listener
+
+
+logger = logging.getLogger(
+    "face_api"
+)
+
+
+# The dashboard sends the changed bank's ID on this channel whenever a
+# bank or branch is saved or deleted (monitor/signals.py).
+TENANT_CACHE_CHANNEL = "tenant_cache_invalidate"
+
+LISTENER_RECONNECT_SECONDS = 5
+
+# Trie key holding the branch whose prefix ends at that node. PC-name
+# characters are never empty, so it cannot clash with a child.
+_BRANCH = ""
+
+
+class BranchPrefixTable:
+    """
+    Trie of one bank's upper-cased PC prefixes.
+
+    Walking the PC name once finds the longest matching prefix,
+    which is the same branch get_branch_by_pc_name would choose.
+    """
+
+    def __init__(
+        self,
+        branches,
+    ):
+        self._root = {}
+
+        for branch in branches:
+            configured_prefix = (
+                branch["pc_prefix"]
+                or ""
+            ).strip()
+
+            if not configured_prefix:
+                continue
+
+            node = self._root
+
+            for character in configured_prefix.upper():
+                node = node.setdefault(
+                    character,
+                    {},
+                )
+
+            node.setdefault(
+                _BRANCH,
+                {
+                    **branch,
+                    "matched_prefix": configured_prefix,
+                },
+            )
+
+    def match(
+        self,
+        normalized_pc_name,
+    ):
+        node = self._root
+        matched_branch = None
+
+        for character in normalized_pc_name:
+            node = node.get(
+                character
+            )
+
+            if node is None:
+                break
+
+            matched_branch = node.get(
+                _BRANCH,
+                matched_branch,
+            )
+
+        if matched_branch is None:
+            return None
+
+        return dict(
+            matched_branch
+        )
+
+
+class TenantCache:
+    """
+    Short-lived, process-local cache of verified bank API keys and
+    per-bank branch prefix tables.
+
+    Only successful key checks are cached, keyed by bank code and
+    key hash, so a wrong key always reaches the database. A load
+    that overlaps an invalidation is not stored.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds=TENANT_CACHE_TTL_SECONDS,
+    ):
+        self.ttl_seconds = ttl_seconds
+
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._banks = {}
+        self._branch_tables = {}
+
+    def _lookup(
+        self,
+        entries,
+        key,
+    ):
+        with self._lock:
+            entry = entries.get(
+                key
+            )
+
+            if (
+                entry is not None
+                and entry[0] > time.monotonic()
+            ):
+                return (
+                    entry[1],
+                    self._generation,
+                )
+
+            return (
+                None,
+                self._generation,
+            )
+
+    def _store(
+        self,
+        entries,
+        key,
+        value,
+        generation,
+    ):
+        if not self.ttl_seconds:
+            return
+
+        with self._lock:
+            if generation == self._generation:
+                entries[key] = (
+                    time.monotonic() + self.ttl_seconds,
+                    value,
+                )
+
+    def verified_bank(
+        self,
+        bank_code,
+        raw_api_key,
+        load,
+    ):
+        """
+        Return the bank for a code and API key, calling load() to
+        verify them against the database on a cache miss.
+        """
+        key = (
+            bank_code.strip().upper(),
+            hashlib.sha256(
+                raw_api_key.encode("utf-8")
+            ).hexdigest(),
+        )
+
+        (
+            bank,
+            generation,
+        ) = self._lookup(
+            self._banks,
+            key,
+        )
+
+        if bank is not None:
+            return bank
+
+        bank = load()
+
+        if bank:
+            self._store(
+                self._banks,
+                key,
+                bank,
+                generation,
+            )
+
+        return bank
+
+    def branch_for_pc(
+        self,
+        bank_id,
+        normalized_pc_name,
+        load,
+    ):
+        """
+        Return the branch whose PC prefix matches, calling load()
+        for the bank's active branches on a cache miss.
+        """
+        (
+            table,
+            generation,
+        ) = self._lookup(
+            self._branch_tables,
+            bank_id,
+        )
+
+        if table is None:
+            table = BranchPrefixTable(
+                load()
+            )
+
+            self._store(
+                self._branch_tables,
+                bank_id,
+                table,
+                generation,
+            )
+
+        return table.match(
+            normalized_pc_name
+        )
+
+    def invalidate(
+        self,
+        bank_id=None,
+    ):
+        """
+        Drop the cached keys and branches of one bank, or of every
+        bank.
+        """
+        with self._lock:
+            self._generation += 1
+
+            if bank_id is None:
+                self._banks = {}
+                self._branch_tables = {}
+                return
+
+            self._banks = {
+                key: entry
+                for key, entry in self._banks.items()
+                if entry[1]["id"] != bank_id
+            }
+
+            self._branch_tables.pop(
+                bank_id,
+                None,
+            )
+
+
+TENANT_CACHE = TenantCache()
+
+
+def parse_bank_id(
+    payload,
+):
+    try:
+        return int(
+            payload
+        )
+
+    except (TypeError, ValueError):
+        return None
+
+
+def run_invalidation_listener(
+    stop_event,
+    cache=TENANT_CACHE,
+):
+    """
+    LISTEN for dashboard changes and invalidate the cache.
+
+    After every (re)connect the whole cache is cleared, because
+    notifications sent while disconnected are lost; the TTL bounds
+    staleness while the database is unreachable.
+    """
+    while not stop_event.is_set():
+        try:
+            database = connect_listener(
+                TENANT_CACHE_CHANNEL
+            )
+
+        except Exception as error:
+            logger.warning(
+                "Tenant cache listener could not connect: %s",
+                error,
+            )
+
+            stop_event.wait(
+                LISTENER_RECONNECT_SECONDS
+            )
+
+            continue
+
+        try:
+            cache.invalidate()
+
+            while not stop_event.is_set():
+                readable, _, _ = select.select(
+                    [
+                        database,
+                    ],
+                    [],
+                    [],
+                    1.0,
+                )
+
+                if not readable:
+                    continue
+
+                database.poll()
+
+                while database.notifies:
+                    notification = database.notifies.pop(
+                        0
+                    )
+
+                    cache.invalidate(
+                        parse_bank_id(
+                            notification.payload
+                        )
+                    )
+
+        except Exception:
+            logger.exception(
+                "Tenant cache listener lost its connection"
+            )
+
+            stop_event.wait(
+                LISTENER_RECONNECT_SECONDS
+            )
+
+        finally:
+            database.close()
@@ -0,0 +1,20 @@
+"""
+Settings for the face API unit tests.
+
+Run from the project root with python -m pytest api_server/tests.
+The tests need neither PostgreSQL nor the DeepFace models: inference
+runs in-process and nothing starts background workers.
+"""
+
+import os
+import tempfile
+
+
+os.environ["CAPTURED_FACES_ROOT"] = os.path.join(
+    tempfile.gettempdir(),
+    "face-api-test-faces",
+)
+
+os.environ["INFERENCE_WORKERS"] = "0"
+os.environ["ASYNC_INGEST_WORKERS"] = "0"
+os.environ["MODEL_SERVER_ADDRESS"] = ""
@@ -0,0 +1,246 @@
+import psycopg2
+import pytest
+from psycopg2.extensions import (
+    TRANSACTION_STATUS_IDLE,
+    TRANSACTION_STATUS_INTRANS,
+)
+
+from api_server import db_utils
+from api_server.db_utils import ConnectionPool
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.pings = 0
+        self.rollbacks = 0
+        self.ping_fails = False
+        self.transaction_status = TRANSACTION_STATUS_IDLE
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(
+        self,
+        *exc_info,
+    ):
+        return False
+
+    def execute(
+        self,
+        query,
+    ):
+        self.pings += 1
+
+        if self.ping_fails:
+            raise psycopg2.OperationalError(
+                "server closed the connection unexpectedly"
+            )
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.transaction_status = TRANSACTION_STATUS_IDLE
+
+    def get_transaction_status(self):
+        return self.transaction_status
+
+
+class FakeThreadedPool:
+    """
+    Stands in for psycopg2's ThreadedConnectionPool.
+    """
+
+    instances = []
+
+    def __init__(
+        self,
+        min_size,
+        max_size,
+        **settings,
+    ):
+        self.idle = []
+        self.opened = []
+        self.closed_all = False
+
+        FakeThreadedPool.instances.append(
+            self
+        )
+
+    def getconn(self):
+        if self.idle:
+            return self.idle.pop()
+
+        database = FakeConnection()
+
+        self.opened.append(
+            database
+        )
+
+        return database
+
+    def putconn(
+        self,
+        database,
+        close=False,
+    ):
+        if close:
+            database.closed = 1
+            return
+
+        self.idle.append(
+            database
+        )
+
+    def closeall(self):
+        self.closed_all = True
+
+
+@pytest.fixture(autouse=True)
+def fake_postgres(
+    monkeypatch,
+):
+    FakeThreadedPool.instances = []
+
+    monkeypatch.setattr(
+        db_utils,
+        "ThreadedConnectionPool",
+        FakeThreadedPool,
+    )
+
+    monkeypatch.setattr(
+        db_utils,
+        "DB_CONFIG",
+        {
+            "host": "db",
+            "dbname": "faces",
+            "user": "api",
+            "password": "secret",
+            "sslmode": "",
+        },
+    )
+
+
+def make_pool(
+    **settings,
+):
+    return ConnectionPool(
+        **{
+            "min_size": 0,
+            "max_size": 2,
+            "timeout_seconds": 0.05,
+            "idle_check_seconds": 3600,
+            "max_lifetime_seconds": 3600,
+            **settings,
+        }
+    )
+
+
+def test_connections_are_reused_without_a_ping():
+    pool = make_pool()
+
+    with pool.connection() as first:
+        pass
+
+    with pool.connection() as second:
+        pass
+
+    assert second is first
+    assert first.pings == 0
+
+
+def test_idle_connection_failing_its_ping_is_replaced():
+    pool = make_pool(
+        idle_check_seconds=0,
+    )
+
+    with pool.connection() as first:
+        pass
+
+    first.ping_fails = True
+
+    with pool.connection() as second:
+        pass
+
+    assert second is not first
+    assert first.pings == 1
+    assert first.closed
+
+
+def test_old_connection_is_replaced():
+    pool = make_pool(
+        max_lifetime_seconds=0,
+    )
+
+    with pool.connection() as first:
+        pass
+
+    with pool.connection() as second:
+        pass
+
+    assert second is not first
+    assert first.closed
+
+
+def test_return_rolls_back_or_closes():
+    pool = make_pool()
+
+    with pool.connection() as first:
+        first.transaction_status = TRANSACTION_STATUS_INTRANS
+
+    assert first.rollbacks == 1
+    assert not first.closed
+
+    with pytest.raises(
+        psycopg2.OperationalError
+    ):
+        with pool.connection() as database:
+            raise psycopg2.OperationalError(
+                "SSL connection has been closed unexpectedly"
+            )
+
+    assert database is first
+    assert first.closed
+
+
+def test_checkout_waits_for_a_free_connection():
+    pool = make_pool(
+        max_size=1,
+    )
+
+    with pool.connection():
+        with pytest.raises(
+            psycopg2.OperationalError,
+            match="No database connection became available",
+        ):
+            with pool.connection():
+                pass
+
+
+def test_forked_process_builds_its_own_pool(
+    monkeypatch,
+):
+    pool = make_pool()
+
+    with pool.connection() as parent_connection:
+        pass
+
+    monkeypatch.setattr(
+        db_utils.os,
+        "getpid",
+        lambda: -1,
+    )
+
+    with pool.connection() as child_connection:
+        pass
+
+    assert child_connection is not parent_connection
+    assert len(FakeThreadedPool.instances) == 2
+
+    # The child never closes the parent's sockets.
+    pool.close()
+
+    assert not FakeThreadedPool.instances[0].closed_all
+    assert FakeThreadedPool.instances[1].closed_all
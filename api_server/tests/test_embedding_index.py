@@ -0,0 +1,272 @@
+from datetime import (
+    datetime,
+    timedelta,
+    timezone,
+)
+
+import pytest
+
+from api_server import embedding_index
+from api_server.embedding_index import EmbeddingIndex
+
+
+class FakeGallery:
+    """
+    The analytics_visitor rows of one bank, as the index reads them.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.embeddings = {}
+        self.reads = []
+
+    def save(
+        self,
+        face_id,
+        embedding,
+    ):
+        self.version = (
+            datetime(
+                2026,
+                1,
+                1,
+                tzinfo=timezone.utc,
+            )
+            if self.version is None
+            else self.version + timedelta(
+                seconds=1
+            )
+        )
+
+        self.embeddings[face_id] = embedding
+
+    def get_gallery_version(
+        self,
+        cursor,
+        bank_id,
+    ):
+        return self.version
+
+    def get_embeddings_db(
+        self,
+        cursor,
+        bank_id,
+        updated_since=None,
+    ):
+        self.reads.append(
+            updated_since
+        )
+
+        return list(
+            self.embeddings.items()
+        )
+
+
+@pytest.fixture
+def gallery(
+    monkeypatch,
+):
+    gallery = FakeGallery()
+
+    monkeypatch.setattr(
+        embedding_index,
+        "get_gallery_version",
+        gallery.get_gallery_version,
+    )
+
+    monkeypatch.setattr(
+        embedding_index,
+        "get_embeddings_db",
+        gallery.get_embeddings_db,
+    )
+
+    monkeypatch.setattr(
+        embedding_index,
+        "EMBEDDING_INDEX_REFRESH_OVERLAP_SECONDS",
+        5,
+    )
+
+    return gallery
+
+
+def test_refresh_reads_only_what_changed(
+    gallery,
+):
+    gallery.save(
+        "A",
+        [1, 0, 0],
+    )
+
+    index = EmbeddingIndex(
+        1
+    )
+
+    index.refresh(
+        None
+    )
+
+    assert gallery.reads == [
+        None,
+    ]
+
+    loaded_version = gallery.version
+
+    index.refresh(
+        None
+    )
+
+    assert len(gallery.reads) == 1
+
+    gallery.save(
+        "B",
+        [0, 1, 0],
+    )
+
+    index.refresh(
+        None
+    )
+
+    assert gallery.reads[1] == loaded_version - timedelta(
+        seconds=5
+    )
+
+    assert len(index) == 2
+
+    assert index.match(
+        [0, 1, 0.1]
+    ) == "B"
+
+
+def test_refresh_reloads_an_old_gallery(
+    gallery,
+    monkeypatch,
+):
+    gallery.save(
+        "A",
+        [1, 0, 0],
+    )
+
+    index = EmbeddingIndex(
+        1
+    )
+
+    index.refresh(
+        None
+    )
+
+    index.upsert(
+        "GONE",
+        [0, 0, 1],
+    )
+
+    monkeypatch.setattr(
+        embedding_index,
+        "EMBEDDING_INDEX_MAX_AGE_SECONDS",
+        0,
+    )
+
+    index.refresh(
+        None
+    )
+
+    assert gallery.reads == [
+        None,
+        None,
+    ]
+
+    assert len(index) == 1
+
+    assert index.match(
+        [0, 0, 1]
+    ) is None
+
+
+def test_upsert_replaces_and_moves_rows():
+    index = EmbeddingIndex(
+        1
+    )
+
+    for face_id, embedding in (
+        (
+            "A",
+            [1, 0, 0],
+        ),
+        (
+            "B",
+            [0, 1, 0],
+        ),
+        (
+            "C",
+            [0, 0, 1],
+        ),
+    ):
+        index.upsert(
+            face_id,
+            embedding,
+        )
+
+    index.upsert(
+        "B",
+        [1, 1, 0],
+    )
+
+    assert len(index) == 3
+
+    assert index.match(
+        [1, 1, 0]
+    ) == "B"
+
+    # A new model's embedding moves A to another block; C takes its
+    # row and must still be found there.
+    index.upsert(
+        "A",
+        [1, 0, 0, 0],
+    )
+
+    assert len(index) == 3
+
+    assert index.match(
+        [0, 0, 1]
+    ) == "C"
+
+    assert index.match(
+        [1, 0, 0, 0]
+    ) == "A"
+
+    assert index.match(
+        [1, 0, 0]
+    ) != "A"
+
+    index.upsert(
+        "C",
+        [0, 0.1, 1],
+    )
+
+    assert index.match(
+        [0, 0.1, 1]
+    ) == "C"
+
+
+def test_match_considers_faces_of_the_same_image():
+    index = EmbeddingIndex(
+        1
+    )
+
+    index.upsert(
+        "A",
+        [1, 0, 0],
+    )
+
+    assert index.match(
+        [0, 1, 0],
+        pending=[
+            (
+                "NEW",
+                [0, 1, 0.05],
+            ),
+        ],
+    ) == "NEW"
+
+    assert index.match(
+        [0, 1, 0]
+    ) is None
@@ -0,0 +1,631 @@
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from api_server import face_api
+from api_server.inference_pool import InferenceQueueFull
+
+
+class FakeDatabase:
+    def cursor(
+        self,
+        **kwargs,
+    ):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(
+        self,
+        *exc_info,
+    ):
+        return False
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class FakeBatcher:
+    def __init__(
+        self,
+        outcome,
+    ):
+        self.outcome = outcome
+        self.calls = 0
+
+    def analyse(
+        self,
+        frame,
+        face_box=None,
+    ):
+        self.calls += 1
+
+        if isinstance(
+            self.outcome,
+            BaseException,
+        ):
+            raise self.outcome
+
+        return self.outcome
+
+
+@pytest.fixture
+def ingest(
+    monkeypatch,
+    tmp_path,
+):
+    """
+    Run process_pending_snapshot on one claimed job without a
+    database and record what it did with the job.
+    """
+    image_path = "BANK/MAIN/job.jpg"
+
+    (tmp_path / "BANK" / "MAIN").mkdir(
+        parents=True
+    )
+
+    cv2.imwrite(
+        str(tmp_path / image_path),
+        np.zeros(
+            (
+                32,
+                32,
+                3,
+            ),
+            dtype=np.uint8,
+        ),
+    )
+
+    calls = {
+        "released": [],
+        "failed": [],
+        "saved": [],
+    }
+
+    @contextmanager
+    def get_db():
+        yield FakeDatabase()
+
+    def run(
+        outcome,
+        attempt=1,
+    ):
+        job = {
+            "id": 7,
+            "job_id": "01JOB",
+            "pc_name": "BANK-PC-01",
+            "image_path": image_path,
+            "timestamp": None,
+            "processing_attempts": attempt,
+            "bank_id": 1,
+            "bank_code": "BANK",
+            "branch_id": 2,
+            "branch_code": "MAIN",
+        }
+
+        monkeypatch.setattr(
+            face_api,
+            "claim_pending_snapshot",
+            lambda cursor, lease_seconds: job,
+        )
+
+        monkeypatch.setattr(
+            face_api,
+            "INFERENCE_BATCHER",
+            FakeBatcher(
+                outcome
+            ),
+        )
+
+        face_api.process_pending_snapshot()
+
+        return calls
+
+    monkeypatch.setattr(
+        face_api,
+        "CAPTURED_FACES_ROOT",
+        tmp_path,
+    )
+
+    monkeypatch.setattr(
+        face_api,
+        "get_db",
+        get_db,
+    )
+
+    monkeypatch.setattr(
+        face_api,
+        "ASYNC_INGEST_MAX_ATTEMPTS",
+        3,
+    )
+
+    monkeypatch.setattr(
+        face_api,
+        "ASYNC_INGEST_RETRY_SECONDS",
+        10,
+    )
+
+    monkeypatch.setattr(
+        face_api,
+        "ASYNC_INGEST_POLL_SECONDS",
+        0,
+    )
+
+    monkeypatch.setattr(
+        face_api,
+        "release_pending_snapshot",
+        lambda database, snapshot_id, attempt, delay, count_attempt: (
+            calls["released"].append(
+                (
+                    attempt,
+                    delay,
+                    count_attempt,
+                )
+            )
+        ),
+    )
+
+    def fail_pending_snapshot(
+        database,
+        snapshot_id,
+        attempt,
+        error_message,
+    ):
+        calls["failed"].append(
+            error_message
+        )
+
+        return True
+
+    monkeypatch.setattr(
+        face_api,
+        "fail_pending_snapshot",
+        fail_pending_snapshot,
+    )
+
+    monkeypatch.setattr(
+        face_api,
+        "save_face_results",
+        lambda database, face_results, **job: calls["saved"].append(
+            job["pending_attempt"]
+        ),
+    )
+
+    run.image = tmp_path / image_path
+
+    return run
+
+
+def test_ingest_saves_analysed_job(
+    ingest,
+):
+    calls = ingest(
+        [
+            {
+                "face_index": 0,
+            },
+        ]
+    )
+
+    assert calls["saved"] == [1]
+    assert not calls["released"]
+    assert not calls["failed"]
+    assert ingest.image.exists()
+
+
+def test_ingest_fails_job_without_a_face_at_once(
+    ingest,
+):
+    calls = ingest(
+        ValueError(
+            "No face was detected."
+        )
+    )
+
+    assert calls["failed"] == [
+        "No face was detected.",
+    ]
+
+    assert not calls["released"]
+    assert not ingest.image.exists()
+
+
+def test_ingest_retries_other_errors_and_keeps_the_image(
+    ingest,
+):
+    calls = ingest(
+        RuntimeError(
+            "The inference worker died."
+        ),
+        attempt=2,
+    )
+
+    assert calls["released"] == [
+        (
+            2,
+            20,
+            True,
+        ),
+    ]
+
+    assert not calls["failed"]
+    assert ingest.image.exists()
+
+
+def test_ingest_fails_job_on_its_last_attempt(
+    ingest,
+):
+    calls = ingest(
+        RuntimeError(
+            "The database went away."
+        ),
+        attempt=3,
+    )
+
+    assert calls["failed"] == [
+        "Face and emotion processing failed.",
+    ]
+
+    assert not calls["released"]
+    assert not ingest.image.exists()
+
+
+def test_ingest_full_queue_does_not_use_an_attempt(
+    ingest,
+):
+    calls = ingest(
+        InferenceQueueFull(
+            "busy"
+        ),
+    )
+
+    assert calls["released"] == [
+        (
+            1,
+            0,
+            False,
+        ),
+    ]
+
+    assert not calls["failed"]
+
+
+def test_ingest_gives_up_on_a_job_that_keeps_killing_workers(
+    ingest,
+):
+    calls = ingest(
+        [],
+        attempt=4,
+    )
+
+    assert face_api.INFERENCE_BATCHER.calls == 0
+
+    assert calls["failed"] == [
+        "Face and emotion processing failed.",
+    ]
+
+
+@pytest.fixture
+def crop():
+    return np.zeros(
+        (
+            200,
+            160,
+            3,
+        ),
+        dtype=np.uint8,
+    )
+
+
+def test_parse_face_box_accepts_a_face_crop(
+    crop,
+):
+    assert face_api.parse_face_box(
+        " 20,30,120,140 ",
+        crop,
+    ) == (
+        20,
+        30,
+        120,
+        140,
+    )
+
+
+@pytest.mark.parametrize(
+    "value",
+    (
+        None,
+        "",
+        "   ",
+    ),
+)
+def test_parse_face_box_without_a_box(
+    value,
+    crop,
+):
+    assert face_api.parse_face_box(
+        value,
+        crop,
+    ) is None
+
+
+@pytest.mark.parametrize(
+    "value, message",
+    (
+        (
+            "20,30,120",
+            "four integers",
+        ),
+        (
+            "20,30,1.5,140",
+            "four integers",
+        ),
+        (
+            "-1,30,120,140",
+            "outside",
+        ),
+        (
+            "60,30,120,140",
+            "outside",
+        ),
+        (
+            "0,0,30,140",
+            "too small",
+        ),
+        (
+            "0,0,60,60",
+            "too little",
+        ),
+    ),
+)
+def test_parse_face_box_refuses_bad_boxes(
+    value,
+    message,
+    crop,
+):
+    with pytest.raises(
+        ValueError,
+        match=message,
+    ):
+        face_api.parse_face_box(
+            value,
+            crop,
+        )
+
+
+class ShadeBatcher:
+    """
+    Answer each frame by its shade: 0 finds a face, 1 finds none
+    and 2 finds the inference queue full.
+    """
+
+    async def analyse_async(
+        self,
+        frame,
+        face_box=None,
+    ):
+        shade = int(
+            frame[0, 0, 0]
+        )
+
+        if shade == 1:
+            raise ValueError(
+                "No face was detected."
+            )
+
+        if shade == 2:
+            raise InferenceQueueFull(
+                "The inference queue is full."
+            )
+
+        return [
+            {
+                "face_index": 0,
+            },
+        ]
+
+
+def png_of_shade(
+    shade,
+):
+    return cv2.imencode(
+        ".png",
+        np.full(
+            (
+                32,
+                32,
+                3,
+            ),
+            shade,
+            dtype=np.uint8,
+        ),
+    )[1].tobytes()
+
+
+@pytest.fixture
+def batch_upload(
+    monkeypatch,
+):
+    """
+    Post images to /upload-faces/batch without a database or models
+    and return the response with the upload outcomes counted.
+    """
+    bank = {
+        "id": 1,
+        "code": "BANK",
+        "name": "Bank",
+    }
+
+    branch = {
+        "id": 2,
+        "code": "MAIN",
+        "name": "Main",
+        "matched_prefix": "BANK-",
+    }
+
+    counted = []
+
+    monkeypatch.setattr(
+        face_api,
+        "resolve_branch",
+        lambda bank, pc_name: (
+            pc_name.upper(),
+            branch,
+        ),
+    )
+
+    monkeypatch.setattr(
+        face_api,
+        "INFERENCE_BATCHER",
+        ShadeBatcher(),
+    )
+
+    async def run_in_db_thread(
+        function,
+        images,
+        **kwargs,
+    ):
+        return [
+            [
+                {
+                    "face_id": image["job_id"],
+                },
+            ]
+            for image in images
+        ]
+
+    monkeypatch.setattr(
+        face_api,
+        "run_in_db_thread",
+        run_in_db_thread,
+    )
+
+    monkeypatch.setattr(
+        face_api,
+        "count_upload",
+        lambda endpoint, bank, branch_code, outcome: counted.append(
+            outcome
+        ),
+    )
+
+    monkeypatch.setitem(
+        face_api.app.dependency_overrides,
+        face_api.authenticate_bank,
+        lambda: bank,
+    )
+
+    def post(
+        images,
+    ):
+        response = TestClient(
+            face_api.app
+        ).post(
+            "/upload-faces/batch",
+            data={
+                "pc_name": "bank-pc-01",
+            },
+            files=[
+                (
+                    "files",
+                    (
+                        f"{name}.png",
+                        image_bytes,
+                        "image/png",
+                    ),
+                )
+                for name, image_bytes in images
+            ],
+        )
+
+        return (
+            response,
+            counted,
+        )
+
+    return post
+
+
+def test_batch_upload_reports_every_image(
+    batch_upload,
+):
+    (
+        response,
+        counted,
+    ) = batch_upload(
+        (
+            (
+                "processed",
+                png_of_shade(0),
+            ),
+            (
+                "not-an-image",
+                b"not an image",
+            ),
+            (
+                "no-face",
+                png_of_shade(1),
+            ),
+            (
+                "busy",
+                png_of_shade(2),
+            ),
+        )
+    )
+
+    assert response.status_code == 200
+    assert response.headers["Retry-After"]
+
+    statuses = [
+        result["status"]
+        for result in response.json()["results"]
+    ]
+
+    assert statuses == [
+        "processed",
+        "rejected",
+        "rejected",
+        "busy",
+    ]
+
+    assert counted == statuses
+
+
+def test_refused_batch_counts_every_image(
+    batch_upload,
+    monkeypatch,
+):
+    monkeypatch.setattr(
+        face_api,
+        "MAX_BATCH_UPLOAD_FILES",
+        1,
+    )
+
+    (
+        response,
+        counted,
+    ) = batch_upload(
+        (
+            (
+                "first",
+                png_of_shade(0),
+            ),
+            (
+                "second",
+                png_of_shade(0),
+            ),
+        )
+    )
+
+    assert response.status_code == 413
+
+    assert counted == [
+        "rejected",
+        "rejected",
+    ]
@@ -0,0 +1,316 @@
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+from api_server import face_analysis
+from api_server import face_detectors
+
+
+needs_cascades = pytest.mark.skipif(
+    not hasattr(
+        cv2,
+        "CascadeClassifier",
+    ),
+    reason="This OpenCV build has no Haar cascades.",
+)
+
+
+def rotate_whole_image(
+    image,
+    face_box,
+    left_eye,
+    right_eye,
+):
+    """
+    DeepFace's alignment done literally: border the image, rotate
+    all of it, then cut the projected face box.
+    """
+    height_border, width_border = face_detectors.alignment_border(
+        image
+    )
+
+    bordered = cv2.copyMakeBorder(
+        image,
+        height_border,
+        height_border,
+        width_border,
+        width_border,
+        cv2.BORDER_CONSTANT,
+        value=(
+            0,
+            0,
+            0,
+        ),
+    )
+
+    x, y, width, height = face_box
+
+    x += width_border
+    y += height_border
+
+    angle = np.degrees(
+        np.arctan2(
+            left_eye[1] - right_eye[1],
+            left_eye[0] - right_eye[0],
+        )
+    )
+
+    bordered_height, bordered_width = bordered.shape[:2]
+
+    rotated = cv2.warpAffine(
+        bordered,
+        cv2.getRotationMatrix2D(
+            (
+                bordered_width // 2,
+                bordered_height // 2,
+            ),
+            angle,
+            1.0,
+        ),
+        (
+            bordered_width,
+            bordered_height,
+        ),
+        flags=cv2.INTER_CUBIC,
+        borderMode=cv2.BORDER_CONSTANT,
+        borderValue=(
+            0,
+            0,
+            0,
+        ),
+    )
+
+    (
+        x1,
+        y1,
+        x2,
+        y2,
+    ) = face_detectors.project_facial_area(
+        (
+            x,
+            y,
+            x + width,
+            y + height,
+        ),
+        angle,
+        (
+            bordered_height,
+            bordered_width,
+        ),
+    )
+
+    return rotated[
+        y1:y2,
+        x1:x2,
+    ]
+
+
+@pytest.mark.parametrize(
+    "left_eye, right_eye",
+    (
+        (
+            (150, 95),
+            (100, 105),
+        ),
+        (
+            (150, 110),
+            (100, 92),
+        ),
+    ),
+)
+def test_align_face_matches_rotating_the_whole_image(
+    left_eye,
+    right_eye,
+):
+    image = np.random.default_rng(
+        0
+    ).integers(
+        0,
+        256,
+        size=(
+            240,
+            320,
+            3,
+        ),
+        dtype=np.uint8,
+    )
+
+    face_box = (
+        70,
+        50,
+        110,
+        120,
+    )
+
+    aligned = face_detectors.align_face(
+        image,
+        face_box,
+        left_eye,
+        right_eye,
+        face_detectors.alignment_border(
+            image
+        ),
+    )
+
+    expected = rotate_whole_image(
+        image,
+        face_box,
+        left_eye,
+        right_eye,
+    )
+
+    assert aligned.shape == expected.shape
+
+    # Only interpolation rounding may differ.
+    assert np.abs(
+        aligned.astype(np.int16)
+        - expected
+    ).mean() < 1.0
+
+
+def test_align_face_without_eyes_keeps_the_box():
+    image = np.arange(
+        100 * 120 * 3,
+        dtype=np.uint32,
+    ).reshape(
+        100,
+        120,
+        3,
+    ).astype(
+        np.uint8
+    )
+
+    aligned = face_detectors.align_face(
+        image,
+        (
+            10,
+            20,
+            30,
+            40,
+        ),
+        None,
+        None,
+    )
+
+    assert np.array_equal(
+        aligned,
+        image[20:60, 10:40],
+    )
+
+
+@needs_cascades
+def test_onnx_detection_does_not_need_deepface(
+    monkeypatch,
+):
+    monkeypatch.setattr(
+        face_analysis,
+        "INFERENCE_ENGINE",
+        "onnx",
+    )
+
+    def no_deepface():
+        raise AssertionError(
+            "DeepFace was imported for an OpenCV detector."
+        )
+
+    monkeypatch.setattr(
+        face_analysis,
+        "get_deepface",
+        no_deepface,
+    )
+
+    with pytest.raises(
+        ValueError
+    ):
+        face_analysis.extract_aligned_faces(
+            np.zeros(
+                (
+                    120,
+                    160,
+                    3,
+                ),
+                dtype=np.uint8,
+            ),
+            "opencv",
+        )
+
+    assert "tensorflow" not in sys.modules
+
+
+def test_face_box_is_aligned_like_a_detected_face(
+    monkeypatch,
+):
+    frame = np.random.default_rng(
+        1
+    ).integers(
+        0,
+        256,
+        size=(
+            200,
+            180,
+            3,
+        ),
+        dtype=np.uint8,
+    )
+
+    face_box = (
+        30,
+        40,
+        120,
+        130,
+    )
+
+    # Eyes within the box, tilted by about 11 degrees.
+    monkeypatch.setattr(
+        face_detectors,
+        "find_eyes",
+        lambda face_image: (
+            (
+                85,
+                45,
+            ),
+            (
+                35,
+                55,
+            ),
+        ),
+    )
+
+    monkeypatch.setattr(
+        face_analysis,
+        "enhance_face",
+        lambda face_image: face_image,
+    )
+
+    [
+        (
+            face_index,
+            face_image,
+        ),
+    ] = face_analysis.detect_face_crops(
+        frame,
+        face_box,
+    )
+
+    expected = rotate_whole_image(
+        frame,
+        face_box,
+        (
+            30 + 85,
+            40 + 45,
+        ),
+        (
+            30 + 35,
+            40 + 55,
+        ),
+    )
+
+    assert face_index == 0
+    assert face_image.shape == expected.shape
+
+    assert np.abs(
+        face_image.astype(np.int16)
+        - expected
+    ).mean() < 1.0
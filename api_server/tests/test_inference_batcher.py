@@ -0,0 +1,253 @@
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from api_server.inference_batcher import InferenceBatcher
+from api_server.inference_pool import InferenceQueueFull
+
+
+class FakeExecutor:
+    """
+    Record each batch submitted and answer it with one face per
+    frame, named after the frame. free_slots limits how many frames
+    it takes.
+    """
+
+    def __init__(
+        self,
+        free_slots=64,
+    ):
+        self.free_slots = free_slots
+        self.batches = []
+        self.submitted = threading.Event()
+
+    def reserve(
+        self,
+        count,
+    ):
+        reserved = min(
+            count,
+            self.free_slots,
+        )
+
+        self.free_slots -= reserved
+
+        return reserved
+
+    def submit(
+        self,
+        function,
+        frames,
+        face_boxes,
+        reserved_slots=0,
+    ):
+        assert reserved_slots == len(frames)
+
+        self.batches.append(
+            list(frames)
+        )
+
+        self.submitted.set()
+
+        future = Future()
+
+        future.set_result(
+            (
+                [
+                    {
+                        "faces": [
+                            frame,
+                        ],
+                    }
+                    for frame in frames
+                ],
+                {},
+            )
+        )
+
+        return future
+
+
+def test_full_batch_is_sent_at_once():
+    executor = FakeExecutor()
+
+    batcher = InferenceBatcher(
+        executor,
+        max_frames=2,
+        max_wait_ms=60000,
+    )
+
+    first = batcher.submit(
+        "a"
+    )
+
+    assert not executor.batches
+
+    second = batcher.submit(
+        "b"
+    )
+
+    assert executor.batches == [
+        [
+            "a",
+            "b",
+        ],
+    ]
+
+    assert first.result(timeout=1) == {
+        "faces": [
+            "a",
+        ],
+    }
+
+    assert second.result(timeout=1) == {
+        "faces": [
+            "b",
+        ],
+    }
+
+
+def test_partial_batch_is_sent_after_max_wait():
+    executor = FakeExecutor()
+
+    batcher = InferenceBatcher(
+        executor,
+        max_frames=8,
+        max_wait_ms=50,
+    )
+
+    started = time.monotonic()
+
+    for frame in (
+        "a",
+        "b",
+    ):
+        batcher.submit(
+            frame
+        )
+
+    assert executor.submitted.wait(
+        5
+    )
+
+    assert time.monotonic() - started >= 0.05
+
+    assert executor.batches == [
+        [
+            "a",
+            "b",
+        ],
+    ]
+
+    # The same flusher thread serves the next batch.
+    flusher = batcher._flusher
+
+    assert batcher.analyse(
+        "c"
+    ) == [
+        "c",
+    ]
+
+    assert batcher._flusher is flusher
+
+
+def test_no_wait_sends_every_frame_alone():
+    executor = FakeExecutor()
+
+    batcher = InferenceBatcher(
+        executor,
+        max_frames=8,
+        max_wait_ms=0,
+    )
+
+    batcher.submit(
+        "a"
+    )
+
+    batcher.submit(
+        "b"
+    )
+
+    assert executor.batches == [
+        [
+            "a",
+        ],
+        [
+            "b",
+        ],
+    ]
+
+    assert batcher._flusher is None
+
+
+def test_refused_batch_fails_every_frame():
+    batcher = InferenceBatcher(
+        FakeExecutor(
+            free_slots=0
+        ),
+        max_frames=2,
+        max_wait_ms=60000,
+    )
+
+    futures = [
+        batcher.submit(
+            frame
+        )
+        for frame in (
+            "a",
+            "b",
+        )
+    ]
+
+    for future in futures:
+        with pytest.raises(
+            InferenceQueueFull
+        ):
+            future.result(
+                timeout=1
+            )
+
+
+def test_frames_beyond_the_free_slots_are_refused():
+    executor = FakeExecutor(
+        free_slots=2
+    )
+
+    batcher = InferenceBatcher(
+        executor,
+        max_frames=3,
+        max_wait_ms=60000,
+    )
+
+    futures = [
+        batcher.submit(
+            frame
+        )
+        for frame in (
+            "a",
+            "b",
+            "c",
+        )
+    ]
+
+    assert executor.batches == [
+        [
+            "a",
+            "b",
+        ],
+    ]
+
+    assert futures[1].result(timeout=1) == {
+        "faces": [
+            "b",
+        ],
+    }
+
+    with pytest.raises(
+        InferenceQueueFull
+    ):
+        futures[2].result(
+            timeout=1
+        )
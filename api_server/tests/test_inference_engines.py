@@ -0,0 +1,301 @@
+"""
+The inference engines, and parity between deepface and onnx.
+
+The parity tests need DeepFace, ONNX Runtime and the models exported
+by python -m api_server.export_onnx, and are skipped otherwise. Point
+FACE_TEST_IMAGES at a folder of real face images to check real faces;
+the embedding check falls back to random images.
+"""
+
+import os
+import sys
+from pathlib import Path
+from types import (
+    ModuleType,
+    SimpleNamespace,
+)
+
+import cv2
+import numpy as np
+import pytest
+
+from api_server import (
+    face_detectors,
+    inference_engines,
+)
+from api_server.export_onnx import (
+    check_parity,
+    load_face_images,
+)
+from api_server.inference_engines import (
+    MODEL_ROLES,
+    onnx_model_path,
+)
+
+
+FACE_TEST_IMAGES = os.getenv(
+    "FACE_TEST_IMAGES",
+    "",
+)
+
+
+class FakeKerasModel:
+    def __init__(
+        self,
+        input_shape,
+        output_size,
+    ):
+        self.input_shape = input_shape
+        self.output_size = output_size
+
+    def predict_on_batch(
+        self,
+        batch,
+    ):
+        return np.zeros(
+            (
+                len(batch),
+                self.output_size,
+            )
+        )
+
+
+def build_model(
+    task,
+    model_name,
+):
+    """
+    Clients shaped like deepface 0.0.98's: a recognition client
+    stores its (width, height), an attribute client only has its
+    Keras model.
+    """
+    if task == "facial_recognition":
+        return SimpleNamespace(
+            model_name=model_name,
+            input_shape=(
+                112,
+                128,
+            ),
+            model=FakeKerasModel(
+                (
+                    None,
+                    128,
+                    112,
+                    3,
+                ),
+                512,
+            ),
+        )
+
+    return SimpleNamespace(
+        model_name=model_name,
+        model=FakeKerasModel(
+            (
+                None,
+                48,
+                48,
+                1,
+            ),
+            7,
+        ),
+    )
+
+
+@pytest.fixture
+def deepface_models(
+    monkeypatch,
+):
+    """
+    Make DeepFace build fake models, through the real DeepFace
+    module when it is installed.
+    """
+    try:
+        from deepface.modules import modeling
+
+    except ImportError:
+        deepface = ModuleType(
+            "deepface"
+        )
+
+        deepface.DeepFace = SimpleNamespace(
+            build_model=lambda model_name, task: build_model(
+                task=task,
+                model_name=model_name,
+            ),
+        )
+
+        monkeypatch.setitem(
+            sys.modules,
+            "deepface",
+            deepface,
+        )
+
+    else:
+        monkeypatch.setattr(
+            modeling,
+            "build_model",
+            build_model,
+        )
+
+    monkeypatch.setattr(
+        inference_engines,
+        "INFERENCE_ENGINE",
+        "deepface",
+    )
+
+    monkeypatch.setattr(
+        inference_engines,
+        "_LOADED_MODELS",
+        {},
+    )
+
+
+def test_deepface_engine_builds_every_role(
+    deepface_models,
+):
+    embedding = inference_engines.get_inference_model(
+        "embedding"
+    )
+
+    emotion = inference_engines.get_inference_model(
+        "emotion"
+    )
+
+    assert embedding.input_size == (
+        128,
+        112,
+    )
+
+    assert emotion.input_size == (
+        48,
+        48,
+    )
+
+    assert emotion.predict(
+        np.zeros(
+            (
+                2,
+                48,
+                48,
+                1,
+            ),
+            dtype=np.float32,
+        )
+    ).shape == (
+        2,
+        7,
+    )
+
+
+@pytest.fixture(scope="module")
+def face_images():
+    return load_face_images(
+        (
+            Path(FACE_TEST_IMAGES)
+            if FACE_TEST_IMAGES
+            else None
+        ),
+        32,
+        np.random.default_rng(
+            0
+        ),
+    )
+
+
+def test_onnx_engine_matches_deepface(
+    face_images,
+):
+    pytest.importorskip(
+        "deepface"
+    )
+
+    pytest.importorskip(
+        "onnxruntime"
+    )
+
+    for role in MODEL_ROLES:
+        if not onnx_model_path(
+            role
+        ).is_file():
+            pytest.skip(
+                f"The {role} model has not been exported."
+            )
+
+    (
+        min_cosine,
+        _,
+        _,
+        max_emotion_difference,
+    ) = check_parity(
+        face_images
+    )
+
+    assert min_cosine >= 0.999
+
+    # Random images give near-even emotion scores, so compare the
+    # probabilities rather than the dominant emotion.
+    assert max_emotion_difference < 1e-3
+
+
+@pytest.mark.parametrize(
+    "backend",
+    face_detectors.NATIVE_DETECTORS,
+)
+def test_native_detection_matches_deepface(
+    backend,
+    face_images,
+):
+    deepface = pytest.importorskip(
+        "deepface"
+    )
+
+    if not FACE_TEST_IMAGES:
+        pytest.skip(
+            "FACE_TEST_IMAGES is not set."
+        )
+
+    if (
+        backend == "yunet"
+        and not face_detectors.YUNET_MODEL_PATH.is_file()
+    ):
+        pytest.skip(
+            "The YuNet model is not available."
+        )
+
+    for face_image in face_images:
+        expected_faces = [
+            extracted_face["face"]
+            for extracted_face in deepface.DeepFace.extract_faces(
+                img_path=face_image,
+                detector_backend=backend,
+                enforce_detection=False,
+                align=True,
+                color_face="bgr",
+                normalize_face=False,
+            )
+            if extracted_face["confidence"]
+        ]
+
+        faces = face_detectors.detect_aligned_faces(
+            face_image,
+            backend,
+        )
+
+        assert len(faces) == len(expected_faces)
+
+        for face, expected_face in zip(
+            faces,
+            expected_faces,
+        ):
+            assert abs(face.shape[0] - expected_face.shape[0]) <= 1
+            assert abs(face.shape[1] - expected_face.shape[1]) <= 1
+
+            face = cv2.resize(
+                face,
+                expected_face.shape[1::-1],
+            )
+
+            assert np.abs(
+                face.astype(np.float32)
+                - expected_face
+            ).mean() < 2.0
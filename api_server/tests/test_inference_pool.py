@@ -0,0 +1,204 @@
+import os
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from api_server import face_analysis
+from api_server.inference_pool import (
+    InferenceExecutor,
+    InferenceQueueFull,
+)
+
+
+def submit_when_free(
+    executor,
+    function,
+    *args,
+):
+    """
+    Submit once a slot is free. Slots are released by a done
+    callback, which may run just after result() has returned.
+    """
+    deadline = time.monotonic() + 5
+
+    while True:
+        try:
+            return executor.submit(
+                function,
+                *args,
+            )
+
+        except InferenceQueueFull:
+            if time.monotonic() > deadline:
+                raise
+
+            time.sleep(
+                0.01
+            )
+
+
+def test_submit_refuses_work_beyond_the_queue():
+    executor = InferenceExecutor(
+        worker_count=0,
+        queue_size=1,
+    )
+
+    release = threading.Event()
+
+    try:
+        running = executor.submit(
+            release.wait,
+            5,
+        )
+
+        queued = executor.submit(
+            release.wait,
+            5,
+        )
+
+        with pytest.raises(
+            InferenceQueueFull
+        ):
+            executor.submit(
+                release.wait,
+                5,
+            )
+
+        release.set()
+
+        assert running.result()
+        assert queued.result()
+
+        assert submit_when_free(
+            executor,
+            int,
+            "3",
+        ).result() == 3
+
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+def test_batch_holds_one_slot_per_frame():
+    executor = InferenceExecutor(
+        worker_count=0,
+        queue_size=2,
+    )
+
+    release = threading.Event()
+
+    try:
+        reserved_slots = executor.reserve(
+            5
+        )
+
+        assert reserved_slots == 3
+
+        batch = executor.submit(
+            release.wait,
+            5,
+            reserved_slots=reserved_slots,
+        )
+
+        with pytest.raises(
+            InferenceQueueFull
+        ):
+            executor.submit(
+                int,
+                "1",
+            )
+
+        # Done callbacks run in order, so this one runs after the
+        # executor has released the batch's slots.
+        released = threading.Event()
+
+        batch.add_done_callback(
+            lambda done_future: released.set()
+        )
+
+        release.set()
+
+        assert batch.result()
+        assert released.wait(5)
+
+        assert executor.reserve(
+            5
+        ) == 3
+
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+def test_pool_restarts_after_a_worker_dies():
+    executor = InferenceExecutor(
+        worker_count=1,
+        queue_size=0,
+        initializer=None,
+    )
+
+    try:
+        first_pid = executor.submit(
+            os.getpid
+        ).result()
+
+        with pytest.raises(
+            BrokenProcessPool
+        ):
+            submit_when_free(
+                executor,
+                os._exit,
+                1,
+            ).result()
+
+        second_pid = submit_when_free(
+            executor,
+            os.getpid,
+        ).result()
+
+    finally:
+        executor.shutdown()
+
+    assert second_pid != first_pid
+
+
+def warm_up_without_models():
+    """
+    Stand-in for warm_up_worker in spawned test workers, which have
+    no models to load.
+    """
+    face_analysis.WARM_UP_REPORT.update(
+        {
+            "pid": os.getpid(),
+            "models": {},
+        }
+    )
+
+
+def test_warm_up_reports_every_worker_once():
+    executor = InferenceExecutor(
+        worker_count=3,
+        queue_size=0,
+        initializer=warm_up_without_models,
+    )
+
+    try:
+        assert executor.warm_up()
+
+        readiness = executor.readiness()
+
+    finally:
+        executor.shutdown()
+
+    worker_pids = [
+        report["pid"]
+        for report in readiness["workers"]
+    ]
+
+    assert readiness["ready"]
+    assert len(worker_pids) == 3
+    assert len(set(worker_pids)) == 3
+    assert os.getpid() not in worker_pids
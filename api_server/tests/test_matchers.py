@@ -0,0 +1,261 @@
+import time
+
+import numpy as np
+import pytest
+
+from api_server.matchers import (
+    ExactMatcher,
+    IVFMatcher,
+    create_matcher,
+)
+
+
+@pytest.fixture
+def gallery():
+    """
+    Unit rows around 16 cluster centres, with their face IDs.
+    """
+    generator = np.random.default_rng(
+        0
+    )
+
+    centres = generator.normal(
+        size=(
+            16,
+            32,
+        )
+    )
+
+    matrix = (
+        centres[
+            generator.integers(
+                0,
+                16,
+                size=1000,
+            )
+        ]
+        + generator.normal(
+            scale=0.3,
+            size=(
+                1000,
+                32,
+            ),
+        )
+    ).astype(
+        np.float32
+    )
+
+    matrix /= np.linalg.norm(
+        matrix,
+        axis=1,
+        keepdims=True,
+    )
+
+    face_ids = np.array(
+        [
+            f"F{row}"
+            for row in range(
+                len(matrix)
+            )
+        ],
+        dtype=object,
+    )
+
+    return (
+        matrix,
+        face_ids,
+    )
+
+
+def built_matcher(
+    matrix,
+):
+    matcher = IVFMatcher(
+        list_count=16,
+        probe_count=2,
+        min_gallery_size=1,
+    )
+
+    matcher.build(
+        matrix
+    )
+
+    return matcher
+
+
+def test_ivf_finds_every_indexed_row(
+    gallery,
+):
+    (
+        matrix,
+        face_ids,
+    ) = gallery
+
+    matcher = built_matcher(
+        matrix
+    )
+
+    for row in range(
+        0,
+        len(matrix),
+        50,
+    ):
+        (
+            face_id,
+            distance,
+        ) = matcher.closest(
+            matrix[row],
+            matrix,
+            face_ids,
+        )
+
+        assert face_id == face_ids[row]
+        assert distance < 1e-5
+
+
+def test_ivf_scans_added_and_changed_rows_exactly(
+    gallery,
+):
+    (
+        matrix,
+        face_ids,
+    ) = gallery
+
+    matcher = built_matcher(
+        matrix[:900]
+    )
+
+    # A row added after the build lies past the indexed size.
+    matcher.row_added(
+        950
+    )
+
+    assert matcher.closest(
+        matrix[950],
+        matrix,
+        face_ids,
+    )[0] == face_ids[950]
+
+    # A changed row may now belong to a list that is not probed.
+    matrix[10] = -matrix[10]
+
+    matcher.row_changed(
+        10
+    )
+
+    assert matcher.closest(
+        matrix[10],
+        matrix,
+        face_ids,
+    )[0] == face_ids[10]
+
+
+def test_moving_rows_discards_built_and_running_builds(
+    gallery,
+):
+    (
+        matrix,
+        _,
+    ) = gallery
+
+    matcher = built_matcher(
+        matrix
+    )
+
+    generation = matcher._generation
+
+    matcher.rows_moved()
+
+    assert not matcher.is_built
+
+    # A build that copied the gallery before the move is dropped.
+    matcher.build(
+        matrix,
+        generation,
+    )
+
+    assert not matcher.is_built
+
+    matcher.build(
+        matrix,
+        matcher._generation,
+    )
+
+    assert matcher.is_built
+
+
+def test_ivf_builds_in_the_background(
+    gallery,
+):
+    (
+        matrix,
+        face_ids,
+    ) = gallery
+
+    matcher = IVFMatcher(
+        list_count=16,
+        probe_count=2,
+        min_gallery_size=100,
+    )
+
+    # Too small a gallery is scanned without building lists.
+    assert matcher.closest(
+        matrix[0],
+        matrix[:50],
+        face_ids[:50],
+    )[0] == face_ids[0]
+
+    assert not matcher.is_built
+
+    # The first query of a large gallery is answered exactly while
+    # the lists are built.
+    assert matcher.closest(
+        matrix[500],
+        matrix,
+        face_ids,
+    )[0] == face_ids[500]
+
+    deadline = time.monotonic() + 10
+
+    while (
+        not matcher.is_built
+        and time.monotonic() < deadline
+    ):
+        time.sleep(
+            0.01
+        )
+
+    assert matcher.is_built
+
+    assert not matcher._needs_build(
+        len(matrix)
+    )
+
+
+@pytest.mark.parametrize(
+    "backend, matcher_class",
+    (
+        (
+            "exact",
+            ExactMatcher,
+        ),
+        (
+            "ivf",
+            IVFMatcher,
+        ),
+        (
+            "faiss",
+            ExactMatcher,
+        ),
+    ),
+)
+def test_create_matcher(
+    backend,
+    matcher_class,
+):
+    assert isinstance(
+        create_matcher(
+            backend
+        ),
+        matcher_class,
+    )
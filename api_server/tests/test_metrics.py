@@ -0,0 +1,150 @@
+import pytest
+
+from api_server import metrics
+from api_server.metrics import (
+    Counter,
+    Gauge,
+    Histogram,
+    MetricsRegistry,
+)
+
+
+def test_histogram_buckets_are_cumulative_and_inclusive():
+    histogram = Histogram(
+        "stage_seconds",
+        "Stage time.",
+        (
+            "stage",
+        ),
+        buckets=(
+            1.0,
+            0.1,
+        ),
+    )
+
+    for seconds in (
+        0.05,
+        0.1,
+        0.5,
+        1.0,
+        3.0,
+    ):
+        histogram.observe(
+            seconds,
+            "decode",
+        )
+
+    assert histogram.render() == [
+        "# HELP stage_seconds Stage time.",
+        "# TYPE stage_seconds histogram",
+        'stage_seconds_bucket{stage="decode",le="0.1"} 2',
+        'stage_seconds_bucket{stage="decode",le="1.0"} 4',
+        'stage_seconds_bucket{stage="decode",le="+Inf"} 5',
+        'stage_seconds_sum{stage="decode"} 4.65',
+        'stage_seconds_count{stage="decode"} 5',
+    ]
+
+
+def test_histogram_time_observes_the_block():
+    histogram = Histogram(
+        "stage_seconds",
+        "Stage time.",
+    )
+
+    with pytest.raises(
+        RuntimeError
+    ):
+        with histogram.time():
+            raise RuntimeError(
+                "The stage failed."
+            )
+
+    assert "stage_seconds_count 1" in histogram.render()
+
+
+def test_labels_are_checked_and_escaped():
+    counter = Counter(
+        "uploads_total",
+        "Uploads.",
+        (
+            "bank",
+        ),
+    )
+
+    with pytest.raises(
+        ValueError
+    ):
+        counter.inc()
+
+    counter.inc(
+        'A "B"\\C\n',
+        amount=2,
+    )
+
+    assert counter.render()[-1] == (
+        'uploads_total{bank="A \\"B\\"\\\\C\\n"} 2'
+    )
+
+
+def test_registry_renders_every_metric():
+    registry = MetricsRegistry()
+
+    registry.register(
+        Gauge(
+            "gallery_size",
+            "Visitors.",
+        )
+    ).set(
+        3
+    )
+
+    registry.register(
+        Counter(
+            "uploads_total",
+            "Uploads.",
+        )
+    ).inc()
+
+    assert registry.render() == (
+        "# HELP gallery_size Visitors.\n"
+        "# TYPE gallery_size gauge\n"
+        "gallery_size 3\n"
+        "# HELP uploads_total Uploads.\n"
+        "# TYPE uploads_total counter\n"
+        "uploads_total 1\n"
+    )
+
+
+def test_worker_stage_timings_are_observed(
+    monkeypatch,
+):
+    histogram = Histogram(
+        "stage_seconds",
+        "Stage time.",
+        (
+            "stage",
+        ),
+    )
+
+    monkeypatch.setattr(
+        metrics,
+        "STAGE_SECONDS",
+        histogram,
+    )
+
+    metrics.observe_stage_timings(
+        {
+            "embedding": [
+                0.02,
+                0.03,
+            ],
+            "emotion": [
+                0.01,
+            ],
+        }
+    )
+
+    rendered = histogram.render()
+
+    assert 'stage_seconds_count{stage="embedding"} 2' in rendered
+    assert 'stage_seconds_count{stage="emotion"} 1' in rendered
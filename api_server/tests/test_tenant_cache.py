@@ -0,0 +1,300 @@
+import threading
+from types import SimpleNamespace
+
+from api_server import tenant_cache
+from api_server.tenant_cache import (
+    BranchPrefixTable,
+    TenantCache,
+    run_invalidation_listener,
+)
+
+
+BANKS = {
+    1: {
+        "id": 1,
+        "code": "ALPHA",
+    },
+    2: {
+        "id": 2,
+        "code": "BETA",
+    },
+}
+
+
+class Loader:
+    """
+    Count database loads and return a fixed value.
+    """
+
+    def __init__(
+        self,
+        value,
+    ):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+
+        return self.value
+
+
+def branches(
+    *prefixes,
+):
+    return [
+        {
+            "id": branch_id,
+            "code": f"B{branch_id}",
+            "pc_prefix": prefix,
+        }
+        for branch_id, prefix in enumerate(
+            prefixes
+        )
+    ]
+
+
+def test_only_verified_keys_are_cached():
+    cache = TenantCache(
+        ttl_seconds=60
+    )
+
+    verified = Loader(
+        BANKS[1]
+    )
+
+    refused = Loader(
+        None
+    )
+
+    for _ in range(2):
+        assert cache.verified_bank(
+            " alpha ",
+            "right-key",
+            verified,
+        ) == BANKS[1]
+
+        assert cache.verified_bank(
+            "ALPHA",
+            "wrong-key",
+            refused,
+        ) is None
+
+    assert verified.calls == 1
+    assert refused.calls == 2
+
+
+def test_invalidate_drops_only_that_bank():
+    cache = TenantCache(
+        ttl_seconds=60
+    )
+
+    loads = {
+        bank_id: (
+            Loader(
+                BANKS[bank_id]
+            ),
+            Loader(
+                branches(
+                    "PC-",
+                )
+            ),
+        )
+        for bank_id in BANKS
+    }
+
+    for _ in range(2):
+        for bank_id, (
+            bank_loader,
+            branch_loader,
+        ) in loads.items():
+            cache.verified_bank(
+                BANKS[bank_id]["code"],
+                "key",
+                bank_loader,
+            )
+
+            cache.branch_for_pc(
+                bank_id,
+                "PC-01",
+                branch_loader,
+            )
+
+        cache.invalidate(
+            1
+        )
+
+    assert [
+        (
+            bank_loader.calls,
+            branch_loader.calls,
+        )
+        for bank_loader, branch_loader in loads.values()
+    ] == [
+        (
+            2,
+            2,
+        ),
+        (
+            1,
+            1,
+        ),
+    ]
+
+
+def test_load_overlapping_an_invalidation_is_not_stored():
+    cache = TenantCache(
+        ttl_seconds=60
+    )
+
+    def load_while_dashboard_saves():
+        cache.invalidate(
+            1
+        )
+
+        return branches(
+            "OLD-",
+        )
+
+    assert cache.branch_for_pc(
+        1,
+        "OLD-PC",
+        load_while_dashboard_saves,
+    )["code"] == "B0"
+
+    fresh = Loader(
+        branches(
+            "NEW-",
+        )
+    )
+
+    assert cache.branch_for_pc(
+        1,
+        "OLD-PC",
+        fresh,
+    ) is None
+
+    assert fresh.calls == 1
+
+
+def test_zero_ttl_disables_the_cache():
+    cache = TenantCache(
+        ttl_seconds=0
+    )
+
+    verified = Loader(
+        BANKS[1]
+    )
+
+    for _ in range(2):
+        cache.verified_bank(
+            "ALPHA",
+            "key",
+            verified,
+        )
+
+    assert verified.calls == 2
+
+
+def test_longest_prefix_wins():
+    table = BranchPrefixTable(
+        branches(
+            "ATM",
+            " atm-lobby ",
+            "",
+            None,
+        )
+    )
+
+    assert table.match(
+        "ATM-LOBBY-02"
+    ) == {
+        "id": 1,
+        "code": "B1",
+        "pc_prefix": " atm-lobby ",
+        "matched_prefix": "atm-lobby",
+    }
+
+    assert table.match(
+        "ATM-TELLER"
+    )["code"] == "B0"
+
+    assert table.match(
+        "AT"
+    ) is None
+
+
+class FakeListenerConnection:
+    def __init__(
+        self,
+        payloads,
+        stop_event,
+    ):
+        self.notifies = []
+        self.payloads = payloads
+        self.stop_event = stop_event
+        self.closed = False
+
+    def poll(self):
+        self.notifies.extend(
+            SimpleNamespace(
+                payload=payload,
+            )
+            for payload in self.payloads
+        )
+
+        self.stop_event.set()
+
+    def close(self):
+        self.closed = True
+
+
+def test_listener_invalidates_notified_banks(
+    monkeypatch,
+):
+    stop_event = threading.Event()
+
+    connection = FakeListenerConnection(
+        [
+            "2",
+            "not-a-bank",
+        ],
+        stop_event,
+    )
+
+    monkeypatch.setattr(
+        tenant_cache,
+        "connect_listener",
+        lambda channel: connection,
+    )
+
+    monkeypatch.setattr(
+        tenant_cache.select,
+        "select",
+        lambda readable, writable, errors, timeout: (
+            readable,
+            [],
+            [],
+        ),
+    )
+
+    invalidated = []
+
+    run_invalidation_listener(
+        stop_event,
+        SimpleNamespace(
+            invalidate=lambda bank_id=None: invalidated.append(
+                bank_id
+            ),
+        ),
+    )
+
+    # Everything on connect, then bank 2, then everything for a
+    # payload that names no bank.
+    assert invalidated == [
+        None,
+        2,
+        None,
+    ]
+
+    assert connection.closed
@@ -0,0 +1,204 @@
+"""
+Compare the desktop client's face detectors on a recorded video.
+
+Run from the project root, with the same .env as desktop_capture.py:
+
+    python benchmark_capture_detectors.py --video recordings/teller1.mp4
+
+Record the video with the teller camera in its installed position,
+with customers arriving, sitting, talking and leaving. Every
+--every-th frame goes through the capture zone, detection and the
+quality gate exactly as in the capture service.
+
+For each detector it reports detection latency and the frames per
+second detection alone could sustain. It also reports the share of
+frames with exactly one face, with several faces, and with an
+accepted capture candidate: one face that passed every quality gate.
+A detector that cannot load, for example because its model file is
+missing, is reported as unavailable.
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+import desktop_capture as capture
+
+
+DEFAULT_DETECTORS = (
+    "haar",
+    "yunet",
+    "ssd",
+)
+
+
+def run_detector(
+    detector,
+    video_path,
+    every,
+    limit,
+):
+    """
+    Return (latencies_ms, frames, one_face, multiple_faces, accepted)
+    for one detector.
+    """
+    video = cv2.VideoCapture(
+        str(video_path)
+    )
+
+    if not video.isOpened():
+        raise SystemExit(
+            f"Could not open {video_path}."
+        )
+
+    latencies = []
+    frame_index = -1
+    one_face = 0
+    multiple_faces = 0
+    accepted = 0
+
+    try:
+        while not limit or len(latencies) < limit:
+            ok, frame = video.read()
+
+            if not ok:
+                break
+
+            frame_index += 1
+
+            if frame_index % every:
+                continue
+
+            started = time.perf_counter()
+
+            (
+                faces,
+                roi,
+                landmarks,
+            ) = capture.detect_faces(
+                frame,
+                detector,
+            )
+
+            latencies.append(
+                time.perf_counter() - started
+            )
+
+            if len(faces) > 1:
+                multiple_faces += 1
+
+            elif faces:
+                one_face += 1
+
+                if capture.inspect_quality(
+                    frame,
+                    faces[0],
+                    roi,
+                    landmarks[0],
+                ).accepted:
+                    accepted += 1
+
+    finally:
+        video.release()
+
+    return (
+        np.asarray(
+            latencies
+        )
+        * 1000.0,
+        len(latencies),
+        one_face,
+        multiple_faces,
+        accepted,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+
+    parser.add_argument(
+        "--video",
+        type=Path,
+        required=True,
+    )
+
+    parser.add_argument(
+        "--detectors",
+        nargs="+",
+        default=list(
+            DEFAULT_DETECTORS
+        ),
+    )
+
+    parser.add_argument(
+        "--every",
+        type=int,
+        default=capture.DETECTION_INTERVAL_FRAMES,
+    )
+
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=0,
+    )
+
+    arguments = parser.parse_args()
+
+    print(
+        f"Video: {arguments.video} | every {arguments.every} frame(s) | "
+        f"detection width: {capture.DETECTION_MAX_WIDTH or 'full'}"
+    )
+
+    for name in arguments.detectors:
+        try:
+            detector = capture.create_face_detector(
+                name
+            )
+
+        except Exception as error:
+            print(
+                f"{name:<8s} unavailable: {error}"
+            )
+
+            continue
+
+        (
+            latencies,
+            frames,
+            one_face,
+            multiple_faces,
+            accepted,
+        ) = run_detector(
+            detector,
+            arguments.video,
+            max(
+                1,
+                arguments.every,
+            ),
+            arguments.limit,
+        )
+
+        if not frames:
+            raise SystemExit(
+                f"No frames could be read from {arguments.video}."
+            )
+
+        print(
+            f"{name:<8s} "
+            f"mean {latencies.mean():7.1f} ms | "
+            f"p95 {np.percentile(latencies, 95):7.1f} ms | "
+            f"{1000.0 / latencies.mean():6.1f} fps | "
+            f"one face {one_face / frames:6.1%} | "
+            f"several {multiple_faces / frames:6.1%} | "
+            f"accepted {accepted / frames:6.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
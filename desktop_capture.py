@@ -1,15 +1,16 @@
 from __future__ import annotations
 
 import json
+import math
 import os
 import socket
 import threading
 import time
 import traceback
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional
 
 import cv2
 import numpy as np
@@ -70,6 +71,25 @@ FACE_API_URL = os.getenv(
     "http://127.0.0.1:8001/upload-face",
 ).strip()
 
+
+def default_batch_url(
+    upload_url: str,
+) -> str:
+    base_url = upload_url.split(
+        "/upload-face",
+        1,
+    )[0]
+
+    return f"{base_url}/upload-faces/batch"
+
+
+FACE_API_BATCH_URL = os.getenv(
+    "FACE_API_BATCH_URL",
+    default_batch_url(
+        FACE_API_URL
+    ),
+).strip()
+
 BANK_CODE = os.getenv(
     "BANK_CODE",
     "",
@@ -231,6 +251,61 @@ DETECTION_INTERVAL_FRAMES = max(
     ),
 )
 
+# Width the capture zone is shrunk to before face detection.
+# 0 detects at full camera resolution.
+DETECTION_MAX_WIDTH = max(
+    0,
+    env_int(
+        "DETECTION_MAX_WIDTH",
+        0,
+    ),
+)
+
+# Client-side face detector: haar, yunet or ssd. yunet and ssd
+# load OpenCV DNN models from FACE_DETECTOR_MODEL (and, for ssd,
+# FACE_DETECTOR_CONFIG), by default under models/.
+FACE_DETECTOR = os.getenv(
+    "FACE_DETECTOR",
+    "haar",
+).strip().lower()
+
+FACE_DETECTOR_MODEL = os.getenv(
+    "FACE_DETECTOR_MODEL",
+    "",
+).strip()
+
+FACE_DETECTOR_CONFIG = os.getenv(
+    "FACE_DETECTOR_CONFIG",
+    "",
+).strip()
+
+FACE_DETECTOR_MIN_CONFIDENCE = env_float(
+    "FACE_DETECTOR_MIN_CONFIDENCE",
+    0.8,
+)
+
+# Follow the face between detections: template, kcf, csrt,
+# mosse or none. kcf, csrt and mosse need opencv-contrib-python.
+FACE_TRACKER = os.getenv(
+    "FACE_TRACKER",
+    "template",
+).strip().lower()
+
+# Processed frames the tracker may follow the face before a full
+# detection confirms it.
+TRACKING_REDETECT_FRAMES = max(
+    1,
+    env_int(
+        "TRACKING_REDETECT_FRAMES",
+        10,
+    ),
+)
+
+TRACKING_MIN_SCORE = env_float(
+    "TRACKING_MIN_SCORE",
+    0.6,
+)
+
 FACE_ABSENCE_RESET_SECONDS = env_float(
     "FACE_ABSENCE_RESET_SECONDS",
     1.8,
@@ -264,6 +339,16 @@ MAX_OFFLINE_QUEUE_FILES = max(
     ),
 )
 
+# Queued images sent per batch request when a PC reconnects.
+# 1 sends them one at a time through FACE_API_URL.
+OFFLINE_BATCH_SIZE = max(
+    1,
+    env_int(
+        "OFFLINE_BATCH_SIZE",
+        20,
+    ),
+)
+
 OFFLINE_QUEUE_LOCK = threading.Lock()
 QUEUE_RETRY_LOCK = threading.Lock()
 
@@ -292,6 +377,13 @@ if FACE_CASCADE.empty():
         "OpenCV could not load the frontal-face detector."
     )
 
+# Smallest face, in detection pixels, that downscaling may leave.
+# The frontal-face cascade's window is 24x24, and it starts missing
+# faces well before they get that small.
+MIN_DETECTION_FACE_PIXELS = 48
+
+DETECTION_SCALE_FACTOR = 1.1
+
 
 @dataclass
 class Quality:
@@ -309,6 +401,28 @@ class Candidate:
     frame: np.ndarray
     face_crop: np.ndarray
     quality: Quality
+    crop_face_box: Optional[Box] = None
+
+
+WAITING_MESSAGE = (
+    "Waiting for one customer inside the "
+    "capture zone"
+)
+
+
+@dataclass
+class CaptureStatus:
+    """
+    What the detection thread last saw, for the preview to draw.
+    """
+    roi: Optional[Box] = None
+    faces: list[Box] = field(
+        default_factory=list
+    )
+    quality: Optional[Quality] = None
+    message: str = WAITING_MESSAGE
+    stable_count: int = 0
+    waiting_for_departure: bool = False
 
 
 # -----------------------------------------------------------------------------
@@ -362,6 +476,10 @@ def validate_settings() -> None:
             "between 0 and 1."
         )
 
+    get_face_detector()
+
+    create_face_tracker()
+
 
 def open_camera() -> cv2.VideoCapture:
     capture = cv2.VideoCapture(
@@ -411,6 +529,121 @@ def open_camera() -> cv2.VideoCapture:
     return capture
 
 
+class FrameGrabber:
+    """
+    Read camera frames on a dedicated thread and keep only the
+    newest one.
+
+    Many webcam drivers ignore CAP_PROP_BUFFERSIZE=1 and queue
+    frames, so a loop that reads only between detections works on
+    stale frames. Reading continuously into a single slot lets
+    detection and the preview each take the latest frame at their
+    own rate.
+    """
+
+    def __init__(
+        self,
+        camera: cv2.VideoCapture,
+    ):
+        self.camera = camera
+
+        self._condition = threading.Condition()
+        self._frame: Optional[np.ndarray] = None
+        self._sequence = 0
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "FrameGrabber":
+        self._thread = threading.Thread(
+            target=self._run,
+            name="frame-grabber",
+            daemon=True,
+        )
+
+        self._thread.start()
+
+        return self
+
+    def stop(self) -> None:
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+        if self._thread is not None:
+            # The camera is released after this returns, so wait
+            # for a read in progress to finish.
+            self._thread.join(
+                timeout=5.0
+            )
+
+    def _run(self) -> None:
+        while not self._stopped:
+            try:
+                ok, frame = self.camera.read()
+
+            except Exception:
+                print(
+                    "Unexpected camera read failure; "
+                    "continuing after a short delay:"
+                )
+
+                traceback.print_exc()
+
+                time.sleep(
+                    1.0
+                )
+
+                continue
+
+            if not ok or frame is None:
+                time.sleep(
+                    0.1
+                )
+
+                continue
+
+            with self._condition:
+                self._frame = frame
+                self._sequence += 1
+                self._condition.notify_all()
+
+    def latest(
+        self,
+        after: int = 0,
+        timeout: float = 1.0,
+    ) -> tuple[
+        int,
+        Optional[np.ndarray],
+    ]:
+        """
+        Wait until a frame newer than sequence number after exists
+        and return (sequence, frame).
+
+        The frame is None when none arrived within timeout or the
+        grabber was stopped. Frames are never modified once
+        published, so callers may keep them.
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: (
+                    self._sequence > after
+                    or self._stopped
+                ),
+                timeout,
+            )
+
+            if self._sequence <= after:
+                return (
+                    self._sequence,
+                    None,
+                )
+
+            return (
+                self._sequence,
+                self._frame,
+            )
+
+
 def get_roi(
     frame: np.ndarray,
 ) -> Box:
@@ -464,173 +697,951 @@ def get_roi(
     )
 
 
-def detect_faces(
-    frame: np.ndarray,
-) -> tuple[
-    list[Box],
-    Box,
-]:
-    rx, ry, rw, rh = get_roi(
-        frame
-    )
-
-    region = frame[
-        ry:ry + rh,
-        rx:rx + rw,
-    ]
+class HaarFaceDetector:
+    """
+    OpenCV's frontal-face Haar cascade on an equalised grey image.
+    """
 
-    gray = cv2.cvtColor(
-        region,
-        cv2.COLOR_BGR2GRAY,
-    )
+    name = "haar"
 
-    gray = cv2.equalizeHist(
-        gray
-    )
+    def detect(
+        self,
+        image: np.ndarray,
+        minimum_size: int,
+    ) -> list[
+        tuple[
+            Box,
+            Optional[np.ndarray],
+        ]
+    ]:
+        gray = cv2.equalizeHist(
+            cv2.cvtColor(
+                image,
+                cv2.COLOR_BGR2GRAY,
+            )
+        )
 
-    minimum = max(
-        80,
-        min(
-            MIN_FACE_WIDTH_PIXELS,
-            int(
-                rw * 0.18
+        found = FACE_CASCADE.detectMultiScale(
+            gray,
+            scaleFactor=DETECTION_SCALE_FACTOR,
+            minNeighbors=6,
+            minSize=(
+                minimum_size,
+                minimum_size,
             ),
-        ),
-    )
+            flags=cv2.CASCADE_SCALE_IMAGE,
+        )
 
-    found = FACE_CASCADE.detectMultiScale(
-        gray,
-        scaleFactor=1.1,
-        minNeighbors=6,
-        minSize=(
-            minimum,
-            minimum,
-        ),
-        flags=cv2.CASCADE_SCALE_IMAGE,
-    )
+        return [
+            (
+                (
+                    int(x),
+                    int(y),
+                    int(width),
+                    int(height),
+                ),
+                None,
+            )
+            for x, y, width, height in found
+        ]
 
-    faces: list[Box] = []
 
-    for x, y, width, height in found:
-        if (
-            width < MIN_FACE_WIDTH_PIXELS
-            or height < MIN_FACE_HEIGHT_PIXELS
-        ):
-            continue
+class YuNetFaceDetector:
+    """
+    OpenCV's YuNet CNN detector (cv2.FaceDetectorYN).
 
-        area_ratio = (
-            width * height
-        ) / float(
-            max(
-                rw * rh,
-                1,
-            )
+    Returns five landmarks per face: right eye, left eye, nose tip,
+    right and left mouth corner.
+    """
+
+    name = "yunet"
+
+    def __init__(
+        self,
+        model_path: Path,
+    ):
+        create = getattr(
+            getattr(
+                cv2,
+                "FaceDetectorYN",
+                None,
+            ),
+            "create",
+            None,
+        ) or getattr(
+            cv2,
+            "FaceDetectorYN_create",
+            None,
         )
 
-        if area_ratio < MIN_FACE_AREA_RATIO:
-            continue
+        if create is None:
+            raise RuntimeError(
+                "FACE_DETECTOR=yunet needs OpenCV 4.5.4 or newer."
+            )
 
-        faces.append(
+        self._detector = create(
+            str(model_path),
+            "",
             (
-                rx + int(x),
-                ry + int(y),
-                int(width),
-                int(height),
-            )
+                320,
+                320,
+            ),
+            FACE_DETECTOR_MIN_CONFIDENCE,
+            0.3,
+            5000,
         )
 
-    faces.sort(
-        key=lambda box: (
-            box[2] * box[3]
-        ),
-        reverse=True,
-    )
+        self._input_size: Optional[tuple[int, int]] = None
 
-    return (
-        faces,
-        (
-            rx,
-            ry,
-            rw,
-            rh,
-        ),
-    )
+    def detect(
+        self,
+        image: np.ndarray,
+        minimum_size: int,
+    ) -> list[
+        tuple[
+            Box,
+            Optional[np.ndarray],
+        ]
+    ]:
+        input_size = (
+            image.shape[1],
+            image.shape[0],
+        )
 
+        if input_size != self._input_size:
+            self._detector.setInputSize(
+                input_size
+            )
 
-def iou(
-    first: Box,
-    second: Box,
-) -> float:
-    ax, ay, aw, ah = first
-    bx, by, bw, bh = second
+            self._input_size = input_size
 
-    left = max(
-        ax,
-        bx,
-    )
+        _, found = self._detector.detect(
+            image
+        )
 
-    top = max(
-        ay,
-        by,
-    )
+        if found is None:
+            return []
 
-    right = min(
-        ax + aw,
-        bx + bw,
-    )
+        return [
+            (
+                (
+                    int(row[0]),
+                    int(row[1]),
+                    int(row[2]),
+                    int(row[3]),
+                ),
+                row[4:14].reshape(
+                    5,
+                    2,
+                ).astype(
+                    np.float32
+                ),
+            )
+            for row in found
+            if min(
+                row[2],
+                row[3],
+            )
+            >= minimum_size
+        ]
 
-    bottom = min(
-        ay + ah,
-        by + bh,
-    )
 
-    intersection = (
-        max(
-            0,
-            right - left,
+class SsdFaceDetector:
+    """
+    The res10 300x300 SSD face detector from OpenCV's samples,
+    run through cv2.dnn.
+    """
+
+    name = "ssd"
+
+    def __init__(
+        self,
+        model_path: Path,
+        config_path: Path,
+    ):
+        self._net = cv2.dnn.readNetFromCaffe(
+            str(config_path),
+            str(model_path),
         )
-        * max(
-            0,
-            bottom - top,
+
+    def detect(
+        self,
+        image: np.ndarray,
+        minimum_size: int,
+    ) -> list[
+        tuple[
+            Box,
+            Optional[np.ndarray],
+        ]
+    ]:
+        height, width = image.shape[:2]
+
+        self._net.setInput(
+            cv2.dnn.blobFromImage(
+                image,
+                1.0,
+                (
+                    300,
+                    300,
+                ),
+                (
+                    104.0,
+                    177.0,
+                    123.0,
+                ),
+            )
         )
-    )
 
-    union = (
-        aw * ah
-        + bw * bh
-        - intersection
-    )
+        faces = []
 
-    return (
-        intersection / union
-        if union > 0
-        else 0.0
-    )
+        for detection in self._net.forward()[0, 0]:
+            if detection[2] < FACE_DETECTOR_MIN_CONFIDENCE:
+                continue
 
+            x1 = int(
+                max(
+                    0.0,
+                    detection[3],
+                )
+                * width
+            )
 
-def face_crop_with_margin(
-    frame: np.ndarray,
-    box: Box,
-) -> np.ndarray:
-    x, y, width, height = box
+            y1 = int(
+                max(
+                    0.0,
+                    detection[4],
+                )
+                * height
+            )
 
-    frame_height, frame_width = (
-        frame.shape[:2]
-    )
+            x2 = int(
+                min(
+                    1.0,
+                    detection[5],
+                )
+                * width
+            )
 
-    x1 = max(
-        0,
-        x - int(
-            width * 0.28
-        ),
-    )
+            y2 = int(
+                min(
+                    1.0,
+                    detection[6],
+                )
+                * height
+            )
 
-    y1 = max(
-        0,
-        y - int(
-            height * 0.38
-        ),
-    )
+            if min(
+                x2 - x1,
+                y2 - y1,
+            ) < minimum_size:
+                continue
+
+            faces.append(
+                (
+                    (
+                        x1,
+                        y1,
+                        x2 - x1,
+                        y2 - y1,
+                    ),
+                    None,
+                )
+            )
+
+        return faces
+
+
+# Model and config file names under models/ for each DNN detector.
+DEFAULT_DETECTOR_FILES = {
+    "yunet": (
+        "face_detection_yunet_2023mar.onnx",
+        "",
+    ),
+    "ssd": (
+        "res10_300x300_ssd_iter_140000.caffemodel",
+        "deploy.prototxt",
+    ),
+}
+
+
+def detector_file(
+    configured: str,
+    default_name: str,
+) -> Path:
+    path = Path(
+        configured
+        or Path(
+            "models"
+        )
+        / default_name
+    )
+
+    if not path.is_absolute():
+        path = ROOT / path
+
+    if not path.is_file():
+        raise RuntimeError(
+            f"The face detector file {path} does not exist. "
+            "Download it or set FACE_DETECTOR_MODEL and "
+            "FACE_DETECTOR_CONFIG."
+        )
+
+    return path
+
+
+def create_face_detector(
+    name: str = FACE_DETECTOR,
+):
+    """
+    Return a detector for name (haar, yunet or ssd).
+
+    FACE_DETECTOR_MODEL and FACE_DETECTOR_CONFIG override the model
+    files of the configured detector only.
+    """
+    if name == "haar":
+        return HaarFaceDetector()
+
+    if name not in DEFAULT_DETECTOR_FILES:
+        raise RuntimeError(
+            f"Unknown FACE_DETECTOR {name!r}. Use one of: "
+            "haar, yunet, ssd."
+        )
+
+    (
+        model_name,
+        config_name,
+    ) = DEFAULT_DETECTOR_FILES[name]
+
+    configured = (
+        name == FACE_DETECTOR
+    )
+
+    model_path = detector_file(
+        FACE_DETECTOR_MODEL if configured else "",
+        model_name,
+    )
+
+    if name == "yunet":
+        return YuNetFaceDetector(
+            model_path
+        )
+
+    return SsdFaceDetector(
+        model_path,
+        detector_file(
+            FACE_DETECTOR_CONFIG if configured else "",
+            config_name,
+        ),
+    )
+
+
+_FACE_DETECTOR = None
+
+
+def get_face_detector():
+    """
+    Return the FACE_DETECTOR detector, loading it on first use.
+    """
+    global _FACE_DETECTOR
+
+    if _FACE_DETECTOR is None:
+        _FACE_DETECTOR = create_face_detector()
+
+    return _FACE_DETECTOR
+
+
+def smallest_face_size(
+    roi_width: int,
+    roi_height: int,
+) -> int:
+    """
+    Return the side, in frame pixels, of the smallest square face
+    box the size and area gates can accept, less one cascade scale
+    step so borderline faces are still found.
+
+    Starting the cascade's pyramid here skips every scale whose
+    faces would be discarded anyway.
+    """
+    smallest = max(
+        MIN_FACE_WIDTH_PIXELS,
+        MIN_FACE_HEIGHT_PIXELS,
+        math.ceil(
+            math.sqrt(
+                MIN_FACE_AREA_RATIO
+                * roi_width
+                * roi_height
+            )
+        ),
+    )
+
+    return max(
+        1,
+        min(
+            int(
+                smallest / DETECTION_SCALE_FACTOR
+            ),
+            roi_width,
+            roi_height,
+        ),
+    )
+
+
+def detection_scale(
+    roi_width: int,
+    minimum_face: int,
+) -> float:
+    """
+    Return the factor the capture zone is resized by for detection.
+
+    The zone is shrunk to DETECTION_MAX_WIDTH, but never so far that
+    the smallest acceptable face falls below
+    MIN_DETECTION_FACE_PIXELS.
+    """
+    if (
+        not DETECTION_MAX_WIDTH
+        or roi_width <= DETECTION_MAX_WIDTH
+    ):
+        return 1.0
+
+    return min(
+        1.0,
+        max(
+            DETECTION_MAX_WIDTH / roi_width,
+            MIN_DETECTION_FACE_PIXELS / max(
+                minimum_face,
+                1,
+            ),
+        ),
+    )
+
+
+def detect_faces(
+    frame: np.ndarray,
+    detector=None,
+) -> tuple[
+    list[Box],
+    Box,
+    list[Optional[np.ndarray]],
+]:
+    """
+    Return the faces inside the capture zone, largest first, in
+    full-frame coordinates, together with the zone and each face's
+    landmarks (None when the detector has none).
+
+    The detector, FACE_DETECTOR unless one is given, runs on the
+    zone shrunk to DETECTION_MAX_WIDTH and ignores faces below the
+    smallest acceptable size. Only the quality check and the upload
+    crop read full-resolution pixels.
+    """
+    if detector is None:
+        detector = get_face_detector()
+
+    rx, ry, rw, rh = get_roi(
+        frame
+    )
+
+    region = frame[
+        ry:ry + rh,
+        rx:rx + rw,
+    ]
+
+    minimum = smallest_face_size(
+        rw,
+        rh,
+    )
+
+    scale = detection_scale(
+        rw,
+        minimum,
+    )
+
+    if scale < 1.0:
+        region = cv2.resize(
+            region,
+            (
+                max(
+                    1,
+                    int(
+                        rw * scale
+                    ),
+                ),
+                max(
+                    1,
+                    int(
+                        rh * scale
+                    ),
+                ),
+            ),
+            interpolation=cv2.INTER_AREA,
+        )
+
+    found = detector.detect(
+        region,
+        max(
+            1,
+            int(
+                minimum * scale
+            ),
+        ),
+    )
+
+    detections: list[
+        tuple[
+            Box,
+            Optional[np.ndarray],
+        ]
+    ] = []
+
+    for (x, y, width, height), landmarks in found:
+        x = max(
+            0,
+            int(
+                round(
+                    x / scale
+                )
+            ),
+        )
+
+        y = max(
+            0,
+            int(
+                round(
+                    y / scale
+                )
+            ),
+        )
+
+        width = int(
+            round(
+                width / scale
+            )
+        )
+
+        height = int(
+            round(
+                height / scale
+            )
+        )
+
+        if (
+            width < MIN_FACE_WIDTH_PIXELS
+            or height < MIN_FACE_HEIGHT_PIXELS
+        ):
+            continue
+
+        area_ratio = (
+            width * height
+        ) / float(
+            max(
+                rw * rh,
+                1,
+            )
+        )
+
+        if area_ratio < MIN_FACE_AREA_RATIO:
+            continue
+
+        if landmarks is not None:
+            landmarks = (
+                landmarks / scale
+                + np.array(
+                    [
+                        rx,
+                        ry,
+                    ],
+                    dtype=np.float32,
+                )
+            )
+
+        detections.append(
+            (
+                (
+                    rx + x,
+                    ry + y,
+                    min(
+                        width,
+                        rw - x,
+                    ),
+                    min(
+                        height,
+                        rh - y,
+                    ),
+                ),
+                landmarks,
+            )
+        )
+
+    detections.sort(
+        key=lambda detection: (
+            detection[0][2] * detection[0][3]
+        ),
+        reverse=True,
+    )
+
+    return (
+        [
+            box
+            for box, _ in detections
+        ],
+        (
+            rx,
+            ry,
+            rw,
+            rh,
+        ),
+        [
+            landmarks
+            for _, landmarks in detections
+        ],
+    )
+
+
+def iou(
+    first: Box,
+    second: Box,
+) -> float:
+    ax, ay, aw, ah = first
+    bx, by, bw, bh = second
+
+    left = max(
+        ax,
+        bx,
+    )
+
+    top = max(
+        ay,
+        by,
+    )
+
+    right = min(
+        ax + aw,
+        bx + bw,
+    )
+
+    bottom = min(
+        ay + ah,
+        by + bh,
+    )
+
+    intersection = (
+        max(
+            0,
+            right - left,
+        )
+        * max(
+            0,
+            bottom - top,
+        )
+    )
+
+    union = (
+        aw * ah
+        + bw * bh
+        - intersection
+    )
+
+    return (
+        intersection / union
+        if union > 0
+        else 0.0
+    )
+
+
+# Width, in pixels, face templates are shrunk to for matching.
+TEMPLATE_TRACKER_WIDTH = 48
+
+# Share of the face size searched around the last position.
+TEMPLATE_TRACKER_SEARCH_MARGIN = 0.5
+
+
+class TemplateTracker:
+    """
+    Follow a face box by matching the detected face against a
+    window around its last position.
+
+    Both are shrunk so the face is TEMPLATE_TRACKER_WIDTH pixels
+    wide, which keeps a match well under a millisecond. The template
+    is only taken at detection, so it cannot drift; the box keeps
+    its detected size until the next detection.
+    """
+
+    def __init__(self):
+        self._box: Optional[Box] = None
+        self._template: Optional[np.ndarray] = None
+        self._scale = 1.0
+
+    def _shrink(
+        self,
+        image: np.ndarray,
+    ) -> np.ndarray:
+        if self._scale < 1.0:
+            image = cv2.resize(
+                image,
+                None,
+                fx=self._scale,
+                fy=self._scale,
+                interpolation=cv2.INTER_AREA,
+            )
+
+        return cv2.cvtColor(
+            image,
+            cv2.COLOR_BGR2GRAY,
+        )
+
+    def init(
+        self,
+        frame: np.ndarray,
+        box: Box,
+    ) -> None:
+        x, y, width, height = box
+
+        self._box = box
+
+        self._scale = min(
+            1.0,
+            TEMPLATE_TRACKER_WIDTH / max(
+                width,
+                1,
+            ),
+        )
+
+        self._template = self._shrink(
+            frame[
+                y:y + height,
+                x:x + width,
+            ]
+        )
+
+    def update(
+        self,
+        frame: np.ndarray,
+    ) -> Optional[Box]:
+        if self._box is None or self._template is None:
+            return None
+
+        x, y, width, height = self._box
+
+        frame_height, frame_width = (
+            frame.shape[:2]
+        )
+
+        x1 = max(
+            0,
+            x - int(
+                width * TEMPLATE_TRACKER_SEARCH_MARGIN
+            ),
+        )
+
+        y1 = max(
+            0,
+            y - int(
+                height * TEMPLATE_TRACKER_SEARCH_MARGIN
+            ),
+        )
+
+        x2 = min(
+            frame_width,
+            x
+            + width
+            + int(
+                width * TEMPLATE_TRACKER_SEARCH_MARGIN
+            ),
+        )
+
+        y2 = min(
+            frame_height,
+            y
+            + height
+            + int(
+                height * TEMPLATE_TRACKER_SEARCH_MARGIN
+            ),
+        )
+
+        search = self._shrink(
+            frame[
+                y1:y2,
+                x1:x2,
+            ]
+        )
+
+        if (
+            search.shape[0] < self._template.shape[0]
+            or search.shape[1] < self._template.shape[1]
+        ):
+            return None
+
+        _, score, _, (match_x, match_y) = cv2.minMaxLoc(
+            cv2.matchTemplate(
+                search,
+                self._template,
+                cv2.TM_CCOEFF_NORMED,
+            )
+        )
+
+        if score < TRACKING_MIN_SCORE:
+            return None
+
+        self._box = (
+            x1 + int(
+                round(
+                    match_x / self._scale
+                )
+            ),
+            y1 + int(
+                round(
+                    match_y / self._scale
+                )
+            ),
+            width,
+            height,
+        )
+
+        return self._box
+
+
+class OpenCVTracker:
+    """
+    Adapter for OpenCV's KCF, CSRT and MOSSE trackers.
+    """
+
+    def __init__(
+        self,
+        create: Callable,
+    ):
+        self._create = create
+        self._tracker = None
+
+    def init(
+        self,
+        frame: np.ndarray,
+        box: Box,
+    ) -> None:
+        self._tracker = self._create()
+
+        self._tracker.init(
+            frame,
+            tuple(
+                int(value)
+                for value in box
+            ),
+        )
+
+    def update(
+        self,
+        frame: np.ndarray,
+    ) -> Optional[Box]:
+        if self._tracker is None:
+            return None
+
+        ok, box = self._tracker.update(
+            frame
+        )
+
+        if not ok:
+            return None
+
+        return tuple(
+            int(
+                round(value)
+            )
+            for value in box
+        )
+
+
+# FACE_TRACKER values served by OpenCV's contrib trackers.
+OPENCV_TRACKERS = {
+    "kcf": "KCF",
+    "csrt": "CSRT",
+    "mosse": "MOSSE",
+}
+
+
+def create_face_tracker():
+    """
+    Return a new tracker for FACE_TRACKER, or None when tracking is
+    off.
+    """
+    if FACE_TRACKER == "none":
+        return None
+
+    if FACE_TRACKER == "template":
+        return TemplateTracker()
+
+    tracker_name = OPENCV_TRACKERS.get(
+        FACE_TRACKER
+    )
+
+    if tracker_name is None:
+        raise RuntimeError(
+            f"Unknown FACE_TRACKER {FACE_TRACKER!r}. Use one of: "
+            "template, kcf, csrt, mosse, none."
+        )
+
+    for module in (
+        cv2,
+        getattr(
+            cv2,
+            "legacy",
+            None,
+        ),
+    ):
+        create = getattr(
+            module,
+            f"Tracker{tracker_name}_create",
+            None,
+        )
+
+        if create is not None:
+            return OpenCVTracker(
+                create
+            )
+
+    raise RuntimeError(
+        f"FACE_TRACKER={FACE_TRACKER} needs OpenCV's contrib "
+        "trackers. Run: python -m pip install "
+        "opencv-contrib-python, or use FACE_TRACKER=template."
+    )
+
+
+def box_centre_in_roi(
+    box: Box,
+    roi: Box,
+) -> bool:
+    x, y, width, height = box
+    rx, ry, rw, rh = roi
+
+    return (
+        rx <= x + width / 2 < rx + rw
+        and ry <= y + height / 2 < ry + rh
+    )
+
+
+def face_crop_bounds(
+    frame: np.ndarray,
+    box: Box,
+) -> Box:
+    """
+    Return the (x1, y1, x2, y2) region uploaded for a face box.
+    """
+    x, y, width, height = box
+
+    frame_height, frame_width = (
+        frame.shape[:2]
+    )
+
+    x1 = max(
+        0,
+        x - int(
+            width * 0.28
+        ),
+    )
+
+    y1 = max(
+        0,
+        y - int(
+            height * 0.38
+        ),
+    )
 
     x2 = min(
         frame_width,
@@ -650,17 +1661,279 @@ def face_crop_with_margin(
         ),
     )
 
+    return (
+        x1,
+        y1,
+        x2,
+        y2,
+    )
+
+
+def face_crop_with_margin(
+    frame: np.ndarray,
+    box: Box,
+) -> np.ndarray:
+    x1, y1, x2, y2 = face_crop_bounds(
+        frame,
+        box,
+    )
+
     return frame[
         y1:y2,
         x1:x2,
     ].copy()
 
 
+def face_box_in_crop(
+    frame: np.ndarray,
+    box: Box,
+) -> Box:
+    """
+    Translate a face box from frame to face-crop coordinates.
+    """
+    x, y, width, height = box
+
+    x1, y1, _, _ = face_crop_bounds(
+        frame,
+        box,
+    )
+
+    return (
+        x - x1,
+        y - y1,
+        width,
+        height,
+    )
+
+
+# Grey levels counted as dark and bright facial pixels.
+DARK_PIXEL_LEVEL = 35
+BRIGHT_PIXEL_LEVEL = 235
+
+# Share of the face box height, from the top, searched for eyes.
+EYE_BAND_BOTTOM = 0.62
+
+GREY_LEVELS = np.arange(
+    256,
+    dtype=np.float64,
+)
+
+
+class QualityEngine:
+    """
+    The per-pixel work of inspect_quality on reusable buffers.
+
+    The grey face and its Laplacian are written into flat buffers
+    that only grow, viewed at each box's size, so scoring a face
+    allocates no image-sized arrays. Brightness and the dark and
+    bright shares come from one 256-bin histogram. Blur is the
+    variance of a 16-bit Laplacian, which equals the old float64
+    one because an 8-bit Laplacian always fits in 16 bits.
+
+    Buffers are reused between calls, so each thread needs its own
+    engine; use quality_engine().
+    """
+
+    def __init__(self):
+        self._gray = np.empty(
+            0,
+            dtype=np.uint8,
+        )
+
+        self._laplacian = np.empty(
+            0,
+            dtype=np.int16,
+        )
+
+        self._histogram = np.empty(
+            (
+                256,
+                1,
+            ),
+            dtype=np.float32,
+        )
+
+    def _views(
+        self,
+        height: int,
+        width: int,
+    ) -> tuple[
+        np.ndarray,
+        np.ndarray,
+    ]:
+        size = height * width
+
+        if self._gray.size < size:
+            self._gray = np.empty(
+                size,
+                dtype=np.uint8,
+            )
+
+            self._laplacian = np.empty(
+                size,
+                dtype=np.int16,
+            )
+
+        return (
+            self._gray[:size].reshape(
+                height,
+                width,
+            ),
+            self._laplacian[:size].reshape(
+                height,
+                width,
+            ),
+        )
+
+    def measure(
+        self,
+        face: np.ndarray,
+    ) -> tuple[
+        np.ndarray,
+        float,
+        float,
+        float,
+        float,
+    ]:
+        """
+        Return (gray, blur, brightness, dark_percent,
+        bright_percent) for a BGR face. gray is only valid until the
+        next call.
+        """
+        gray, laplacian = self._views(
+            *face.shape[:2]
+        )
+
+        cv2.cvtColor(
+            face,
+            cv2.COLOR_BGR2GRAY,
+            dst=gray,
+        )
+
+        cv2.Laplacian(
+            gray,
+            cv2.CV_16S,
+            dst=laplacian,
+        )
+
+        _, deviation = cv2.meanStdDev(
+            laplacian
+        )
+
+        cv2.calcHist(
+            [
+                gray,
+            ],
+            [
+                0,
+            ],
+            None,
+            [
+                256,
+            ],
+            [
+                0,
+                256,
+            ],
+            hist=self._histogram,
+        )
+
+        counts = self._histogram[:, 0]
+        pixel_count = float(
+            gray.size
+        )
+
+        return (
+            gray,
+            float(
+                deviation[0, 0]
+            )
+            ** 2,
+            float(
+                counts @ GREY_LEVELS
+            )
+            / pixel_count,
+            float(
+                counts[:DARK_PIXEL_LEVEL].sum()
+            )
+            / pixel_count,
+            float(
+                counts[BRIGHT_PIXEL_LEVEL + 1:].sum()
+            )
+            / pixel_count,
+        )
+
+
+_QUALITY_ENGINES = threading.local()
+
+
+def quality_engine() -> QualityEngine:
+    """
+    Return this thread's QualityEngine.
+    """
+    engine = getattr(
+        _QUALITY_ENGINES,
+        "engine",
+        None,
+    )
+
+    if engine is None:
+        engine = QualityEngine()
+        _QUALITY_ENGINES.engine = engine
+
+    return engine
+
+
+def count_eyes(
+    gray: np.ndarray,
+    height: int,
+) -> int:
+    """
+    Count up to two eyes in the upper part of a grey face.
+    """
+    if EYE_CASCADE.empty():
+        return 0
+
+    upper_face = gray[
+        :max(
+            1,
+            int(
+                height * EYE_BAND_BOTTOM
+            ),
+        ),
+        :,
+    ]
+
+    eyes = EYE_CASCADE.detectMultiScale(
+        upper_face,
+        scaleFactor=1.1,
+        minNeighbors=5,
+        minSize=(
+            18,
+            18,
+        ),
+    )
+
+    return min(
+        len(eyes),
+        2,
+    )
+
+
 def inspect_quality(
     frame: np.ndarray,
     face_box: Box,
     roi: Box,
+    landmarks: Optional[np.ndarray] = None,
 ) -> Quality:
+    """
+    Score a face for upload. Eye landmarks from the detector, when
+    given, replace the eye cascade.
+
+    The eye cascade costs far more than every other check together,
+    so it only runs for faces that pass the blur and exposure gates.
+    Faces rejected before it score as if no eyes were found.
+    """
     x, y, width, height = (
         face_box
     )
@@ -688,34 +1961,14 @@ def inspect_quality(
             "Invalid face crop",
         )
 
-    gray = cv2.cvtColor(
-        face,
-        cv2.COLOR_BGR2GRAY,
-    )
-
-    blur = float(
-        cv2.Laplacian(
-            gray,
-            cv2.CV_64F,
-        ).var()
-    )
-
-    brightness = float(
-        np.mean(
-            gray
-        )
-    )
-
-    dark_percent = float(
-        np.mean(
-            gray < 35
-        )
-    )
-
-    bright_percent = float(
-        np.mean(
-            gray > 235
-        )
+    (
+        gray,
+        blur,
+        brightness,
+        dark_percent,
+        bright_percent,
+    ) = quality_engine().measure(
+        face
     )
 
     area_ratio = (
@@ -727,34 +1980,6 @@ def inspect_quality(
         )
     )
 
-    eye_count = 0
-
-    if not EYE_CASCADE.empty():
-        upper_face = gray[
-            :max(
-                1,
-                int(
-                    height * 0.62
-                ),
-            ),
-            :,
-        ]
-
-        eyes = EYE_CASCADE.detectMultiScale(
-            upper_face,
-            scaleFactor=1.1,
-            minNeighbors=5,
-            minSize=(
-                18,
-                18,
-            ),
-        )
-
-        eye_count = min(
-            len(eyes),
-            2,
-        )
-
     reason = ""
 
     if blur < BLUR_THRESHOLD:
@@ -784,6 +2009,24 @@ def inspect_quality(
             "Too much glare or overexposure"
         )
 
+    eye_count = 0
+
+    if landmarks is not None:
+        eye_count = sum(
+            1
+            for eye_x, eye_y in landmarks[:2]
+            if (
+                x <= eye_x < x + width
+                and y <= eye_y < y + height * EYE_BAND_BOTTOM
+            )
+        )
+
+    elif not reason:
+        eye_count = count_eyes(
+            gray,
+            height,
+        )
+
     blur_score = min(
         blur
         / max(
@@ -894,14 +2137,40 @@ def api_error(
         )
 
 
+def format_face_box(
+    face_box: Optional[Box],
+) -> str:
+    if face_box is None:
+        return ""
+
+    return ",".join(
+        str(int(value))
+        for value in face_box
+    )
+
+
 def send_to_api(
     image_bytes: bytes,
     filename: str,
+    face_box: Optional[Box] = None,
 ) -> tuple[
     str,
     str,
     Optional[dict],
 ]:
+    """
+    Upload one image. face_box, the face within a face crop, lets
+    the API skip its own face detection.
+    """
+    data = {
+        "pc_name": PC_NAME,
+    }
+
+    if face_box is not None:
+        data["face_box"] = format_face_box(
+            face_box
+        )
+
     try:
         response = requests.post(
             FACE_API_URL,
@@ -916,9 +2185,7 @@ def send_to_api(
                     "image/jpeg",
                 )
             },
-            data={
-                "pc_name": PC_NAME
-            },
+            data=data,
             timeout=REQUEST_TIMEOUT_SECONDS,
         )
 
@@ -973,6 +2240,129 @@ def send_to_api(
     )
 
 
+def send_batch_to_api(
+    items: list[
+        tuple[
+            str,
+            bytes,
+            str,
+            Optional[Box],
+        ]
+    ],
+) -> tuple[
+    str,
+    str,
+    Optional[dict],
+]:
+    """
+    Upload (filename, image_bytes, captured_at, face_box) items in
+    one request.
+
+    Returns "unsupported" when the API has no batch endpoint and
+    "too_large" when it refused the request's size.
+    """
+    try:
+        response = requests.post(
+            FACE_API_BATCH_URL,
+            headers={
+                "X-Bank-Code": BANK_CODE,
+                "X-API-Key": BANK_API_KEY,
+            },
+            files=[
+                (
+                    "files",
+                    (
+                        filename,
+                        image_bytes,
+                        "image/jpeg",
+                    ),
+                )
+                for filename, image_bytes, _, _ in items
+            ],
+            data={
+                "pc_name": PC_NAME,
+                "captured_at": [
+                    captured_at
+                    for _, _, captured_at, _ in items
+                ],
+                "face_box": [
+                    format_face_box(
+                        face_box
+                    )
+                    for _, _, _, face_box in items
+                ],
+            },
+            timeout=REQUEST_TIMEOUT_SECONDS,
+        )
+
+    except requests.RequestException as error:
+        return (
+            "retry",
+            str(error),
+            None,
+        )
+
+    if response.status_code in {
+        404,
+        405,
+    }:
+        return (
+            "unsupported",
+            f"HTTP {response.status_code}",
+            None,
+        )
+
+    detail = api_error(
+        response
+    )
+
+    if response.status_code == 413:
+        return (
+            "too_large",
+            detail,
+            None,
+        )
+
+    if (
+        200
+        <= response.status_code
+        < 300
+    ):
+        try:
+            return (
+                "success",
+                detail,
+                response.json(),
+            )
+
+        except ValueError:
+            return (
+                "retry",
+                "The batch response was not valid JSON.",
+                None,
+            )
+
+    if (
+        400
+        <= response.status_code
+        < 500
+    ):
+        return (
+            "reject",
+            detail,
+            None,
+        )
+
+    return (
+        "retry",
+        (
+            f"HTTP {response.status_code}: "
+            f"{detail}"
+        ),
+        None,
+    )
+
+
 def safe_component(
     value: str,
 ) -> str:
@@ -1048,6 +2438,7 @@ def queue_image(
     filename: str,
     error: str,
     quality: Quality,
+    face_box: Optional[Box] = None,
 ) -> None:
     with OFFLINE_QUEUE_LOCK:
         OFFLINE_QUEUE_DIR.mkdir(
@@ -1092,6 +2483,11 @@ def queue_image(
                     "quality_score": (
                         quality.score
                     ),
+                    "face_box": (
+                        list(face_box)
+                        if face_box is not None
+                        else None
+                    ),
                 },
                 indent=2,
             ),
@@ -1160,11 +2556,13 @@ def print_result(
 def upload_candidate(
     candidate: Candidate,
 ) -> None:
-    image = (
-        candidate.face_crop
-        if UPLOAD_FACE_CROP
-        else candidate.frame
-    )
+    if UPLOAD_FACE_CROP:
+        image = candidate.face_crop
+        face_box = candidate.crop_face_box
+
+    else:
+        image = candidate.frame
+        face_box = None
 
     image_bytes = encode_jpeg(
         image
@@ -1179,59 +2577,359 @@ def upload_candidate(
     ) = send_to_api(
         image_bytes,
         filename,
+        face_box,
+    )
+
+    if result_status == "success":
+        print(
+            "Capture uploaded successfully."
+        )
+
+        print_result(
+            payload
+        )
+
+    elif result_status == "retry":
+        print(
+            "The face API could not process the "
+            f"capture: {detail}"
+        )
+
+        queue_image(
+            image_bytes,
+            filename,
+            detail,
+            candidate.quality,
+            face_box,
+        )
+
+    else:
+        print(
+            "UPLOAD REJECTED:"
+        )
+
+        print(
+            detail
+        )
+
+        print(
+            f"Bank: {BANK_CODE} | "
+            f"Windows PC name: {PC_NAME}"
+        )
+
+
+def upload_candidate_worker(
+    candidate: Candidate,
+) -> None:
+    try:
+        upload_candidate(
+            candidate
+        )
+
+    except Exception:
+        print(
+            "Unexpected background upload failure:"
+        )
+
+        traceback.print_exc()
+
+
+def remove_queued_image(
+    image_path: Path,
+) -> None:
+    with OFFLINE_QUEUE_LOCK:
+        image_path.unlink(
+            missing_ok=True
+        )
+
+        image_path.with_suffix(
+            ".json"
+        ).unlink(
+            missing_ok=True
+        )
+
+
+def queued_metadata(
+    image_path: Path,
+) -> tuple[
+    str,
+    Optional[Box],
+]:
+    """
+    Return the capture time and face box saved with a queued image.
+    """
+    try:
+        metadata = json.loads(
+            image_path.with_suffix(
+                ".json"
+            ).read_text(
+                encoding="utf-8"
+            )
+        )
+
+    except (
+        OSError,
+        ValueError,
+    ):
+        metadata = {}
+
+    if not isinstance(
+        metadata,
+        dict,
+    ):
+        metadata = {}
+
+    captured_at = metadata.get(
+        "created_at"
+    )
+
+    if not captured_at:
+        captured_at = datetime.fromtimestamp(
+            image_path.stat().st_mtime,
+            timezone.utc,
+        ).isoformat()
+
+    face_box = metadata.get(
+        "face_box"
+    )
+
+    try:
+        face_box = (
+            tuple(
+                int(value)
+                for value in face_box
+            )
+            if face_box
+            else None
+        )
+
+    except (
+        TypeError,
+        ValueError,
+    ):
+        face_box = None
+
+    if (
+        face_box is not None
+        and len(face_box) != 4
+    ):
+        face_box = None
+
+    return (
+        str(captured_at),
+        face_box,
     )
 
-    if result_status == "success":
-        print(
-            "Capture uploaded successfully."
-        )
 
-        print_result(
-            payload
-        )
+def retry_queued_images_individually(
+    images: list[Path],
+) -> None:
+    for image_path in images:
+        with OFFLINE_QUEUE_LOCK:
+            if not image_path.exists():
+                continue
+
+            image_bytes = (
+                image_path.read_bytes()
+            )
+
+            (
+                _,
+                face_box,
+            ) = queued_metadata(
+                image_path
+            )
+
+        (
+            result_status,
+            detail,
+            payload,
+        ) = send_to_api(
+            image_bytes,
+            image_path.name,
+            face_box,
+        )
+
+        if result_status == "success":
+            remove_queued_image(
+                image_path
+            )
+
+            print(
+                "Queued image uploaded: "
+                f"{image_path.name}"
+            )
+
+            print_result(
+                payload
+            )
+
+        elif result_status == "reject":
+            print(
+                "Queued image rejected and left "
+                "for review: "
+                f"{image_path.name} - {detail}"
+            )
+
+        else:
+            print(
+                "Face API is not ready: "
+                f"{detail}"
+            )
+
+            break
+
+
+def retry_queued_images_in_batches(
+    images: list[Path],
+) -> bool:
+    """
+    Drain the queue through the batch endpoint.
+
+    A batch the API refuses as too large is split in half until it
+    is accepted. Returns False when the API has no batch endpoint,
+    or refuses even single images, so the caller can fall back to
+    one request per image.
+    """
+    batch_size = OFFLINE_BATCH_SIZE
+    start = 0
+
+    while start < len(images):
+        batch = images[
+            start:start + batch_size
+        ]
+
+        items = []
+        item_paths = []
+
+        with OFFLINE_QUEUE_LOCK:
+            for image_path in batch:
+                if not image_path.exists():
+                    continue
+
+                items.append(
+                    (
+                        image_path.name,
+                        image_path.read_bytes(),
+                        *queued_metadata(
+                            image_path
+                        ),
+                    )
+                )
+
+                item_paths.append(
+                    image_path
+                )
+
+        if not items:
+            start += len(batch)
+            continue
+
+        (
+            result_status,
+            detail,
+            payload,
+        ) = send_batch_to_api(
+            items
+        )
+
+        if result_status == "unsupported":
+            return False
+
+        if result_status == "too_large":
+            if len(items) == 1:
+                return False
+
+            batch_size = max(
+                1,
+                len(items) // 2,
+            )
+
+            print(
+                "Queued batch was too large; retrying "
+                f"{batch_size} image(s) at a time."
+            )
+
+            continue
+
+        start += len(batch)
+
+        if result_status == "reject":
+            print(
+                "Queued batch rejected and left "
+                f"for review: {detail}"
+            )
+
+            return True
+
+        if result_status != "success":
+            print(
+                "Face API is not ready: "
+                f"{detail}"
+            )
 
-    elif result_status == "retry":
-        print(
-            "The face API could not process the "
-            f"capture: {detail}"
-        )
+            return True
 
-        queue_image(
-            image_bytes,
-            filename,
-            detail,
-            candidate.quality,
-        )
+        server_failed = False
 
-    else:
-        print(
-            "UPLOAD REJECTED:"
-        )
+        for result in (
+            payload or {}
+        ).get(
+            "results",
+            [],
+        ):
+            try:
+                image_path = item_paths[
+                    int(result["index"])
+                ]
+
+            except (
+                KeyError,
+                IndexError,
+                TypeError,
+                ValueError,
+            ):
+                continue
 
-        print(
-            detail
-        )
+            item_status = result.get(
+                "status"
+            )
 
-        print(
-            f"Bank: {BANK_CODE} | "
-            f"Windows PC name: {PC_NAME}"
-        )
+            if item_status == "processed":
+                remove_queued_image(
+                    image_path
+                )
 
+                print(
+                    "Queued image uploaded: "
+                    f"{image_path.name}"
+                )
 
-def upload_candidate_worker(
-    candidate: Candidate,
-) -> None:
-    try:
-        upload_candidate(
-            candidate
-        )
+                print_result(
+                    result
+                )
 
-    except Exception:
-        print(
-            "Unexpected background upload failure:"
-        )
+            elif item_status == "rejected":
+                print(
+                    "Queued image rejected and left "
+                    "for review: "
+                    f"{image_path.name} - "
+                    f"{result.get('detail')}"
+                )
 
-        traceback.print_exc()
+            else:
+                server_failed = True
+
+                print(
+                    "Queued image could not be processed: "
+                    f"{image_path.name} - "
+                    f"{result.get('detail')}"
+                )
+
+        if server_failed:
+            return True
+
+    return True
 
 
 def retry_offline_queue() -> None:
@@ -1264,59 +2962,17 @@ def retry_offline_queue() -> None:
             "offline image(s)..."
         )
 
-        for image_path in images:
-            with OFFLINE_QUEUE_LOCK:
-                if not image_path.exists():
-                    continue
-
-                image_bytes = (
-                    image_path.read_bytes()
-                )
-
-            (
-                result_status,
-                detail,
-                payload,
-            ) = send_to_api(
-                image_bytes,
-                image_path.name,
+        if (
+            OFFLINE_BATCH_SIZE > 1
+            and retry_queued_images_in_batches(
+                images
             )
+        ):
+            return
 
-            if result_status == "success":
-                with OFFLINE_QUEUE_LOCK:
-                    image_path.unlink(
-                        missing_ok=True
-                    )
-
-                    image_path.with_suffix(
-                        ".json"
-                    ).unlink(
-                        missing_ok=True
-                    )
-
-                print(
-                    "Queued image uploaded: "
-                    f"{image_path.name}"
-                )
-
-                print_result(
-                    payload
-                )
-
-            elif result_status == "reject":
-                print(
-                    "Queued image rejected and left "
-                    "for review: "
-                    f"{image_path.name} - {detail}"
-                )
-
-            else:
-                print(
-                    "Face API is not ready: "
-                    f"{detail}"
-                )
-
-                break
+        retry_queued_images_individually(
+            images
+        )
 
     finally:
         QUEUE_RETRY_LOCK.release()
@@ -1556,10 +3212,36 @@ def build_preview(
 # -----------------------------------------------------------------------------
 
 
-def capture_loop(
-    camera: cv2.VideoCapture,
+def detection_loop(
+    grabber: FrameGrabber,
+    stop_event: threading.Event,
+    publish: Callable[
+        [CaptureStatus],
+        None,
+    ],
 ) -> None:
-    frame_number = 0
+    """
+    Run detection, quality checks and candidate selection on the
+    newest camera frames until stop_event is set.
+
+    Detection takes at most every DETECTION_INTERVAL_FRAMES-th
+    camera frame and skips whatever arrived while it was busy, so a
+    slow pass never delays frame acquisition. The state after each
+    pass is handed to publish for the preview.
+
+    With FACE_TRACKER set, a single face is followed by the tracker
+    and full detection only runs every TRACKING_REDETECT_FRAMES
+    processed frames, or as soon as the track is lost. A detection
+    that overlaps the tracked box continues the track; anything
+    else starts a new one, which resets stability. The tracker
+    cannot see a second face, so a capture only happens on a frame
+    where full detection found the face alone.
+    """
+    tracker = create_face_tracker()
+    tracking = False
+    frames_since_detection = 0
+
+    last_sequence = 0
     last_box: Optional[Box] = None
     stable_count = 0
     stable_started_at: Optional[float] = None
@@ -1568,244 +3250,384 @@ def capture_loop(
     no_face_started_at: Optional[float] = None
     last_capture_at = 0.0
 
-    next_queue_retry = (
-        time.monotonic()
-        + 2.0
-    )
-
-    last_faces: list[Box] = []
-    last_roi: Optional[Box] = None
-    last_quality: Optional[Quality] = None
-
-    message = (
-        "Waiting for one customer inside the "
-        "capture zone"
-    )
+    message = WAITING_MESSAGE
 
-    while True:
+    while not stop_event.is_set():
         try:
-            ok, frame = camera.read()
-
-            if not ok or frame is None:
-                time.sleep(
-                    0.1
-                )
+            (
+                sequence,
+                frame,
+            ) = grabber.latest(
+                after=(
+                    last_sequence
+                    + DETECTION_INTERVAL_FRAMES
+                    - 1
+                ),
+            )
 
+            if frame is None:
                 continue
 
+            last_sequence = sequence
             now = time.monotonic()
-            frame_number += 1
-
-            if now >= next_queue_retry:
-                start_offline_queue_retry()
 
-                next_queue_retry = (
-                    now
-                    + QUEUE_RETRY_INTERVAL_SECONDS
-                )
+            faces: Optional[list[Box]] = None
+            landmarks: list[Optional[np.ndarray]] = []
+            detected = False
 
             if (
-                frame_number
-                % DETECTION_INTERVAL_FRAMES
-                == 0
+                tracking
+                and frames_since_detection
+                < TRACKING_REDETECT_FRAMES
             ):
-                faces, roi = detect_faces(
+                roi = get_roi(
+                    frame
+                )
+
+                tracked_box = tracker.update(
+                    frame
+                )
+
+                if (
+                    tracked_box is not None
+                    and box_centre_in_roi(
+                        tracked_box,
+                        roi,
+                    )
+                ):
+                    faces = [
+                        tracked_box,
+                    ]
+
+                    landmarks = [
+                        None,
+                    ]
+
+                    frames_since_detection += 1
+
+            if faces is None:
+                faces, roi, landmarks = detect_faces(
                     frame
                 )
 
-                last_faces = faces
-                last_roi = roi
-                last_quality = None
+                frames_since_detection = 0
+                detected = True
+
+                tracking = (
+                    tracker is not None
+                    and len(faces) == 1
+                    and not waiting_for_departure
+                )
+
+                if tracking:
+                    tracker.init(
+                        frame,
+                        faces[0],
+                    )
+
+            quality: Optional[Quality] = None
 
-                if waiting_for_departure:
-                    if faces:
+            if waiting_for_departure:
+                if faces:
+                    no_face_started_at = None
+
+                    message = (
+                        "Captured - waiting for "
+                        "customer to leave"
+                    )
+
+                else:
+                    if no_face_started_at is None:
+                        no_face_started_at = now
+
+                    if (
+                        now
+                        - no_face_started_at
+                        >= FACE_ABSENCE_RESET_SECONDS
+                    ):
+                        waiting_for_departure = False
                         no_face_started_at = None
+                        last_box = None
+                        stable_count = 0
+                        stable_started_at = None
+                        candidates.clear()
 
                         message = (
-                            "Captured - waiting for "
-                            "customer to leave"
+                            "Ready for the next customer"
                         )
 
                     else:
-                        if no_face_started_at is None:
-                            no_face_started_at = now
-
-                        if (
-                            now
-                            - no_face_started_at
-                            >= FACE_ABSENCE_RESET_SECONDS
-                        ):
-                            waiting_for_departure = False
-                            no_face_started_at = None
-                            last_box = None
-                            stable_count = 0
-                            stable_started_at = None
-                            candidates.clear()
-
-                            message = (
-                                "Ready for the next customer"
-                            )
-
-                        else:
-                            message = (
-                                "Customer left - resetting "
-                                "capture"
-                            )
-
-                elif len(faces) == 0:
-                    last_box = None
-                    stable_count = 0
-                    stable_started_at = None
-                    candidates.clear()
+                        message = (
+                            "Customer left - resetting "
+                            "capture"
+                        )
 
-                    message = (
-                        "Waiting for one customer inside "
-                        "the capture zone"
+            elif len(faces) == 0:
+                last_box = None
+                stable_count = 0
+                stable_started_at = None
+                candidates.clear()
+
+                message = WAITING_MESSAGE
+
+            elif len(faces) > 1:
+                last_box = None
+                stable_count = 0
+                stable_started_at = None
+                candidates.clear()
+
+                message = (
+                    "Multiple faces detected - keep only "
+                    "one customer in the zone"
+                )
+
+            else:
+                face_box = faces[0]
+
+                quality = inspect_quality(
+                    frame,
+                    face_box,
+                    roi,
+                    landmarks[0],
+                )
+
+                if (
+                    last_box
+                    and iou(
+                        last_box,
+                        face_box,
                     )
+                    >= STABILITY_IOU_THRESHOLD
+                ):
+                    stable_count += 1
+
+                else:
+                    stable_count = 1
+                    stable_started_at = now
+                    candidates.clear()
+
+                last_box = face_box
 
-                elif len(faces) > 1:
-                    last_box = None
-                    stable_count = 0
-                    stable_started_at = None
+                if not quality.accepted:
                     candidates.clear()
+                    message = quality.reason
 
+                elif (
+                    stable_count
+                    < STABLE_FRAMES_REQUIRED
+                ):
                     message = (
-                        "Multiple faces detected - keep only "
-                        "one customer in the zone"
+                        "Face found - hold position "
+                        f"briefly ({stable_count}/"
+                        f"{STABLE_FRAMES_REQUIRED})"
                     )
 
                 else:
-                    face_box = faces[0]
+                    candidates.append(
+                        Candidate(
+                            frame=frame,
+                            face_crop=(
+                                face_crop_with_margin(
+                                    frame,
+                                    face_box,
+                                )
+                            ),
+                            quality=quality,
+                            crop_face_box=(
+                                face_box_in_crop(
+                                    frame,
+                                    face_box,
+                                )
+                            ),
+                        )
+                    )
 
-                    quality = inspect_quality(
-                        frame,
-                        face_box,
-                        roi,
+                    candidates = sorted(
+                        candidates,
+                        key=lambda item: (
+                            item.quality.score
+                        ),
+                        reverse=True,
+                    )[:12]
+
+                    message = (
+                        "Good face - selecting best "
+                        f"frame ({len(candidates)}/"
+                        f"{MIN_GOOD_CANDIDATES})"
+                    )
+
+                    stable_time = (
+                        now - stable_started_at
+                        if stable_started_at
+                        else 0
                     )
 
-                    last_quality = quality
+                    ready = (
+                        len(candidates)
+                        >= MIN_GOOD_CANDIDATES
+                        and stable_time
+                        >= SAMPLE_WINDOW_SECONDS
+                        and now - last_capture_at
+                        >= CAPTURE_COOLDOWN_SECONDS
+                    )
 
-                    if (
-                        last_box
-                        and iou(
-                            last_box,
-                            face_box,
+                    if ready and not detected:
+                        # Confirm on the next frame that no one
+                        # joined the customer while tracking.
+                        frames_since_detection = (
+                            TRACKING_REDETECT_FRAMES
                         )
-                        >= STABILITY_IOU_THRESHOLD
-                    ):
-                        stable_count += 1
 
-                    else:
-                        stable_count = 1
-                        stable_started_at = now
-                        candidates.clear()
+                    elif ready:
+                        candidate = (
+                            candidates[0]
+                        )
 
-                    last_box = face_box
+                        threading.Thread(
+                            target=(
+                                upload_candidate_worker
+                            ),
+                            args=(
+                                candidate,
+                            ),
+                            name="face-upload",
+                            daemon=True,
+                        ).start()
 
-                    if not quality.accepted:
+                        last_capture_at = now
+                        waiting_for_departure = True
+                        tracking = False
+                        no_face_started_at = None
+                        last_box = None
+                        stable_count = 0
+                        stable_started_at = None
                         candidates.clear()
-                        message = quality.reason
 
-                    elif (
-                        stable_count
-                        < STABLE_FRAMES_REQUIRED
-                    ):
                         message = (
-                            "Face found - hold position "
-                            f"briefly ({stable_count}/"
-                            f"{STABLE_FRAMES_REQUIRED})"
+                            "Captured - waiting for "
+                            "customer to leave"
                         )
 
-                    else:
-                        candidates.append(
-                            Candidate(
-                                frame=frame.copy(),
-                                face_crop=(
-                                    face_crop_with_margin(
-                                        frame,
-                                        face_box,
-                                    )
-                                ),
-                                quality=quality,
-                            )
-                        )
+            publish(
+                CaptureStatus(
+                    roi=roi,
+                    faces=faces,
+                    quality=quality,
+                    message=message,
+                    stable_count=stable_count,
+                    waiting_for_departure=(
+                        waiting_for_departure
+                    ),
+                )
+            )
 
-                        candidates = sorted(
-                            candidates,
-                            key=lambda item: (
-                                item.quality.score
-                            ),
-                            reverse=True,
-                        )[:12]
+        except Exception:
+            print(
+                "Unexpected detection failure; "
+                "continuing after a short delay:"
+            )
 
-                        message = (
-                            "Good face - selecting best "
-                            f"frame ({len(candidates)}/"
-                            f"{MIN_GOOD_CANDIDATES})"
-                        )
+            traceback.print_exc()
 
-                        stable_time = (
-                            now - stable_started_at
-                            if stable_started_at
-                            else 0
-                        )
+            time.sleep(
+                1.0
+            )
 
-                        ready = (
-                            len(candidates)
-                            >= MIN_GOOD_CANDIDATES
-                            and stable_time
-                            >= SAMPLE_WINDOW_SECONDS
-                            and now - last_capture_at
-                            >= CAPTURE_COOLDOWN_SECONDS
-                        )
 
-                        if ready:
-                            candidate = (
-                                candidates[0]
-                            )
-
-                            threading.Thread(
-                                target=(
-                                    upload_candidate_worker
-                                ),
-                                args=(
-                                    candidate,
-                                ),
-                                name="face-upload",
-                                daemon=True,
-                            ).start()
-
-                            last_capture_at = now
-                            waiting_for_departure = True
-                            no_face_started_at = None
-                            last_box = None
-                            stable_count = 0
-                            stable_started_at = None
-                            candidates.clear()
-
-                            message = (
-                                "Captured - waiting for "
-                                "customer to leave"
-                            )
-
-            if PREVIEW_ENABLED:
-                preview = build_preview(
+def capture_loop(
+    camera: cv2.VideoCapture,
+) -> None:
+    """
+    Grab frames, detect faces and render the preview on separate
+    threads until Q or Esc is pressed in the preview.
+
+    The camera thread only reads frames, detection_loop works on
+    the newest one, and this thread draws the newest frame with the
+    latest detection status.
+    """
+    status = CaptureStatus()
+
+    def publish(
+        new_status: CaptureStatus,
+    ) -> None:
+        nonlocal status
+        status = new_status
+
+    grabber = FrameGrabber(
+        camera
+    ).start()
+
+    stop_event = threading.Event()
+
+    detection_thread = threading.Thread(
+        target=detection_loop,
+        args=(
+            grabber,
+            stop_event,
+            publish,
+        ),
+        name="face-detection",
+        daemon=True,
+    )
+
+    detection_thread.start()
+
+    next_queue_retry = (
+        time.monotonic()
+        + 2.0
+    )
+
+    shown_sequence = 0
+
+    try:
+        while True:
+            try:
+                now = time.monotonic()
+
+                if now >= next_queue_retry:
+                    start_offline_queue_retry()
+
+                    next_queue_retry = (
+                        now
+                        + QUEUE_RETRY_INTERVAL_SECONDS
+                    )
+
+                if not PREVIEW_ENABLED:
+                    time.sleep(
+                        0.5
+                    )
+
+                    continue
+
+                (
+                    sequence,
                     frame,
-                    last_roi
-                    or get_roi(
-                        frame
-                    ),
-                    last_faces,
-                    last_quality,
-                    message,
-                    stable_count,
-                    waiting_for_departure,
+                ) = grabber.latest(
+                    after=shown_sequence,
+                    timeout=0.5,
                 )
 
-                cv2.imshow(
-                    WINDOW_NAME,
-                    preview,
-                )
+                if frame is not None:
+                    shown_sequence = sequence
+                    current_status = status
+
+                    preview = build_preview(
+                        frame,
+                        current_status.roi
+                        or get_roi(
+                            frame
+                        ),
+                        current_status.faces,
+                        current_status.quality,
+                        current_status.message,
+                        current_status.stable_count,
+                        current_status.waiting_for_departure,
+                    )
+
+                    cv2.imshow(
+                        WINDOW_NAME,
+                        preview,
+                    )
 
                 key = (
                     cv2.waitKey(1)
@@ -1818,22 +3640,26 @@ def capture_loop(
                 }:
                     break
 
-            else:
+            except Exception:
+                print(
+                    "Unexpected preview failure; "
+                    "continuing after a short delay:"
+                )
+
+                traceback.print_exc()
+
                 time.sleep(
-                    0.01
+                    1.0
                 )
 
-        except Exception:
-            print(
-                "Unexpected capture-loop failure; "
-                "continuing after a short delay:"
-            )
+    finally:
+        stop_event.set()
 
-            traceback.print_exc()
+        detection_thread.join(
+            timeout=5.0
+        )
 
-            time.sleep(
-                1.0
-            )
+        grabber.stop()
 
 
 def run() -> None:
@@ -0,0 +1,34 @@
+import numpy as np
+
+
+# Byte layout of CapturedSnapshot.embedding_vector and
+# Visitor.centroid. Must match api_server/db_utils.py.
+EMBEDDING_DTYPE = np.dtype(
+    "<f4"
+)
+
+
+def embedding_to_bytes(embedding):
+    return np.asarray(
+        embedding,
+        dtype=EMBEDDING_DTYPE,
+    ).tobytes()
+
+
+def snapshot_embedding(snapshot):
+    """
+    Return a snapshot's embedding as a float32 array, or None.
+    """
+    if snapshot.embedding_vector is not None:
+        return np.frombuffer(
+            snapshot.embedding_vector,
+            dtype=EMBEDDING_DTYPE,
+        )
+
+    if snapshot.embedding is None:
+        return None
+
+    return np.asarray(
+        snapshot.embedding,
+        dtype=np.float32,
+    )
@@ -0,0 +1,119 @@
+from django.core.management.base import (
+    BaseCommand,
+)
+
+from monitor.embeddings import embedding_to_bytes
+from monitor.models import CapturedSnapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy JSON snapshot embeddings into the binary "
+        "embedding_vector column."
+    )
+
+    def add_arguments(
+        self,
+        parser,
+    ):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+        )
+
+        parser.add_argument(
+            "--clear-json",
+            action="store_true",
+            help=(
+                "Also empty the JSON embedding column of "
+                "converted rows to reclaim its space."
+            ),
+        )
+
+    def handle(
+        self,
+        *args,
+        **options,
+    ):
+        batch_size = max(
+            1,
+            options["batch_size"],
+        )
+
+        update_fields = [
+            "embedding_vector",
+        ]
+
+        if options["clear_json"]:
+            update_fields.append(
+                "embedding"
+            )
+
+        converted = 0
+        skipped = 0
+        last_id = 0
+
+        while True:
+            snapshots = list(
+                CapturedSnapshot.objects.filter(
+                    id__gt=last_id,
+                    embedding__isnull=False,
+                    embedding_vector__isnull=True,
+                )
+                .order_by(
+                    "id"
+                )
+                .only(
+                    "id",
+                    "embedding",
+                )[:batch_size]
+            )
+
+            if not snapshots:
+                break
+
+            last_id = snapshots[-1].id
+            changed = []
+
+            for snapshot in snapshots:
+                try:
+                    snapshot.embedding_vector = embedding_to_bytes(
+                        snapshot.embedding
+                    )
+
+                except (
+                    TypeError,
+                    ValueError,
+                ):
+                    skipped += 1
+                    continue
+
+                if options["clear_json"]:
+                    snapshot.embedding = None
+
+                changed.append(
+                    snapshot
+                )
+
+            CapturedSnapshot.objects.bulk_update(
+                changed,
+                update_fields,
+            )
+
+            converted += len(
+                changed
+            )
+
+            self.stdout.write(
+                f"Converted {converted} embeddings..."
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                (
+                    f"Converted {converted} embeddings; "
+                    f"skipped {skipped} invalid rows."
+                )
+            )
+        )
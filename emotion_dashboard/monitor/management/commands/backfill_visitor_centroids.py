@@ -0,0 +1,148 @@
+import numpy as np
+from django.core.management.base import (
+    BaseCommand,
+)
+
+from monitor.embeddings import (
+    embedding_to_bytes,
+    snapshot_embedding,
+)
+from monitor.models import (
+    CapturedSnapshot,
+    Visitor,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the matching centroid of every visitor that does "
+        "not have one yet from its latest snapshots."
+    )
+
+    def add_arguments(
+        self,
+        parser,
+    ):
+        parser.add_argument(
+            "--snapshots",
+            type=int,
+            default=20,
+            help=(
+                "Latest snapshots averaged per visitor. Keep equal "
+                "to the face API's VISITOR_CENTROID_MAX_WEIGHT."
+            ),
+        )
+
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Recompute centroids that already exist.",
+        )
+
+    def handle(
+        self,
+        *args,
+        **options,
+    ):
+        snapshot_limit = max(
+            1,
+            options["snapshots"],
+        )
+
+        visitors = Visitor.objects.order_by(
+            "id"
+        )
+
+        if not options["rebuild"]:
+            visitors = visitors.filter(
+                centroid__isnull=True
+            )
+
+        built = 0
+        skipped = 0
+
+        for visitor in visitors.only(
+            "id"
+        ).iterator():
+            snapshots = (
+                CapturedSnapshot.objects.filter(
+                    visitor_id=visitor.id,
+                    status=CapturedSnapshot.STATUS_DONE,
+                )
+                .order_by(
+                    "-timestamp",
+                    "-id",
+                )
+                .only(
+                    "embedding",
+                    "embedding_vector",
+                )[:snapshot_limit]
+            )
+
+            unit_embeddings = []
+
+            for snapshot in snapshots:
+                try:
+                    embedding = snapshot_embedding(
+                        snapshot
+                    )
+
+                except (
+                    TypeError,
+                    ValueError,
+                ):
+                    continue
+
+                if embedding is None:
+                    continue
+
+                norm = float(
+                    np.linalg.norm(
+                        embedding
+                    )
+                )
+
+                if (
+                    not np.isfinite(norm)
+                    or norm == 0.0
+                    or (
+                        unit_embeddings
+                        and embedding.shape
+                        != unit_embeddings[0].shape
+                    )
+                ):
+                    continue
+
+                unit_embeddings.append(
+                    embedding / norm
+                )
+
+            if not unit_embeddings:
+                skipped += 1
+                continue
+
+            Visitor.objects.filter(
+                id=visitor.id
+            ).update(
+                centroid=embedding_to_bytes(
+                    np.mean(
+                        unit_embeddings,
+                        axis=0,
+                    )
+                ),
+                centroid_count=len(
+                    unit_embeddings
+                ),
+            )
+
+            built += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                (
+                    f"Built {built} visitor centroids; "
+                    f"skipped {skipped} visitors without "
+                    "embeddings."
+                )
+            )
+        )
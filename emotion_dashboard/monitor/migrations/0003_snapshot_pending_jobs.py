@@ -0,0 +1,23 @@
+# Generated by Django 5.2.11 on 2026-10-18 13:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0002_bank_api_key_rotated_at_alter_bank_code_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='capturedsnapshot',
+            name='visitor',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='monitor.visitor'),
+        ),
+        migrations.AddIndex(
+            model_name='capturedsnapshot',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['timestamp'], name='snapshot_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.11 on 2026-10-18 13:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0003_snapshot_pending_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='capturedsnapshot',
+            name='embedding_vector',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
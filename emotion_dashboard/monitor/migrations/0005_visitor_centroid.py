@@ -0,0 +1,23 @@
+# Generated by Django 5.2.11 on 2026-10-18 13:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0004_snapshot_embedding_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='visitor',
+            name='centroid',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='visitor',
+            name='centroid_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
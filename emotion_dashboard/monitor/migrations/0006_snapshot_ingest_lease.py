@@ -0,0 +1,36 @@
+# Generated by Django 5.2.11 on 2026-10-18 14:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0005_visitor_centroid'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='capturedsnapshot',
+            name='snapshot_pending_idx',
+        ),
+        migrations.AddField(
+            model_name='capturedsnapshot',
+            name='available_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='capturedsnapshot',
+            name='processing_attempts',
+            field=models.PositiveSmallIntegerField(db_default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='capturedsnapshot',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], default='done', max_length=12),
+        ),
+        migrations.AddIndex(
+            model_name='capturedsnapshot',
+            index=models.Index(condition=models.Q(('status__in', ('pending', 'processing'))), fields=['timestamp'], name='snapshot_queue_idx'),
+        ),
+    ]
@@ -505,6 +505,20 @@ class Visitor(models.Model):
         default=timezone.now,
     )
 
+    # Running mean of the visitor's L2-normalised embeddings as
+    # little-endian float32 bytes. The face API matches new faces
+    # against this one row per visitor instead of snapshot history.
+    centroid = models.BinaryField(
+        null=True,
+        blank=True,
+        editable=False,
+    )
+
+    centroid_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+    )
+
     class Meta:
         db_table = "analytics_visitor"
 
@@ -536,6 +550,7 @@ class Visitor(models.Model):
 
 class CapturedSnapshot(models.Model):
     STATUS_PENDING = "pending"
+    STATUS_PROCESSING = "processing"
     STATUS_DONE = "done"
     STATUS_FAILED = "failed"
 
@@ -544,6 +559,10 @@ class CapturedSnapshot(models.Model):
             STATUS_PENDING,
             "Pending",
         ),
+        (
+            STATUS_PROCESSING,
+            "Processing",
+        ),
         (
             STATUS_DONE,
             "Done",
@@ -571,10 +590,14 @@ class CapturedSnapshot(models.Model):
         related_name="snapshots",
     )
 
+    # Pending snapshots from the asynchronous ingest endpoint have
+    # no visitor until the face API has processed them.
     visitor = models.ForeignKey(
         Visitor,
         on_delete=models.CASCADE,
         related_name="snapshots",
+        null=True,
+        blank=True,
     )
 
     pc_name = models.CharField(
@@ -609,6 +632,15 @@ class CapturedSnapshot(models.Model):
         blank=True,
     )
 
+    # Little-endian float32 copy of the embedding, about a quarter of
+    # the JSON size and read by the face API without parsing. Older
+    # rows are converted with manage.py backfill_embedding_vectors.
+    embedding_vector = models.BinaryField(
+        null=True,
+        blank=True,
+        editable=False,
+    )
+
     processed = models.BooleanField(
         default=True,
     )
@@ -623,6 +655,24 @@ class CapturedSnapshot(models.Model):
         blank=True,
     )
 
+    # Times the face API has claimed this queued upload. A job that
+    # keeps failing is marked failed after ASYNC_INGEST_MAX_ATTEMPTS.
+    # The default lives in the database because the face API inserts
+    # snapshots with plain SQL.
+    processing_attempts = models.PositiveSmallIntegerField(
+        db_default=0,
+        editable=False,
+    )
+
+    # For a pending job, when it may next be claimed; for a job being
+    # processed, when its lease runs out and another face API worker
+    # may take it over.
+    available_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+    )
+
     class Meta:
         db_table = "analytics_snapshot"
         ordering = ("-timestamp",)
@@ -649,6 +699,19 @@ class CapturedSnapshot(models.Model):
                     "timestamp",
                 ),
             ),
+
+            models.Index(
+                fields=(
+                    "timestamp",
+                ),
+                condition=models.Q(
+                    status__in=(
+                        "pending",
+                        "processing",
+                    ),
+                ),
+                name="snapshot_queue_idx",
+            ),
         ]
 
     def clean(self):
@@ -675,8 +738,14 @@ class CapturedSnapshot(models.Model):
             )
 
     def __str__(self):
+        face_id = (
+            self.visitor.face_id
+            if self.visitor_id
+            else self.status
+        )
+
         return (
             f"{self.bank.code}/"
             f"{self.branch.code} - "
-            f"{self.visitor.face_id}"
+            f"{face_id}"
         )
\ No newline at end of file
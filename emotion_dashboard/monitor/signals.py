@@ -1,14 +1,24 @@
+from django.db import connection
 from django.db.models.signals import (
+    post_delete,
     post_save,
 )
 from django.dispatch import receiver
 
 from .models import (
+    Bank,
+    Branch,
     CustomUser,
     UserPreference,
 )
 
 
+# The face API LISTENs on this channel and drops its cached API keys
+# and branch prefixes for the bank in the payload
+# (api_server/tenant_cache.py).
+TENANT_CACHE_CHANNEL = "tenant_cache_invalidate"
+
+
 @receiver(
     post_save,
     sender=CustomUser,
@@ -22,4 +32,61 @@ def create_user_preferences(
     if created:
         UserPreference.objects.get_or_create(
             user=instance
-        )
\ No newline at end of file
+        )
+
+
+def notify_tenant_change(
+    bank_id,
+):
+    """
+    Tell running face API processes that a bank's keys or branches
+    changed. NOTIFY is delivered when the surrounding transaction
+    commits and dropped if it rolls back.
+    """
+    if connection.vendor != "postgresql":
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_notify(%s, %s)",
+            [
+                TENANT_CACHE_CHANNEL,
+                str(bank_id),
+            ],
+        )
+
+
+@receiver(
+    post_save,
+    sender=Bank,
+)
+@receiver(
+    post_delete,
+    sender=Bank,
+)
+def bank_changed(
+    sender,
+    instance,
+    **kwargs,
+):
+    notify_tenant_change(
+        instance.pk
+    )
+
+
+@receiver(
+    post_save,
+    sender=Branch,
+)
+@receiver(
+    post_delete,
+    sender=Branch,
+)
+def branch_changed(
+    sender,
+    instance,
+    **kwargs,
+):
+    notify_tenant_change(
+        instance.bank_id
+    )
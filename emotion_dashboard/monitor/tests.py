@@ -1,6 +1,10 @@
 import tempfile
 from pathlib import Path
+from unittest import mock
 
+import numpy as np
+
+from django.core.management import call_command
 from django.test import (
     TestCase,
     override_settings,
@@ -289,4 +293,182 @@ class TenantIsolationTests(TestCase):
                 "top_emotion"
             ]["emotion"],
             "happy",
-        )
\ No newline at end of file
+        )
+
+
+class TenantCacheNotificationTests(TestCase):
+    def setUp(self):
+        self.bank = Bank.objects.create(
+            name="Bank A",
+            code="BANK_A",
+        )
+
+        self.branch = Branch.objects.create(
+            bank=self.bank,
+            name="Bank A Main Branch",
+            code="MAIN",
+            pc_prefix="BANK-A-PC",
+            location="Accra",
+        )
+
+    def test_api_key_rotation_notifies_the_face_api(self):
+        with mock.patch(
+            "monitor.signals.notify_tenant_change"
+        ) as notify:
+            call_command(
+                "set_bank_api_key",
+                "bank_a",
+                key="k" * 32,
+                stdout=mock.Mock(),
+            )
+
+        notify.assert_called_once_with(
+            self.bank.id
+        )
+
+    def test_branch_edit_notifies_the_face_api(self):
+        with mock.patch(
+            "monitor.signals.notify_tenant_change"
+        ) as notify:
+            self.branch.pc_prefix = "BANK-A-TELLER"
+            self.branch.save()
+
+            self.branch.delete()
+
+        self.assertEqual(
+            notify.call_args_list,
+            [
+                mock.call(self.bank.id),
+                mock.call(self.bank.id),
+            ],
+        )
+
+
+class EmbeddingVectorBackfillTests(TestCase):
+    def test_backfill_converts_json_embeddings_to_float32_bytes(self):
+        bank = Bank.objects.create(
+            name="Bank A",
+            code="BANK_A",
+        )
+
+        branch = Branch.objects.create(
+            bank=bank,
+            name="Bank A Main Branch",
+            code="MAIN",
+            pc_prefix="BANK-A-PC",
+        )
+
+        visitor = Visitor.objects.create(
+            bank=bank,
+            face_id="face-1",
+        )
+
+        snapshot = CapturedSnapshot.objects.create(
+            job_id="job-1",
+            bank=bank,
+            branch=branch,
+            visitor=visitor,
+            pc_name="BANK-A-PC-01",
+            image_path="BANK_A/MAIN/job-1.jpg",
+            timestamp=timezone.now(),
+            embedding=[
+                0.5,
+                -1.25,
+                2.0,
+            ],
+        )
+
+        call_command(
+            "backfill_embedding_vectors",
+            "--clear-json",
+            stdout=mock.Mock(),
+        )
+
+        snapshot.refresh_from_db()
+
+        np.testing.assert_array_equal(
+            np.frombuffer(
+                snapshot.embedding_vector,
+                dtype="<f4",
+            ),
+            np.array(
+                [
+                    0.5,
+                    -1.25,
+                    2.0,
+                ],
+                dtype=np.float32,
+            ),
+        )
+
+        self.assertIsNone(
+            snapshot.embedding
+        )
+
+    def test_visitor_centroid_backfill_averages_normalised_embeddings(self):
+        bank = Bank.objects.create(
+            name="Bank A",
+            code="BANK_A",
+        )
+
+        branch = Branch.objects.create(
+            bank=bank,
+            name="Bank A Main Branch",
+            code="MAIN",
+            pc_prefix="BANK-A-PC",
+        )
+
+        visitor = Visitor.objects.create(
+            bank=bank,
+            face_id="face-1",
+        )
+
+        for job_id, embedding in (
+            (
+                "job-1",
+                [
+                    3.0,
+                    0.0,
+                ],
+            ),
+            (
+                "job-2",
+                [
+                    0.0,
+                    0.5,
+                ],
+            ),
+        ):
+            CapturedSnapshot.objects.create(
+                job_id=job_id,
+                bank=bank,
+                branch=branch,
+                visitor=visitor,
+                pc_name="BANK-A-PC-01",
+                image_path=f"BANK_A/MAIN/{job_id}.jpg",
+                timestamp=timezone.now(),
+                embedding=embedding,
+            )
+
+        call_command(
+            "backfill_visitor_centroids",
+            stdout=mock.Mock(),
+        )
+
+        visitor.refresh_from_db()
+
+        np.testing.assert_allclose(
+            np.frombuffer(
+                visitor.centroid,
+                dtype="<f4",
+            ),
+            [
+                0.5,
+                0.5,
+            ],
+        )
+
+        self.assertEqual(
+            visitor.centroid_count,
+            2,
+        )
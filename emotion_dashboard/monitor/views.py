@@ -1,5 +1,6 @@
 import csv
 import json
+import mimetypes
 from datetime import datetime, timedelta
 from pathlib import Path
 
@@ -1534,10 +1535,11 @@ def reports(request):
         queryset = (
             queryset
             .filter(
+                status="done",
                 timestamp__date__range=(
                     date_from,
                     date_to,
-                )
+                ),
             )
             .order_by(
                 "timestamp"
@@ -1656,7 +1658,11 @@ def snapshot_image(
         image_path.open(
             "rb"
         ),
+        # The API stores uploads in their original format.
         content_type=(
-            "image/jpeg"
+            mimetypes.guess_type(
+                image_path.name
+            )[0]
+            or "image/jpeg"
         ),
     )
\ No newline at end of file
@@ -0,0 +1,737 @@
+"""
+Unit tests for desktop_capture.py.
+
+Run from the project root with python -m pytest tests. The module
+loads OpenCV's Haar cascades on import, so these tests are skipped
+on OpenCV builds without them.
+"""
+
+import cv2
+import numpy as np
+import pytest
+
+
+if not hasattr(
+    cv2,
+    "CascadeClassifier",
+):
+    pytest.skip(
+        "This OpenCV build has no Haar cascades.",
+        allow_module_level=True,
+    )
+
+import desktop_capture as capture
+
+
+@pytest.fixture
+def frame():
+    return np.random.default_rng(
+        0
+    ).integers(
+        0,
+        256,
+        size=(
+            480,
+            640,
+            3,
+        ),
+        dtype=np.uint8,
+    )
+
+
+@pytest.mark.parametrize(
+    "box",
+    (
+        (
+            200,
+            150,
+            100,
+            120,
+        ),
+        (
+            10,
+            5,
+            100,
+            120,
+        ),
+        (
+            560,
+            380,
+            80,
+            100,
+        ),
+    ),
+)
+def test_face_box_in_crop_points_at_the_same_pixels(
+    frame,
+    box,
+):
+    x, y, width, height = box
+
+    crop = capture.face_crop_with_margin(
+        frame,
+        box,
+    )
+
+    (
+        crop_x,
+        crop_y,
+        crop_width,
+        crop_height,
+    ) = capture.face_box_in_crop(
+        frame,
+        box,
+    )
+
+    assert (
+        crop_width,
+        crop_height,
+    ) == (
+        width,
+        height,
+    )
+
+    assert np.array_equal(
+        crop[
+            crop_y:crop_y + crop_height,
+            crop_x:crop_x + crop_width,
+        ],
+        frame[
+            y:y + height,
+            x:x + width,
+        ],
+    )
+
+
+def smooth_scene(
+    seed,
+):
+    """
+    Blurred noise, which keeps its shape when the tracker shrinks
+    it, unlike raw pixel noise.
+    """
+    scene = cv2.GaussianBlur(
+        np.random.default_rng(
+            seed
+        ).integers(
+            0,
+            256,
+            size=(
+                480,
+                640,
+                3,
+            ),
+            dtype=np.uint8,
+        ),
+        (
+            0,
+            0,
+        ),
+        6,
+    )
+
+    return cv2.normalize(
+        scene,
+        None,
+        0,
+        255,
+        cv2.NORM_MINMAX,
+    )
+
+
+def test_template_tracker_follows_a_moving_face():
+    frame = smooth_scene(
+        0
+    )
+
+    tracker = capture.TemplateTracker()
+
+    assert tracker.update(
+        frame
+    ) is None
+
+    tracker.init(
+        frame,
+        (
+            200,
+            150,
+            100,
+            120,
+        ),
+    )
+
+    moved = np.roll(
+        frame,
+        (
+            12,
+            -20,
+        ),
+        axis=(
+            0,
+            1,
+        ),
+    )
+
+    x, y, width, height = tracker.update(
+        moved
+    )
+
+    # The match runs on a shrunken image, so allow its rounding.
+    assert abs(x - 180) <= 3
+    assert abs(y - 162) <= 3
+
+    assert (
+        width,
+        height,
+    ) == (
+        100,
+        120,
+    )
+
+
+def test_template_tracker_loses_a_face_that_left():
+    tracker = capture.TemplateTracker()
+
+    tracker.init(
+        smooth_scene(
+            0
+        ),
+        (
+            200,
+            150,
+            100,
+            120,
+        ),
+    )
+
+    assert tracker.update(
+        smooth_scene(
+            1
+        )
+    ) is None
+
+
+def old_measure(
+    face,
+):
+    """
+    The measurements inspect_quality made before QualityEngine.
+    """
+    gray = cv2.cvtColor(
+        face,
+        cv2.COLOR_BGR2GRAY,
+    )
+
+    return (
+        gray,
+        float(
+            cv2.Laplacian(
+                gray,
+                cv2.CV_64F,
+            ).var()
+        ),
+        float(
+            np.mean(
+                gray
+            )
+        ),
+        float(
+            np.mean(
+                gray < 35
+            )
+        ),
+        float(
+            np.mean(
+                gray > 235
+            )
+        ),
+    )
+
+
+def test_quality_engine_matches_the_old_measurements():
+    generator = np.random.default_rng(
+        2
+    )
+
+    engine = capture.QualityEngine()
+
+    # Shrinking and growing again reuses the engine's buffers.
+    for height, width in (
+        (
+            160,
+            120,
+        ),
+        (
+            40,
+            30,
+        ),
+        (
+            161,
+            121,
+        ),
+    ):
+        face = generator.integers(
+            0,
+            256,
+            size=(
+                height,
+                width,
+                3,
+            ),
+            dtype=np.uint8,
+        )
+
+        (
+            gray,
+            *measurements,
+        ) = engine.measure(
+            face
+        )
+
+        (
+            expected_gray,
+            *expected_measurements,
+        ) = old_measure(
+            face
+        )
+
+        assert np.array_equal(
+            gray,
+            expected_gray,
+        )
+
+        assert measurements == pytest.approx(
+            expected_measurements,
+            rel=1e-5,
+        )
+
+
+class RowCountingEyeCascade:
+    """
+    Finds one eye per 50 rows searched, so a different eye band
+    gives a different count.
+    """
+
+    def empty(self):
+        return False
+
+    def detectMultiScale(
+        self,
+        image,
+        **settings,
+    ):
+        return [
+            (
+                0,
+                0,
+                18,
+                18,
+            )
+        ] * (
+            image.shape[0] // 50
+        )
+
+
+def old_eyes_and_score(
+    frame,
+    face_box,
+    roi,
+):
+    """
+    The eye count and score inspect_quality gave before
+    QualityEngine.
+    """
+    x, y, width, height = face_box
+
+    (
+        gray,
+        blur,
+        brightness,
+        _,
+        _,
+    ) = old_measure(
+        frame[
+            y:y + height,
+            x:x + width,
+        ]
+    )
+
+    eye_count = min(
+        len(
+            capture.EYE_CASCADE.detectMultiScale(
+                gray[
+                    :max(
+                        1,
+                        int(
+                            height * 0.62
+                        ),
+                    ),
+                    :,
+                ],
+                scaleFactor=1.1,
+                minNeighbors=5,
+                minSize=(
+                    18,
+                    18,
+                ),
+            )
+        ),
+        2,
+    )
+
+    score = (
+        min(
+            blur
+            / max(
+                capture.BLUR_THRESHOLD * 4,
+                1,
+            ),
+            1.0,
+        ) * 0.42
+        + max(
+            0.0,
+            1.0
+            - abs(
+                brightness - 125.0
+            )
+            / 125.0,
+        ) * 0.33
+        + min(
+            width * height / float(
+                roi[2] * roi[3]
+            )
+            / 0.18,
+            1.0,
+        ) * 0.20
+        + eye_count / 2.0 * 0.05
+    )
+
+    return (
+        eye_count,
+        round(
+            score,
+            4,
+        ),
+    )
+
+
+@pytest.mark.parametrize(
+    "face_box",
+    (
+        (
+            70,
+            25,
+            140,
+            190,
+        ),
+        (
+            100,
+            60,
+            90,
+            110,
+        ),
+    ),
+)
+def test_accepted_face_scores_as_before(
+    monkeypatch,
+    face_box,
+):
+    monkeypatch.setattr(
+        capture,
+        "EYE_CASCADE",
+        RowCountingEyeCascade(),
+    )
+
+    frame = cv2.normalize(
+        cv2.GaussianBlur(
+            np.random.default_rng(
+                3
+            ).integers(
+                0,
+                256,
+                size=(
+                    240,
+                    320,
+                    3,
+                ),
+                dtype=np.uint8,
+            ),
+            (
+                0,
+                0,
+            ),
+            0.8,
+        ),
+        None,
+        40,
+        210,
+        cv2.NORM_MINMAX,
+    )
+
+    roi = (
+        0,
+        0,
+        320,
+        240,
+    )
+
+    quality = capture.inspect_quality(
+        frame,
+        face_box,
+        roi,
+    )
+
+    assert quality.accepted
+
+    assert (
+        quality.eye_count,
+        quality.score,
+    ) == old_eyes_and_score(
+        frame,
+        face_box,
+        roi,
+    )
+
+
+def test_rejected_face_skips_the_eye_cascade(
+    monkeypatch,
+):
+    def no_eye_cascade(
+        gray,
+        height,
+    ):
+        raise AssertionError(
+            "The eye cascade ran for a rejected face."
+        )
+
+    monkeypatch.setattr(
+        capture,
+        "count_eyes",
+        no_eye_cascade,
+    )
+
+    # A flat face has no edges at all, so it is rejected as blurred.
+    quality = capture.inspect_quality(
+        np.full(
+            (
+                240,
+                320,
+                3,
+            ),
+            128,
+            dtype=np.uint8,
+        ),
+        (
+            100,
+            60,
+            120,
+            140,
+        ),
+        (
+            0,
+            0,
+            320,
+            240,
+        ),
+    )
+
+    assert not quality.accepted
+    assert quality.reason == "Hold still - image is blurred"
+    assert quality.eye_count == 0
+
+
+class FakeGrabber:
+    """
+    Hand out a fixed number of frames, then stop the loop.
+    """
+
+    def __init__(
+        self,
+        frame_count,
+        stop_event,
+    ):
+        self.frame_count = frame_count
+        self.stop_event = stop_event
+
+    def latest(
+        self,
+        after=0,
+    ):
+        if after >= self.frame_count:
+            self.stop_event.set()
+
+            return (
+                after,
+                None,
+            )
+
+        return (
+            after + 1,
+            np.zeros(
+                (
+                    480,
+                    640,
+                    3,
+                ),
+                dtype=np.uint8,
+            ),
+        )
+
+
+class FakeTracker:
+    def init(
+        self,
+        frame,
+        box,
+    ):
+        self.box = box
+
+    def update(
+        self,
+        frame,
+    ):
+        return self.box
+
+
+@pytest.mark.parametrize(
+    "second_detection, captured",
+    (
+        (
+            1,
+            True,
+        ),
+        (
+            2,
+            False,
+        ),
+    ),
+)
+def test_capture_waits_for_a_detection_of_one_face(
+    monkeypatch,
+    second_detection,
+    captured,
+):
+    face = (
+        280,
+        200,
+        80,
+        100,
+    )
+
+    detections = iter(
+        (
+            [
+                face,
+            ],
+            [
+                face,
+                (
+                    150,
+                    200,
+                    80,
+                    100,
+                ),
+            ][:second_detection],
+        )
+    )
+
+    def detect_faces(
+        frame,
+    ):
+        faces = next(
+            detections
+        )
+
+        return (
+            faces,
+            capture.get_roi(
+                frame
+            ),
+            [None] * len(faces),
+        )
+
+    for name, value in (
+        (
+            "DETECTION_INTERVAL_FRAMES",
+            1,
+        ),
+        (
+            "TRACKING_REDETECT_FRAMES",
+            10,
+        ),
+        (
+            "STABLE_FRAMES_REQUIRED",
+            2,
+        ),
+        (
+            "MIN_GOOD_CANDIDATES",
+            1,
+        ),
+        (
+            "SAMPLE_WINDOW_SECONDS",
+            0.0,
+        ),
+        (
+            "CAPTURE_COOLDOWN_SECONDS",
+            0.0,
+        ),
+        (
+            "create_face_tracker",
+            FakeTracker,
+        ),
+        (
+            "detect_faces",
+            detect_faces,
+        ),
+        (
+            "inspect_quality",
+            lambda frame, box, roi, landmarks: capture.Quality(
+                accepted=True,
+                score=1.0,
+                blur=100.0,
+                brightness=128.0,
+                eye_count=2,
+                face_area_ratio=0.1,
+                reason="",
+            ),
+        ),
+        (
+            "upload_candidate_worker",
+            lambda candidate: None,
+        ),
+    ):
+        monkeypatch.setattr(
+            capture,
+            name,
+            value,
+        )
+
+    stop_event = capture.threading.Event()
+    statuses = []
+
+    # Detection finds one face, the tracker makes it stable and
+    # collects enough frames, and the third frame is detected again.
+    capture.detection_loop(
+        FakeGrabber(
+            3,
+            stop_event,
+        ),
+        stop_event,
+        statuses.append,
+    )
+
+    assert [
+        status.waiting_for_departure
+        for status in statuses
+    ] == [
+        False,
+        False,
+        captured,
+    ]
+
+    if not captured:
+        assert statuses[-1].message.startswith(
+            "Multiple faces detected"
+        )
+
+        assert statuses[-1].stable_count == 0